@@ -50,6 +50,12 @@ function restoreDownload(jobId) {
 
     // Subscribe to events
     subscribeToProgress(jobId, {
+        onQueued: (position) => {
+            hasReceivedData = true;
+            clearTimeout(connectionTimeout);
+
+            progressText.textContent = `Waiting in queue (position ${position})...`;
+        },
         onDownloading: (data) => {
             hasReceivedData = true;
             clearTimeout(connectionTimeout);
@@ -124,7 +130,9 @@ function subscribeToProgress(jobId, callbacks) {
     eventSource.onmessage = (event) => {
         const data = JSON.parse(event.data);
 
-        if (data.status === 'downloading' && callbacks.onDownloading) {
+        if (data.status === 'queued' && callbacks.onQueued) {
+            callbacks.onQueued(data.position);
+        } else if (data.status === 'downloading' && callbacks.onDownloading) {
             callbacks.onDownloading(data);
         } else if (data.status === 'merging' && callbacks.onMerging) {
             callbacks.onMerging(data);
@@ -239,6 +247,9 @@ document.getElementById('downloadBtn').addEventListener('click', async () => {
 
         // Subscribe to progress using the reusable function
         subscribeToProgress(jobId, {
+            onQueued: (position) => {
+                progressText.textContent = `Waiting in queue (position ${position})...`;
+            },
             onDownloading: (data) => {
                 const percent = data.progress;
                 progressFill.style.width = `${percent}%`;
@@ -26,6 +26,72 @@ const PORT = process.env.PORT || 3000;
 // Maximum concurrent download jobs allowed
 const MAX_CONCURRENT_JOBS = 5;
 
+const FORMAT_SPEC = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best'; // Prefer mp4/m4a for better iOS compatibility
+
+// Merger args: full re-encode to H.264 (libx264) + AAC, or stream copy when the source already is
+const TRANSCODE_ARGS = 'merger:-c:v libx264 -preset fast -crf 23 -c:a aac -b:a 192k -movflags +faststart';
+const REMUX_ARGS = 'merger:-c copy -movflags +faststart';
+
+// Encode path taken per job (remux hit rate = remux / (remux + transcode))
+const encodeStats = { remux: 0, transcode: 0, none: 0 };
+
+// Determine yt-dlp path based on platform
+function getYtDlpPath() {
+    let ytDlpPath = 'yt-dlp'; // Default to global command (Docker/Linux)
+    if (process.platform === 'win32') {
+        const localVenvPath = path.join(__dirname, '.venv', 'Scripts', 'yt-dlp.exe');
+        if (fs.existsSync(localVenvPath)) {
+            ytDlpPath = localVenvPath;
+        }
+    }
+    return ytDlpPath;
+}
+
+// True when the selected formats are already H.264 video + AAC audio
+function isIphoneCompatible(info) {
+    const formats = info.requested_formats || [];
+    const codec = (value) => (value && value !== 'none') ? value.split('.')[0].toLowerCase() : null;
+    const vcodec = formats.map(f => codec(f.vcodec)).find(Boolean);
+    const acodec = formats.map(f => codec(f.acodec)).find(Boolean);
+    if (!vcodec || !['avc1', 'avc3', 'h264'].some(p => vcodec.startsWith(p))) return false;
+    return !acodec || ['mp4a', 'aac'].some(p => acodec.startsWith(p));
+}
+
+// Pick the encode path from an info dict produced by `yt-dlp -J`
+function chooseEncodePath(info) {
+    if (!info.requested_formats) return 'none';
+    return isIphoneCompatible(info) ? 'remux' : 'transcode';
+}
+
+// Format selector for exactly the streams a probe picked (the encode path was chosen for these)
+function probedFormatSpec(info) {
+    if (info.requested_formats) return info.requested_formats.map(f => f.format_id).join('+');
+    return info.format_id || FORMAT_SPEC;
+}
+
+// Run `yt-dlp -J` to get the selected formats without downloading
+function probeFormats(ytDlpPath, url, callback) {
+    const probe = spawn(ytDlpPath, ['-J', '--no-playlist', '-f', FORMAT_SPEC, url]);
+    const chunks = [];
+    let done = false;
+    const finish = (err, info) => {
+        if (done) return; // 'error' and 'close' can both fire
+        done = true;
+        callback(err, info);
+    };
+    probe.stdout.on('data', (data) => chunks.push(data));
+    probe.stderr.on('data', (data) => console.error(`probe stderr: ${data}`));
+    probe.on('error', (err) => finish(err));
+    probe.on('close', (code) => {
+        if (code !== 0) return finish(new Error(`yt-dlp probe exited with code ${code}`));
+        try {
+            finish(null, JSON.parse(Buffer.concat(chunks).toString()));
+        } catch (e) {
+            finish(e);
+        }
+    });
+}
+
 app.use(cors());
 app.use(express.json());
 app.use(express.static('public'));
@@ -63,64 +129,7 @@ function broadcastProgress(jobId, data) {
     });
 }
 
-app.post('/download', (req, res) => {
-    const { url, filename } = req.body;
-
-    if (!url) {
-        return res.status(400).json({ error: 'URL is required' });
-    }
-
-    // Check concurrent job limit
-    const activeJobs = jobs.size;
-    if (activeJobs >= MAX_CONCURRENT_JOBS) {
-        console.log(`Job limit reached: ${activeJobs}/${MAX_CONCURRENT_JOBS} active jobs`);
-        return res.status(429).json({
-            error: 'Too many concurrent downloads',
-            message: `Maximum ${MAX_CONCURRENT_JOBS} concurrent downloads allowed. Please try again later.`,
-            activeJobs: activeJobs
-        });
-    }
-
-    const jobId = crypto.randomUUID();
-    const finalFilename = filename ? filename.replace(/[^a-zA-Z0-9_\-\.]/g, '_') : `video_${jobId}`;
-    const outputTemplate = path.join(__dirname, 'downloads', `${finalFilename}.%(ext)s`);
-
-    // Ensure downloads directory exists
-    const downloadsDir = path.join(__dirname, 'downloads');
-    if (!fs.existsSync(downloadsDir)) {
-        fs.mkdirSync(downloadsDir);
-    }
-
-    // Initialize job
-    jobs.set(jobId, { clients: [], phase: 'initializing' }); // phase: initializing, video, audio, merging
-
-    console.log(`Starting job ${jobId} for: ${url}`);
-
-    // Run yt-dlp asynchronously
-    const args = [
-        '--ffmpeg-location', ffmpegBinary,
-        '-f', 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best', // Prefer mp4/m4a for better iOS compatibility
-        '--merge-output-format', 'mp4', // This triggers the merge
-        // Re-encode video to H.264 (libx264) for iPhone compatibility
-        // Use AAC audio codec, add faststart flag for web/mobile streaming
-        '--postprocessor-args', 'merger:-c:v libx264 -preset fast -crf 23 -c:a aac -b:a 192k -movflags +faststart',
-        '-o', outputTemplate,
-        '--newline', // Important for parsing line-by-line
-        url
-    ];
-
-    // Check if we should keep intermediate files (optional, currently disabled)
-    // args.push('-k');
-
-    // Determine yt-dlp path based on platform
-    let ytDlpPath = 'yt-dlp'; // Default to global command (Docker/Linux)
-    if (process.platform === 'win32') {
-        const localVenvPath = path.join(__dirname, '.venv', 'Scripts', 'yt-dlp.exe');
-        if (fs.existsSync(localVenvPath)) {
-            ytDlpPath = localVenvPath;
-        }
-    }
-
+function runDownload(jobId, ytDlpPath, args, finalFilename, onClose) {
     const ytDlpProcess = spawn(ytDlpPath, args);
 
     ytDlpProcess.on('error', (err) => {
@@ -172,8 +181,10 @@ app.post('/download', (req, res) => {
 
     ytDlpProcess.on('close', (code) => {
         console.log(`Job ${jobId} finished with code ${code}`);
+        onClose();
         if (code === 0) {
-            broadcastProgress(jobId, { status: 'completed', filename: `${finalFilename}.mp4` });
+            const job = jobs.get(jobId);
+            broadcastProgress(jobId, { status: 'completed', filename: `${finalFilename}.mp4`, encodePath: job && job.encodePath });
         } else {
             broadcastProgress(jobId, { status: 'error', message: 'Download failed' });
         }
@@ -184,6 +195,78 @@ app.post('/download', (req, res) => {
             console.log(`Job ${jobId} removed. Active jobs: ${jobs.size}/${MAX_CONCURRENT_JOBS}`);
         }, 10000);
     });
+}
+
+app.post('/download', (req, res) => {
+    const { url, filename } = req.body;
+
+    if (!url) {
+        return res.status(400).json({ error: 'URL is required' });
+    }
+
+    // Check concurrent job limit
+    const activeJobs = jobs.size;
+    if (activeJobs >= MAX_CONCURRENT_JOBS) {
+        console.log(`Job limit reached: ${activeJobs}/${MAX_CONCURRENT_JOBS} active jobs`);
+        return res.status(429).json({
+            error: 'Too many concurrent downloads',
+            message: `Maximum ${MAX_CONCURRENT_JOBS} concurrent downloads allowed. Please try again later.`,
+            activeJobs: activeJobs
+        });
+    }
+
+    const jobId = crypto.randomUUID();
+    const finalFilename = filename ? filename.replace(/[^a-zA-Z0-9_\-\.]/g, '_') : `video_${jobId}`;
+    const outputTemplate = path.join(__dirname, 'downloads', `${finalFilename}.%(ext)s`);
+
+    // Ensure downloads directory exists
+    const downloadsDir = path.join(__dirname, 'downloads');
+    if (!fs.existsSync(downloadsDir)) {
+        fs.mkdirSync(downloadsDir);
+    }
+
+    // Initialize job
+    jobs.set(jobId, { clients: [], phase: 'initializing' }); // phase: initializing, video, audio, merging
+
+    console.log(`Starting job ${jobId} for: ${url}`);
+
+    const ytDlpPath = getYtDlpPath();
+    const infoPath = path.join(downloadsDir, `.info_${jobId}.json`);
+
+    // Probe the selected codecs first so already-compatible sources are only remuxed
+    probeFormats(ytDlpPath, url, (probeErr, info) => {
+        const job = jobs.get(jobId);
+        if (!job) return;
+
+        let encodePath = 'transcode';
+        const args = ['--ffmpeg-location', ffmpegBinary];
+        if (probeErr) {
+            // Fall back to the original single-pass download with the safe re-encode
+            console.error(`Probe failed for job ${jobId}, falling back to transcode:`, probeErr.message);
+            args.push('-f', FORMAT_SPEC, url);
+        } else {
+            encodePath = chooseEncodePath(info);
+            fs.writeFileSync(infoPath, JSON.stringify(info));
+            // --load-info-json selects formats again (requested_formats is not kept), so
+            // name the probed ones; the default selector could pick e.g. VP9/Opus instead
+            args.push('--load-info-json', infoPath, '-f', probedFormatSpec(info));
+        }
+
+        job.encodePath = encodePath;
+        encodeStats[encodePath] += 1;
+        console.log(`Job ${jobId} encode path: ${encodePath} (stats: ${JSON.stringify(encodeStats)})`);
+
+        args.push(
+            '--merge-output-format', 'mp4', // This triggers the merge
+            // Re-encode to H.264 (libx264) + AAC only when the source is not already compatible
+            // Both paths add the faststart flag for web/mobile streaming
+            '--postprocessor-args', encodePath === 'remux' ? REMUX_ARGS : TRANSCODE_ARGS,
+            '-o', outputTemplate,
+            '--newline' // Important for parsing line-by-line
+        );
+
+        runDownload(jobId, ytDlpPath, args, finalFilename, () => fs.unlink(infoPath, () => { }));
+    });
 
     // Return current status immediately
     res.json({ jobId });
@@ -211,6 +294,11 @@ app.get('/events/:jobId', (req, res) => {
     });
 });
 
+app.get('/stats/encode', (req, res) => {
+    const merged = encodeStats.remux + encodeStats.transcode;
+    res.json({ ...encodeStats, remuxHitRate: merged ? encodeStats.remux / merged : 0 });
+});
+
 app.get('/file/:filename', (req, res) => {
     const { filename } = req.params;
     const filePath = path.join(__dirname, 'downloads', filename);
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Adaptive Fragment Concurrency
+Fetches the fragments of DASH/HLS streams on a window of parallel requests that
+grows while it raises throughput and shrinks on retries or slowdowns (AIMD),
+instead of one fragment after another
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from yt_dlp import downloader as yt_downloader
+from yt_dlp.downloader.dash import DashSegmentsFD
+from yt_dlp.downloader.hls import HlsFD
+
+from download_engine import MAX_FRAGMENTS, DEFAULT_HOST_FRAGMENTS, host_of
+
+# Window a stream starts with
+INITIAL_WINDOW = 2
+# Fragments finished per measuring round (at least; a round is one window's worth)
+MIN_ROUND = 4
+# Throughput gain over the last round that earns one more parallel fetch
+GROWTH = 0.10
+# Throughput loss against the last round that counts as congestion
+SLOWDOWN = 0.25
+
+
+class FragmentWindow:
+    """
+    AIMD window of parallel fragment fetches for one stream.
+
+    Throughput is measured per round (the fragments of one window, at least
+    MIN_ROUND). A round GROWTH faster than the last one adds a fetch, up to the
+    ceiling; one SLOWDOWN slower halves the window, and so does a retried
+    fragment (at most once per round); otherwise the window holds.
+    """
+
+    def __init__(self, ceiling, initial=INITIAL_WINDOW):
+        self.ceiling = max(1, min(int(ceiling), MAX_FRAGMENTS))
+        self.limit = min(initial, self.ceiling)
+        self.peak = self.limit
+        self.fragments = 0
+        self.retries = 0
+        self.backoffs = 0
+        # (window, bytes per second) of every round
+        self.rounds = []
+        self._lock = threading.Lock()
+        self._last_rate = None
+        self._start_round(time.monotonic())
+
+    def _start_round(self, now):
+        self._round_started = now
+        self._round_bytes = 0
+        self._round_fragments = 0
+        self._backed_off = False
+
+    def _set_limit(self, limit):
+        self.limit = max(1, min(self.ceiling, limit))
+        self.peak = max(self.peak, self.limit)
+
+    def record(self, nbytes):
+        """A fragment of nbytes finished"""
+        now = time.monotonic()
+        with self._lock:
+            self.fragments += 1
+            self._round_bytes += nbytes
+            self._round_fragments += 1
+            if self._round_fragments < max(MIN_ROUND, self.limit):
+                return
+            rate = self._round_bytes / max(1e-3, now - self._round_started)
+            self.rounds.append((self.limit, rate))
+            # A round with a backoff was measured partly at the old window: only start over
+            if not self._backed_off:
+                if self._last_rate is None or rate >= self._last_rate * (1 + GROWTH):
+                    self._set_limit(self.limit + 1)
+                elif rate < self._last_rate * (1 - SLOWDOWN):
+                    self._back_off()
+            self._last_rate = rate
+            self._start_round(now)
+
+    def error(self):
+        """A fragment is being retried (HTTP error, dropped connection)"""
+        with self._lock:
+            self.retries += 1
+            if not self._backed_off:
+                self._back_off()
+                self._backed_off = True
+
+    def _back_off(self):
+        self.backoffs += 1
+        self._set_limit(self.limit // 2)
+
+    def summary(self):
+        return (f"{self.fragments} fragments, window {self.limit} (peak {self.peak}, ceiling {self.ceiling}), "
+                f"{self.retries} retries, {self.backoffs} backoffs")
+
+
+class HostSlots:
+    """Parallel fragment fetches per host, across every stream in the process"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._active = {}
+
+    def acquire(self, host, limit):
+        with self._cond:
+            while self._active.get(host, 0) >= limit:
+                self._cond.wait()
+            self._active[host] = self._active.get(host, 0) + 1
+
+    def release(self, host):
+        with self._cond:
+            self._active[host] -= 1
+            if not self._active[host]:
+                del self._active[host]
+            self._cond.notify_all()
+
+
+_shared_slots = None
+_shared_lock = threading.Lock()
+
+
+def shared_host_slots():
+    """Process-wide per-host limiter, so parallel jobs on one host share its ceiling"""
+    global _shared_slots
+    with _shared_lock:
+        if _shared_slots is None:
+            _shared_slots = HostSlots()
+        return _shared_slots
+
+
+class AdaptivePool:
+    """
+    Stand-in for the thread pool yt-dlp fetches fragments on.
+
+    map() yields results in order, like Executor.map, but keeps only
+    window.limit calls running (and at most twice the ceiling unconsumed), and
+    each call also holds one of its host's slots.
+    """
+
+    def __init__(self, window, host, host_limit=DEFAULT_HOST_FRAGMENTS):
+        self.window = window
+        self.host = host
+        self.host_limit = max(1, host_limit)
+        self._pool = ThreadPoolExecutor(window.ceiling, thread_name_prefix='fragment')
+        self._cond = threading.Condition()
+        self._running = 0
+
+    def _call(self, fn, fragment):
+        slots = shared_host_slots()
+        slots.acquire(self.host, self.host_limit)
+        try:
+            result = fn(fragment)
+        finally:
+            slots.release(self.host)
+        # yt-dlp's call returns (fragment, index, file the fragment was written to)
+        if isinstance(result, tuple) and len(result) == 3:
+            fragment, index, path = result
+            # A skipped fragment leaves the file name of an earlier one (long since
+            # appended and deleted) in its context: report it as missing instead
+            if path and not path.endswith(f'-Frag{index}'):
+                path = None
+                result = (fragment, index, None)
+        else:
+            path = None
+        try:
+            self.window.record(os.path.getsize(path) if path else 0)
+        except OSError:
+            self.window.record(0)
+        return result
+
+    def _finished(self, future):
+        with self._cond:
+            self._running -= 1
+            self._cond.notify_all()
+
+    def map(self, fn, iterable):
+        fragments = iter(iterable)
+        pending = deque()
+        exhausted = False
+        while True:
+            with self._cond:
+                while (not exhausted and self._running < self.window.limit
+                       and len(pending) < 2 * self.window.ceiling):
+                    try:
+                        fragment = next(fragments)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    self._running += 1
+                    future = self._pool.submit(self._call, fn, fragment)
+                    future.add_done_callback(self._finished)
+                    pending.append(future)
+                if not pending:
+                    return
+                if not pending[0].done():
+                    self._cond.wait()
+                    continue
+            yield pending.popleft().result()
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        # After a failure, fragments not started yet are dropped
+        self.shutdown(wait=True, cancel_futures=exc_type is not None)
+
+
+class FragmentStats:
+    """Thread-safe totals of the adaptive windows of finished streams"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.streams = 0
+        self.fragments = 0
+        self.retries = 0
+        self.backoffs = 0
+        self.peak = 0
+        self.last = None
+
+    def record(self, window):
+        with self._lock:
+            self.streams += 1
+            self.fragments += window.fragments
+            self.retries += window.retries
+            self.backoffs += window.backoffs
+            self.peak = max(self.peak, window.peak)
+            self.last = window
+
+    def summary(self):
+        return (f"{self.streams} streams, {self.fragments} fragments, peak window {self.peak}, "
+                f"{self.retries} retries, {self.backoffs} backoffs")
+
+
+FRAGMENT_STATS = FragmentStats()
+
+
+class AdaptiveFragmentsMixin:
+    """
+    Fetch a stream's fragments on an AdaptivePool when params['adaptive_fragments']
+    is set: params['concurrent_fragment_downloads'] is the window's ceiling and
+    params['fragment_host_limit'] the cap per host. Live streams and yt-dlp's
+    multi-stream downloads (which bring their own pool) keep the stock behaviour.
+    """
+
+    _fragment_window = None
+
+    def download_and_append_fragments(self, ctx, fragments, info_dict, *, tpe=None, **kwargs):
+        ceiling = int(self.params.get('concurrent_fragment_downloads') or 1)
+        if (tpe is not None or ceiling <= 1 or not self.params.get('adaptive_fragments')
+                or info_dict.get('is_live')):
+            return super().download_and_append_fragments(ctx, fragments, info_dict, tpe=tpe, **kwargs)
+        window = self._fragment_window = FragmentWindow(ceiling)
+        # HTTP errors (5xx, dropped connections) are retried by the fragment's own downloader
+        dl = ctx.get('dl')
+        if dl is not None:
+            report_retry = dl.report_retry
+
+            def report_http_retry(*args, **kwargs):
+                window.error()
+                return report_retry(*args, **kwargs)
+
+            dl.report_retry = report_http_retry
+        host = host_of(info_dict.get('fragment_base_url') or info_dict.get('url') or '')
+        pool = AdaptivePool(window, host, int(self.params.get('fragment_host_limit') or DEFAULT_HOST_FRAGMENTS))
+        try:
+            return super().download_and_append_fragments(ctx, fragments, info_dict, tpe=pool, **kwargs)
+        finally:
+            self._fragment_window = None
+            FRAGMENT_STATS.record(window)
+
+    def report_retry(self, *args, **kwargs):
+        # Fragment-level retries (HTTP errors that reached download_and_append_fragments)
+        if self._fragment_window is not None:
+            self._fragment_window.error()
+        return super().report_retry(*args, **kwargs)
+
+
+class AdaptiveDashSegmentsFD(AdaptiveFragmentsMixin, DashSegmentsFD):
+    pass
+
+
+class AdaptiveHlsFD(AdaptiveFragmentsMixin, HlsFD):
+    pass
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install():
+    """
+    Route native DASH and HLS downloads through the adaptive downloaders.
+
+    Like segmented_download this changes yt-dlp's process-wide protocol map;
+    instances without params['adaptive_fragments'] behave exactly like stock.
+    """
+    global _installed
+    with _install_lock:
+        if not _installed:
+            for protocol, fd in (('http_dash_segments', AdaptiveDashSegmentsFD),
+                                 ('http_dash_segments_generator', AdaptiveDashSegmentsFD),
+                                 ('m3u8_native', AdaptiveHlsFD)):
+                yt_downloader.PROTOCOL_MAP[protocol] = fd
+            _installed = True
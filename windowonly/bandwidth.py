@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Bandwidth Manager
+Process-wide token bucket every download draws from: one global rate limit,
+shared between the jobs running at once in proportion to their weights, and
+adjustable while downloads are running
+"""
+
+import itertools
+import re
+import threading
+import time
+from collections import deque
+
+DEFAULT_WEIGHT = 1.0
+# Bucket depth in seconds of the rate: what an idle process may save up and send at once
+BURST_SECONDS = 0.25
+# Read size for throttled HTTP downloads (yt-dlp grows it to 4 MB otherwise), so every
+# grant is small and the shares stay even over short periods
+THROTTLED_BLOCK_SIZE = 64 * 1024
+# Seconds over which job and process rates are reported
+RATE_WINDOW = 3.0
+
+_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_rate(text):
+    """Bytes per second from '500K', '2.5M', '1G' or a plain number (like yt-dlp's -r); 0 = unlimited"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMG]?)(?:i?B)?(?:/s)?\s*', str(text), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"invalid rate {text!r} (examples: 500K, 2.5M, 0 for unlimited)")
+    return int(float(match.group(1)) * _UNITS[match.group(2).upper()])
+
+
+def format_rate(rate):
+    """Human-readable bytes per second ('unlimited' for 0)"""
+    if not rate:
+        return 'unlimited'
+    for unit in ('G', 'M', 'K'):
+        if rate >= _UNITS[unit]:
+            return f"{rate / _UNITS[unit]:.2f} {unit}B/s"
+    return f"{rate:.0f} B/s"
+
+
+class _RateMeter:
+    """Bytes per second over the last RATE_WINDOW seconds"""
+
+    def __init__(self):
+        self._samples = deque()
+        self._bytes = 0
+
+    def add(self, nbytes, now):
+        self._samples.append((now, nbytes))
+        self._bytes += nbytes
+        self._prune(now)
+
+    def _prune(self, now):
+        while self._samples and self._samples[0][0] < now - RATE_WINDOW:
+            self._bytes -= self._samples.popleft()[1]
+
+    def rate(self, now, since):
+        self._prune(now)
+        return self._bytes / max(1e-3, min(RATE_WINDOW, now - since))
+
+
+class BandwidthJob:
+    """
+    One download's claim on a BandwidthManager; close() it when the download ends.
+
+    consume(n) blocks until n bytes may be read. progress(d) charges what a
+    yt-dlp progress hook reports, for downloaders that read on their own.
+    """
+
+    def __init__(self, manager, name, weight=DEFAULT_WEIGHT):
+        self.manager = manager
+        self.name = name
+        self.weight = max(0.01, float(weight or DEFAULT_WEIGHT))
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.meter = _RateMeter()
+        # Virtual finish time of this job's last request (see BandwidthManager)
+        self.tag = 0.0
+        self._seen = {}
+
+    def consume(self, nbytes):
+        if nbytes > 0:
+            self.manager._consume(self, nbytes)
+
+    def progress(self, d):
+        """Charge the growth of 'downloaded_bytes' since the last hook for the same file"""
+        key = d.get('tmpfilename') or d.get('filename')
+        if d.get('status') != 'downloading':
+            self._seen.pop(key, None)
+            return
+        done = d.get('downloaded_bytes')
+        if done is None:
+            return
+        # The first report of a file only sets the baseline: a resumed download starts past 0
+        last = self._seen.get(key)
+        self._seen[key] = done
+        if last is not None:
+            self.consume(done - last)
+
+    def rate(self):
+        return self.meter.rate(time.monotonic(), self.started)
+
+    def close(self):
+        self.manager._remove(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BandwidthManager:
+    """
+    Token bucket with weighted fair sharing (start-time fair queuing).
+
+    Tokens refill at the global rate. Each request gets a virtual start tag:
+    its job's previous finish tag, or the current virtual time if the job was
+    idle (so idling saves up no credit); the finish tag adds bytes / weight.
+    Waiting requests are granted in tag order whenever the bucket has tokens,
+    so busy jobs get the rate in proportion to their weights, and a job that
+    cannot use its share (a slow origin) leaves it to the others.
+    A rate of 0 means unlimited; jobs are then only counted.
+    """
+
+    def __init__(self, rate=0):
+        self._cond = threading.Condition()
+        self._rate = max(0, int(rate or 0))
+        self._tokens = 0.0
+        self._stamp = time.monotonic()
+        self._vtime = 0.0
+        self._waiting = set()
+        self._order = itertools.count()
+        self._jobs = []
+        self._meter = _RateMeter()
+        self._started = time.monotonic()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @property
+    def limited(self):
+        return self._rate > 0
+
+    def set_rate(self, rate):
+        """Change the global limit (bytes per second, 0 = unlimited); waiting requests follow at once"""
+        with self._cond:
+            self._refill(time.monotonic())
+            self._rate = max(0, int(rate or 0))
+            self._tokens = min(self._tokens, self._rate * BURST_SECONDS)
+            self._cond.notify_all()
+
+    def job(self, name, weight=DEFAULT_WEIGHT):
+        """Register a download; use the returned BandwidthJob as a context manager"""
+        job = BandwidthJob(self, name, weight)
+        with self._cond:
+            self._jobs.append(job)
+        return job
+
+    def _remove(self, job):
+        with self._cond:
+            if job in self._jobs:
+                self._jobs.remove(job)
+
+    def _refill(self, now):
+        if self._rate:
+            self._tokens = min(self._rate * BURST_SECONDS, self._tokens + (now - self._stamp) * self._rate)
+        self._stamp = now
+
+    def _count(self, job, nbytes):
+        now = time.monotonic()
+        job.bytes += nbytes
+        job.meter.add(nbytes, now)
+        self._meter.add(nbytes, now)
+
+    def _consume(self, job, nbytes):
+        with self._cond:
+            if not self._rate:
+                self._count(job, nbytes)
+                return
+
+            start = max(job.tag, self._vtime)
+            job.tag = start + nbytes / job.weight
+            ticket = (start, next(self._order))
+            self._waiting.add(ticket)
+            try:
+                while self._rate:
+                    self._refill(time.monotonic())
+                    if self._tokens > 0 and ticket == min(self._waiting):
+                        # May go below zero: a large read is paid back before the next grant
+                        self._tokens -= nbytes
+                        self._vtime = start
+                        break
+                    self._cond.wait(max(0.001, -self._tokens / self._rate) if self._tokens <= 0 else 0.05)
+                # Counted when granted (or when the limit is lifted), so rates show what got through
+                self._count(job, nbytes)
+            finally:
+                self._waiting.discard(ticket)
+                self._cond.notify_all()
+
+    def throttle(self, chunks, name, weight=DEFAULT_WEIGHT):
+        """Yield from an iterable of byte chunks at this manager's pace (e.g. a streamed response)"""
+        with self.job(name, weight) as job:
+            for chunk in chunks:
+                job.consume(len(chunk))
+                yield chunk
+
+    def snapshot(self):
+        """Current limit, measured total rate and each job's weight, bytes and rate"""
+        now = time.monotonic()
+        with self._cond:
+            return {
+                'rate': self._rate,
+                'current': round(self._meter.rate(now, self._started)),
+                'jobs': [{'name': job.name, 'weight': job.weight, 'bytes': job.bytes,
+                          'rate': round(job.meter.rate(now, job.started))} for job in self._jobs],
+            }
+
+    def summary(self):
+        snap = self.snapshot()
+        return (f"limit {format_rate(snap['rate'])}, current {format_rate(snap['current'])}, "
+                f"{len(snap['jobs'])} active")
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_bandwidth():
+    """Process-wide manager (unlimited until set_rate), so every session draws from one bucket"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = BandwidthManager()
+        return _shared
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Batch Manifest
+Headless batch mode: a manifest (file or stdin) lists one item per line
+(URL, optional filename, quality, section); the items run on a bounded set of
+worker threads in one process, and each one's result is written as one NDJSON
+record the moment it finishes, followed by a summary record. The exit code
+summarizes the batch.
+
+Manifest lines are either JSON objects
+  {"url": "https://...", "filename": "talk", "quality": "720p", "section": "1:30-2:00"}
+or tab-separated columns (whitespace-separated when the line has no tab)
+  URL [FILENAME [QUALITY [SECTION]]]
+where an empty column or '-' leaves the field unset. Blank lines and lines
+starting with '#' are skipped. QUALITY is a rendition name or GUI quality label
+(see renditions; several comma-separated write them all from one download).
+"""
+
+import json
+import os
+import threading
+import time
+
+from download_engine import DEFAULT_WORKERS, DownloadEngine
+from renditions import parse_renditions, source_format
+from section_clip import parse_section
+
+# Exit codes of a manifest run
+EXIT_OK = 0
+EXIT_SOME_FAILED = 1
+# The manifest could not be opened or read to the end (same code as argparse's usage errors)
+EXIT_MANIFEST_ERROR = 2
+EXIT_ALL_FAILED = 3
+EXIT_INTERRUPTED = 130
+
+STATUS_DONE = 'done'
+# Finished by an earlier run (see job_journal)
+STATUS_SKIPPED = 'skipped'
+STATUS_FAILED = 'failed'
+# The manifest line could not be read; nothing was downloaded
+STATUS_INVALID = 'invalid'
+STATUS_CANCELLED = 'cancelled'
+
+_FIELDS = ('url', 'filename', 'quality', 'section')
+
+
+class ManifestError(Exception):
+    """A manifest line that cannot be turned into an item"""
+
+
+class ManifestItem(str):
+    """
+    One manifest line to download; a str (its URL), so it goes wherever batch
+    URLs go (engine, journal). renditions and section are None when the line
+    leaves them unset.
+    """
+
+    def __new__(cls, url, line, filename=None, renditions=None, section=None):
+        item = super().__new__(cls, url)
+        item.line = line
+        item.filename = filename
+        item.renditions = renditions
+        item.section = section
+        return item
+
+
+def parse_line(text, line):
+    """ManifestItem for one manifest line (line: its 1-based number), or None for blanks and comments"""
+    text = text.strip()
+    if not text or text.startswith('#'):
+        return None
+    if text.startswith('{'):
+        try:
+            fields = json.loads(text)
+        except ValueError as e:
+            raise ManifestError(f"line {line}: invalid JSON ({e})")
+        if not isinstance(fields, dict):
+            raise ManifestError(f"line {line}: expected a JSON object")
+        unknown = set(fields) - set(_FIELDS)
+        if unknown:
+            raise ManifestError(f"line {line}: unknown field(s) {', '.join(sorted(unknown))}")
+    else:
+        columns = text.split('\t') if '\t' in text else text.split(None, len(_FIELDS) - 1)
+        if len(columns) > len(_FIELDS):
+            raise ManifestError(f"line {line}: more than {len(_FIELDS)} columns")
+        fields = {name: value.strip() for name, value in zip(_FIELDS, columns)
+                  if value.strip() not in ('', '-')}
+
+    url = fields.get('url')
+    if not url or not isinstance(url, str):
+        raise ManifestError(f"line {line}: URL is required")
+    try:
+        renditions = parse_renditions(fields['quality']) if fields.get('quality') else None
+        section = parse_section(fields['section']) if fields.get('section') else None
+    except ValueError as e:
+        raise ManifestError(f"line {line}: {e}")
+    filename = str(fields['filename']) if fields.get('filename') else None
+    return ManifestItem(url.strip(), line, filename, renditions, section)
+
+
+def read_manifest(lines, on_error=None):
+    """
+    Items from manifest lines, read lazily (a manifest piped into stdin runs
+    while it is still being written). Lines that cannot be read are passed
+    to on_error(line, text, error) and skipped.
+    """
+    for line, text in enumerate(lines, 1):
+        try:
+            item = parse_line(text, line)
+        except ManifestError as e:
+            if on_error is None:
+                raise
+            on_error(line, text.strip(), e)
+            continue
+        if item is not None:
+            yield item
+
+
+class ResultWriter:
+    """NDJSON records to a text stream, one line per record, flushed at once (thread-safe)"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+
+class ManifestRunner:
+    """
+    Download manifest items on up to `workers` threads and report each result.
+
+    Each worker thread keeps one DownloadSession per source format (items
+    with an audio-only quality select different formats), so extractor and
+    connection setup are paid once per thread, not once per item. outtmpl_for
+    maps an item to its yt-dlp output template. Items the journal has as
+    finished are reported as skipped without downloading.
+    """
+
+    def __init__(self, opts, outtmpl_for, writer, workers=DEFAULT_WORKERS, default_section=None,
+                 default_renditions=None, cache=None, metadata=None, journal=None, metrics=None,
+                 bandwidth=None, handle=None):
+        self.opts = opts
+        self.outtmpl_for = outtmpl_for
+        self.writer = writer
+        self.workers = workers
+        self.default_section = default_section
+        self.default_renditions = default_renditions
+        self.cache = cache
+        self.metadata = metadata
+        self.journal = journal
+        self.metrics = metrics
+        self.bandwidth = bandwidth
+        self.handle = handle
+        self.counts = dict.fromkeys((STATUS_DONE, STATUS_SKIPPED, STATUS_FAILED, STATUS_INVALID,
+                                     STATUS_CANCELLED), 0)
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def _session(self, renditions):
+        from ydl_session import SessionPool
+
+        fmt = source_format(renditions) if renditions else self.opts['format']
+        with self._lock:
+            pool = self._pools.get(fmt)
+            if pool is None:
+                pool = self._pools[fmt] = SessionPool(dict(self.opts, format=fmt), cache=self.cache,
+                                                      metadata=self.metadata, journal=self.journal,
+                                                      metrics=self.metrics, bandwidth=self.bandwidth)
+        return pool.get()
+
+    def _report(self, status, record):
+        with self._lock:
+            self.counts[status] += 1
+        self.writer.write({'type': 'item', 'status': status, **record})
+
+    def report_invalid(self, line, text, error):
+        """on_error for read_manifest: the line gets an 'invalid' record"""
+        self._report(STATUS_INVALID, {'line': line, 'url': None, 'error': str(error), 'input': text})
+
+    def _run_item(self, index, item):
+        renditions = item.renditions or self.default_renditions
+        if renditions == ('best',):
+            # A plain full-quality output takes the default path (remux or transcode, chunked encodes)
+            renditions = None
+        section = item.section or self.default_section
+        outtmpl = self.outtmpl_for(item)
+        record = {'line': item.line, 'url': str(item)}
+        session = self._session(renditions)
+        if self.journal is not None:
+            # Keyed on what the line asks for too: the same URL and file name at another quality is not done
+            profile = session.job_profile(renditions, section)
+            self.journal.enqueue([(item, outtmpl)], profile)
+            done = self.journal.finished(item, outtmpl, profile)
+            if done:
+                self._report(STATUS_SKIPPED, {**record, 'output': done, 'files': [done],
+                                              'bytes': _size(done)})
+                return True
+
+        started = time.monotonic()
+        try:
+            _, encode_path = session.download(item, outtmpl, handle=self.handle, section=section,
+                                              renditions=renditions)
+        except Exception as e:
+            cancelled = self.handle is not None and self.handle.cancelled
+            record.update(error=str(e), seconds=round(time.monotonic() - started, 3))
+            if session.last_timer is not None:
+                record['timings'] = session.last_timer.as_dict()['phases']
+            self._report(STATUS_CANCELLED if cancelled else STATUS_FAILED, record)
+            if cancelled:
+                # Let the engine stop starting items
+                raise
+            return False
+
+        files = list(session.last_outputs)
+        record.update(output=session.last_output, files=files, bytes=sum(_size(path) for path in files),
+                      encode_path=encode_path, seconds=round(time.monotonic() - started, 3),
+                      timings=session.last_timer.as_dict()['phases'])
+        self._report(STATUS_DONE, record)
+        return True
+
+    def run(self, items):
+        """Run every item (an iterable, read as workers free up); returns the exit code"""
+        started = time.monotonic()
+        should_stop = (lambda: self.handle.cancelled) if self.handle is not None else None
+        engine = DownloadEngine(workers=self.workers, should_stop=should_stop)
+        interrupted = False
+        error = None
+        try:
+            engine.run(items, self._run_item)
+        except KeyboardInterrupt:
+            interrupted = True
+        except Exception as e:
+            # Raised by the manifest (e.g. a read error) once the started items have finished
+            error = e
+        finally:
+            with self._lock:
+                pools, self._pools = list(self._pools.values()), {}
+            for pool in pools:
+                pool.close()
+
+        interrupted = interrupted or (self.handle is not None and self.handle.cancelled)
+        code = self.exit_code(interrupted, error is not None)
+        summary = {'type': 'summary', 'total': sum(self.counts.values()), **self.counts,
+                   'seconds': round(time.monotonic() - started, 3), 'exit_code': code}
+        if error is not None:
+            summary['error'] = f"manifest: {error}"
+        self.writer.write(summary)
+        return code
+
+    def exit_code(self, interrupted=False, manifest_error=False):
+        """Exit code for the items reported so far"""
+        if interrupted:
+            return EXIT_INTERRUPTED
+        if manifest_error:
+            return EXIT_MANIFEST_ERROR
+        succeeded = self.counts[STATUS_DONE] + self.counts[STATUS_SKIPPED]
+        failed = self.counts[STATUS_FAILED] + self.counts[STATUS_INVALID] + self.counts[STATUS_CANCELLED]
+        if not failed:
+            return EXIT_OK
+        return EXIT_SOME_FAILED if succeeded else EXIT_ALL_FAILED
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark - global bandwidth limit shared by concurrent downloads
+Downloads large blobs from the unthrottled local origin on several sessions at
+once, all drawing from one BandwidthManager with the given weights, and compares
+the measured total and per-job rates with the limit and the expected shares
+(limit * weight / total weight). Halfway through the limit is changed with
+set_rate, as the CLI/GUI field and PUT /bandwidth do, and measured again.
+Runs once with plain HTTP downloads and once with segmented ones, then checks
+the job server's /bandwidth API with Flask's test client.
+
+Usage: python benchmarks/bench_bandwidth.py [--rate 2M] [--new-rate 4M] [--weights 1 1 2] [--phase 6]
+"""
+
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bandwidth import BandwidthManager, format_rate, parse_rate
+from local_origin import LocalOrigin
+from ydl_session import DownloadSession
+
+# Deviation from the expected rate still counted as ok
+TOLERANCE = 0.10
+
+
+def opts(out_dir, segments):
+    return {
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+        'outtmpl': str(out_dir / '%(id)s.%(ext)s'),
+        'segments': segments,
+    }
+
+
+def measure(manager, names, seconds):
+    """Per-job bytes per second over the next seconds, from the manager's job counters"""
+    def counters():
+        return {job['name']: job['bytes'] for job in manager.snapshot()['jobs']}
+
+    before, start = counters(), time.monotonic()
+    time.sleep(seconds)
+    after, elapsed = counters(), time.monotonic() - start
+    return {name: (after.get(name, 0) - before.get(name, 0)) / elapsed for name in names}
+
+
+def report(label, rates, limit, weights):
+    total_weight = sum(weights)
+    total = sum(rates.values())
+    ok = abs(total - limit) <= TOLERANCE * limit
+    print(f"  {label}: limit {format_rate(limit)}, measured {format_rate(total)} "
+          f"({total / limit:.0%}) {'ok' if ok else 'OFF'}")
+    for (name, rate), weight in zip(rates.items(), weights):
+        expected = limit * weight / total_weight
+        job_ok = abs(rate - expected) <= TOLERANCE * expected
+        ok &= job_ok
+        print(f"    {name:<28} weight {weight:<4g} {format_rate(rate):>12}  "
+              f"expected {format_rate(expected):>12} ({rate / expected:.0%}) {'ok' if job_ok else 'OFF'}")
+    return ok
+
+
+def run_shared(origin, out_dir, segments, rate, new_rate, weights, phase):
+    """Concurrent downloads under one manager; True when every rate is within TOLERANCE"""
+    manager = BandwidthManager(rate)
+    # Big enough to outlast both phases at the higher rate
+    size = int(max(rate, new_rate) * phase * 2 / len(weights) * max(weights) / min(weights) * 1.5)
+    urls = [origin.url(f'/blob/job{n}-s{segments}.mp4', size=size) for n in range(len(weights))]
+    stop = threading.Event()
+
+    def hook(d):
+        if stop.is_set():
+            raise Exception("STOP_REQUESTED")
+
+    def download(url, weight):
+        with DownloadSession(opts(out_dir, segments), bandwidth=manager) as session:
+            try:
+                session.download(url, str(out_dir / '%(id)s.%(ext)s'), progress_hook=hook, probe=False,
+                                 weight=weight)
+            except Exception:
+                pass
+
+    threads = [threading.Thread(target=download, args=(url, weight)) for url, weight in zip(urls, weights)]
+    for thread in threads:
+        thread.start()
+    try:
+        # Wait until every job is past extraction and reading, then let the shares settle
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            reading = [job for job in manager.snapshot()['jobs'] if job['bytes']]
+            if len(reading) == len(urls):
+                break
+            time.sleep(0.1)
+        time.sleep(1.0)
+        ok = report(f"{format_rate(rate)}", measure(manager, urls, phase), rate, weights)
+        manager.set_rate(new_rate)
+        time.sleep(1.0)
+        ok &= report(f"after set_rate({format_rate(new_rate)})", measure(manager, urls, phase), new_rate, weights)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return ok
+
+
+def check_server_api(downloads_dir):
+    """GET/PUT /bandwidth on the job server app, plus the /metrics gauges"""
+    from job_server import JobScheduler, create_app
+
+    manager = BandwidthManager()
+    scheduler = JobScheduler(downloads_dir, workers=1, bandwidth=manager)
+    client = create_app(scheduler).test_client()
+    problems = []
+    if client.get('/bandwidth').get_json()['rate'] != 0:
+        problems.append('not unlimited at start')
+    response = client.put('/bandwidth', json={'rate': '1.5M'})
+    if response.status_code != 200 or manager.rate != parse_rate('1.5M'):
+        problems.append(f'PUT 1.5M -> {response.status_code}, rate {manager.rate}')
+    if client.put('/bandwidth', json={'rate': 'fast'}).status_code != 400:
+        problems.append('invalid rate accepted')
+    if client.post('/download', json={'url': 'http://x', 'weight': 0}).status_code != 400:
+        problems.append('weight 0 accepted')
+    if f'ydownloader_bandwidth_limit_bytes_per_second {manager.rate}' not in client.get('/metrics').get_data(True):
+        problems.append('limit missing from /metrics')
+    print(f"  /bandwidth API: {'; '.join(problems) or 'ok'}")
+    return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rate', type=parse_rate, default='2M', help="limit for the first phase")
+    parser.add_argument('--new-rate', type=parse_rate, default='4M', help="limit set halfway through")
+    parser.add_argument('--weights', type=float, nargs='+', default=[1, 1, 2], help="one job per weight")
+    parser.add_argument('--phase', type=float, default=6.0, help="seconds measured per limit")
+    parser.add_argument('--segments', type=int, nargs='+', default=[1, 4],
+                        help="range connections per download to try (1 = yt-dlp's HTTP downloader)")
+    args = parser.parse_args()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp, LocalOrigin() as origin:
+        tmp = Path(tmp)
+        for segments in args.segments:
+            print(f"{len(args.weights)} concurrent downloads, segments={segments}")
+            ok &= run_shared(origin, tmp / f's{segments}', segments, args.rate, args.new_rate,
+                             args.weights, args.phase)
+        print("job server")
+        ok &= check_server_api(tmp / 'server')
+    print('all within tolerance' if ok else f'some rates are more than {TOLERANCE:.0%} off')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Benchmark - time from cancel to CPU release
+Starts a long VP9 -> H.264 transcode from the local origin in each of the ways
+a job runs (yt-dlp's merger, chunked encode, encode while downloading, the
+pipeline's encode process, a job server job cancelled over POST /cancel/<id>),
+cancels it once ffmpeg is busy, and measures how long its ffmpeg processes keep
+running, when the job gives its worker back and which files it leaves behind.
+The first row is the old stop request (progress hook only) for comparison.
+
+ffmpeg processes are found under this process in /proc, so this runs on Linux.
+
+Usage: python benchmarks/bench_cancel.py [--duration 150] [--settle 2] [--scenarios merger server ...]
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cancellation import JobHandle
+from local_origin import LocalOrigin
+from media_fixtures import generate, item_urls
+from youtube_downloader_cli import build_ydl_opts
+
+# A cancelled job must free the CPU and its worker within this many seconds
+RELEASE_LIMIT = 5.0
+# The old stop request is given this long before the benchmark kills its ffmpeg itself
+HOOK_STOP_LIMIT = 120.0
+# Partial downloads and finished stream files, kept for a resume when the cancel does not discard
+RESUMABLE = re.compile(r'\.f[^.]+\.\w+(\.part)?$|\.part(-Frag\d+)?$|\.segments$|\.ytdl$')
+
+
+def _stat(pid):
+    """(name, ppid, cpu ticks) of a live process, None when it is gone or a zombie"""
+    try:
+        with open(f'/proc/{pid}/stat', encoding='utf-8', errors='replace') as f:
+            data = f.read()
+    except OSError:
+        return None
+    name = data[data.index('(') + 1:data.rindex(')')]
+    fields = data[data.rindex(')') + 2:].split()
+    if fields[0] in ('Z', 'X'):
+        return None
+    return name, int(fields[1]), int(fields[11]) + int(fields[12])
+
+
+def ffmpeg_processes():
+    """{pid: cpu ticks} of the ffmpeg processes below this one"""
+    stats = {int(pid): _stat(pid) for pid in os.listdir('/proc') if pid.isdigit()}
+    stats = {pid: stat for pid, stat in stats.items() if stat}
+    below, frontier = set(), {os.getpid()}
+    while frontier:
+        frontier = {pid for pid, (_, ppid, _) in stats.items() if ppid in frontier} - below
+        below |= frontier
+    return {pid: stats[pid][2] for pid in below if stats[pid][0].startswith('ffmpeg')}
+
+
+class Watch:
+    """Follows every ffmpeg process seen below this one, also after it is orphaned"""
+
+    def __init__(self):
+        self.first_seen = {}
+        self.ticks = {}
+
+    def poll(self):
+        now = time.monotonic()
+        for pid, ticks in ffmpeg_processes().items():
+            self.first_seen.setdefault(pid, now)
+            self.ticks[pid] = ticks
+        alive = {}
+        for pid in self.first_seen:
+            stat = _stat(pid)
+            if stat is not None:
+                alive[pid] = stat[2]
+                self.ticks[pid] = stat[2]
+        return alive
+
+    def busy_since(self, seconds):
+        """True once an ffmpeg process has run for seconds (probes are short-lived)"""
+        now = time.monotonic()
+        return any(now - self.first_seen[pid] >= seconds for pid in self.poll())
+
+
+def leftovers(folder):
+    """Files left in folder: (resumable downloads, others)"""
+    files = [p.name for p in Path(folder).rglob('*') if p.is_file()]
+    resumable = [name for name in files if RESUMABLE.search(name)]
+    return resumable, [name for name in files if name not in resumable]
+
+
+def opts_for(out_dir, **options):
+    opts = build_ydl_opts(str(out_dir / '%(id)s.%(ext)s'), segments=1, **options)
+    opts.pop('logger')
+    opts.update(quiet=True, no_warnings=True, noprogress=True, progress_hooks=[])
+    return opts
+
+
+def session_case(url, out_dir, use_handle=True, **options):
+    """(run, cancel) for one DownloadSession.download; without a handle, the old hook-only stop"""
+    from ydl_session import DownloadSession
+
+    handle = JobHandle('bench') if use_handle else None
+    stop = threading.Event()
+
+    def hook(d):
+        if stop.is_set():
+            raise Exception("STOP_REQUESTED")
+
+    def run():
+        with DownloadSession(opts_for(out_dir, **options)) as session:
+            session.download(url, str(out_dir / '%(id)s.%(ext)s'), progress_hook=hook, handle=handle)
+
+    def cancel():
+        stop.set()
+        if handle is not None:
+            handle.cancel()
+    return run, cancel
+
+
+def pipeline_case(url, out_dir):
+    from pipeline import StagedPipeline
+    from toolchain import ffmpeg_path
+
+    handle = JobHandle('bench')
+    staged = StagedPipeline(opts_for(out_dir, chunk_encoders=1), ffmpeg=ffmpeg_path(), download_workers=1,
+                            encode_workers=1, handle=handle)
+    return lambda: staged.run([(url, str(out_dir / '%(id)s.%(ext)s'))]), handle.cancel
+
+
+def server_case(url, out_dir, answers):
+    """A job server job, cancelled with POST /cancel/<id>; answers gets the response and queue stats"""
+    from job_server import JobScheduler, create_app
+
+    scheduler = JobScheduler(out_dir, workers=1)
+    client = create_app(scheduler).test_client()
+    job = {}
+
+    def run():
+        job['id'] = client.post('/download', json={'url': url, 'filename': 'job'}).get_json()['jobId']
+        scheduler.get(job['id']).released.wait()
+
+    def cancel():
+        response = client.post(f"/cancel/{job['id']}")
+        answers.update(status=response.status_code, body=response.get_json(), stats=scheduler.stats())
+    return run, cancel
+
+
+def measure(label, run, cancel, out_dir, settle, limit):
+    errors = []
+
+    def target():
+        try:
+            run()
+        except Exception as e:
+            errors.append(e)
+
+    watch = Watch()
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 300
+    while not watch.busy_since(settle):
+        if not thread.is_alive() or time.monotonic() > deadline:
+            print(f"{label:<22} ffmpeg never got busy ({errors[0] if errors else 'finished first'})")
+            return False
+        time.sleep(0.05)
+
+    before = dict(watch.ticks)
+    start = time.monotonic()
+    cancel()
+    cancel_call = time.monotonic() - start
+    cpu_free = job_free = None
+    while time.monotonic() - start < limit:
+        if cpu_free is None and not watch.poll():
+            cpu_free = time.monotonic() - start
+        if job_free is None and not thread.is_alive():
+            job_free = time.monotonic() - start
+        if cpu_free is not None and job_free is not None:
+            break
+        time.sleep(0.02)
+    for pid in watch.poll():
+        # Past the limit: end it here so the next scenario starts on an idle CPU
+        os.kill(pid, 9)
+    thread.join(30)
+    cpu_after = sum(watch.ticks[pid] - before.get(pid, 0) for pid in watch.ticks) / os.sysconf('SC_CLK_TCK')
+    resumable, others = leftovers(out_dir)
+
+    def fmt(seconds):
+        return f"{seconds:.2f}" if seconds is not None else f">{limit:.0f}"
+
+    print(f"{label:<22} {len(watch.first_seen):>6} {cancel_call:>9.3f} {fmt(cpu_free):>9} {fmt(job_free):>9} "
+          f"{cpu_after:>8.2f} {len(resumable):>6}  {', '.join(others) or '-'}")
+    return cpu_free is not None and job_free is not None and cpu_free <= RELEASE_LIMIT and job_free <= RELEASE_LIMIT
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=int, default=150, help="seconds of source video (long enough to cancel)")
+    parser.add_argument('--settle', type=float, default=2.0, help="seconds ffmpeg runs before the cancel")
+    parser.add_argument('--media-dir', help="keep the generated fixtures here to reuse between runs")
+    parser.add_argument('--scenarios', nargs='+',
+                        default=['hook_stop', 'merger', 'chunked', 'overlap', 'pipeline', 'server'])
+    args = parser.parse_args()
+    if not os.path.isdir('/proc'):
+        sys.exit("This benchmark reads /proc (Linux only)")
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        media_dir = Path(args.media_dir) if args.media_dir else tmp / 'media'
+        print(f"generating {args.duration}s fixtures in {media_dir}...")
+        generate(media_dir, duration=args.duration)
+        with LocalOrigin(media_dir=media_dir) as origin:
+            urls = iter(item_urls(origin.base_url, 'vp9', len(args.scenarios)))
+            print(f"{'scenario':<22} {'ffmpeg':>6} {'cancel s':>9} {'cpu free':>9} {'job free':>9} "
+                  f"{'cpu s':>8} {'parts':>6}  other files left")
+            for name in args.scenarios:
+                out_dir = tmp / name
+                out_dir.mkdir()
+                url = next(urls)
+                answers = {}
+                limit = HOOK_STOP_LIMIT if name == 'hook_stop' else RELEASE_LIMIT * 4
+                run, cancel = {
+                    'hook_stop': lambda: session_case(url, out_dir, use_handle=False, chunk_encoders=1),
+                    'merger': lambda: session_case(url, out_dir, chunk_encoders=1),
+                    'chunked': lambda: session_case(url, out_dir, chunk_encoders=2),
+                    'overlap': lambda: session_case(url, out_dir, chunk_encoders=1, overlap=True),
+                    'pipeline': lambda: pipeline_case(url, out_dir),
+                    'server': lambda: server_case(url, out_dir, answers),
+                }[name]()
+                released = measure(name, run, cancel, out_dir, args.settle, limit)
+                if name != 'hook_stop':
+                    ok &= released
+                if answers:
+                    print(f"{'':<22} POST /cancel -> {answers['status']} {answers['body']}, "
+                          f"queue after: {answers['stats']}")
+    print(f"cancelled jobs freed the CPU and their worker within {RELEASE_LIMIT:.0f}s" if ok
+          else f"some cancelled jobs took longer than {RELEASE_LIMIT:.0f}s")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
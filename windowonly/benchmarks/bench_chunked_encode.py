@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark - single-process transcode vs. chunked transcode of a long video
+Encodes a synthetic VP9/Opus source to H.264/AAC the way the merger does (one
+ffmpeg run) and with chunked_encode at several encoder counts, then checks each
+output: same frame count and duration, H.264 + AAC, moov before mdat (+faststart).
+
+Usage: python benchmarks/bench_chunked_encode.py [--duration 600] [--size 1280x720] [--encoders 2 4 8]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chunked_encode import chunk_seconds_for, chunked_transcode
+from encode_profile import TRANSCODE_ARGS, build_ffmpeg_command
+from media_fixtures import find_ffmpeg
+
+
+def make_source(directory, duration, size, ffmpeg):
+    """Separate VP9 video and Opus audio files, like a DASH download (reused when present)"""
+    video, audio = directory / f'long_{duration}s_{size}.webm', directory / f'long_{duration}s.opus.webm'
+    if not video.exists():
+        subprocess.run([ffmpeg, '-y', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+                        '-i', f'testsrc2=size={size}:rate=30:duration={duration}', '-an', '-c:v', 'libvpx-vp9',
+                        '-deadline', 'realtime', '-cpu-used', '8', '-b:v', '2M', str(video)], check=True)
+    if not audio.exists():
+        subprocess.run([ffmpeg, '-y', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+                        '-i', f'sine=frequency=440:sample_rate=48000:duration={duration}', '-vn',
+                        '-c:a', 'libopus', '-b:a', '96k', str(audio)], check=True)
+    return [{'path': str(video), 'video': True, 'audio': False},
+            {'path': str(audio), 'video': False, 'audio': True}]
+
+
+def check_output(ffmpeg, path):
+    """(frames, seconds, problems) from a full decode of the output"""
+    probe = subprocess.run([ffmpeg, '-hide_banner', '-i', str(path), '-f', 'null', '-'],
+                           capture_output=True, text=True, errors='replace').stderr
+    problems = []
+    if not re.search(r'Video: h264 \(\w+\).*yuv420p', probe):
+        problems.append('video is not H.264 yuv420p')
+    if 'Audio: aac' not in probe:
+        problems.append('audio is not AAC')
+    with open(path, 'rb') as f:
+        head = f.read(1024 * 1024)
+    if head.find(b'moov') < 0 or head.find(b'moov') > head.find(b'mdat'):
+        problems.append('moov is not before mdat')
+    frames = re.findall(r'frame=\s*(\d+)', probe)
+    times = re.findall(r'time=(\d+):(\d+):(\d+(?:\.\d+)?)', probe)
+    seconds = None
+    if times:
+        hours, minutes, secs = times[-1]
+        seconds = int(hours) * 3600 + int(minutes) * 60 + float(secs)
+    return int(frames[-1]) if frames else None, seconds, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=int, default=600, help="seconds of source video")
+    parser.add_argument('--size', default='1280x720')
+    parser.add_argument('--encoders', type=int, nargs='+', default=None,
+                        help="chunked encoder counts to try (default: CPU count and half of it)")
+    parser.add_argument('--media-dir', help="keep the generated source here to reuse between runs")
+    args = parser.parse_args()
+
+    ffmpeg = find_ffmpeg()
+    cores = os.cpu_count() or 1
+    encoder_counts = args.encoders or sorted({max(2, cores // 2), max(2, cores)})
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        media_dir = Path(args.media_dir) if args.media_dir else tmp
+        media_dir.mkdir(parents=True, exist_ok=True)
+        print(f"generating a {args.duration}s {args.size} VP9/Opus source in {media_dir}...")
+        inputs = make_source(media_dir, args.duration, args.size, ffmpeg)
+
+        print(f"{cores} CPU cores")
+        print(f"{'mode':<18} {'chunks':>6} {'wall s':>8} {'speedup':>8} {'x rt':>6} {'frames':>7} {'MB':>7}  check")
+        runs = [('single process', None)] + [(f'chunked x{n}', n) for n in encoder_counts]
+        baseline = frames_ref = None
+        for label, encoders in runs:
+            output = tmp / f"out_{encoders or 1}.mp4"
+            start = time.perf_counter()
+            chunks = '-'
+            if encoders is None:
+                subprocess.run(build_ffmpeg_command(ffmpeg, inputs, str(output), TRANSCODE_ARGS), check=True,
+                               capture_output=True)
+            else:
+                chunks = chunked_transcode(ffmpeg, inputs, output, encoders,
+                                           chunk_seconds_for(args.duration, encoders) or args.duration)
+            wall = time.perf_counter() - start
+            baseline = baseline or wall
+            frames, seconds, problems = check_output(ffmpeg, output)
+            frames_ref = frames_ref or frames
+            if frames != frames_ref:
+                problems.append(f'{frames} frames, single process has {frames_ref}')
+            if seconds is None or abs(seconds - args.duration) > 0.5:
+                problems.append(f'duration {seconds}')
+            print(f"{label:<18} {chunks:>6} {wall:>8.1f} {baseline / wall:>7.2f}x {args.duration / wall:>6.1f} "
+                  f"{frames or 0:>7} {output.stat().st_size / 1024 ** 2:>7.1f}  {'; '.join(problems) or 'ok'}")
+            output.unlink()
+
+
+if __name__ == "__main__":
+    main()
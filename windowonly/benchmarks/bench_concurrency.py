@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark - batch wall-clock time vs. DownloadEngine worker count
+Every item is a latency-bound fetch from the local origin, standing in for a yt-dlp download.
+The engine runs with its default per-host cap, as the GUI, CLI pipeline and manifest
+batches do, and the peak of jobs running at once must reach the worker count.
+
+Usage: python benchmarks/bench_concurrency.py [--items 40] [--latency 0.2] [--size 262144]
+"""
+
+import argparse
+import sys
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from download_engine import DownloadEngine
+from local_origin import LocalOrigin
+
+
+def run_batch(urls, workers, max_per_host=None):
+    """(wall seconds, most jobs running at once, per-host cap) of one batch"""
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def fetch(index, url):
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        try:
+            with urllib.request.urlopen(url) as resp:
+                while resp.read(64 * 1024):
+                    pass
+        finally:
+            with lock:
+                running[0] -= 1
+        return True
+
+    engine = DownloadEngine(workers=workers, max_per_host=max_per_host)
+    start = time.perf_counter()
+    results = engine.run(urls, fetch)
+    elapsed = time.perf_counter() - start
+    assert all(results.values()), "some fetches failed"
+    return elapsed, running[1], engine.max_per_host
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=40)
+    parser.add_argument('--latency', type=float, default=0.2, help="per-request latency in seconds")
+    parser.add_argument('--size', type=int, default=256 * 1024, help="payload size in bytes")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    with LocalOrigin() as origin:
+        urls = [origin.url(f"/blob/{i}", size=args.size, latency=args.latency) for i in range(args.items)]
+
+        print(f"{args.items} items, {args.latency * 1000:.0f} ms latency, {args.size // 1024} KiB each")
+        print(f"{'workers':>8} {'per-host':>9} {'peak':>5} {'wall (s)':>9} {'speedup':>8}")
+        baseline = None
+        ok = True
+        for workers in args.workers:
+            elapsed, peak, per_host = run_batch(urls, workers)
+            baseline = baseline or elapsed
+            ok &= peak == min(workers, args.items)
+            print(f"{workers:>8} {per_host:>9} {peak:>5} {elapsed:>9.2f} {baseline / elapsed:>7.1f}x")
+
+        # Show an explicit per-host cap holding the widest pool back
+        widest = max(args.workers)
+        elapsed, peak, per_host = run_batch(urls, widest, max_per_host=2)
+        print(f"{widest:>8} {per_host:>9} {peak:>5} {elapsed:>9.2f} {baseline / elapsed:>7.1f}x  (per-host cap)")
+    print("OK: every worker runs on a one-host batch" if ok else "FAILED: the default per-host cap holds workers back")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
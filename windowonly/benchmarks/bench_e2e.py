@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Benchmark - offline end-to-end suite over the CLI, pipeline, GUI worker and job server
+Every scenario downloads synthetic DASH/progressive media from the local origin
+(no network, no YouTube) in a fresh process with an empty cache, and reports
+wall time, origin throughput, CPU seconds per output minute and peak RSS
+
+Usage: python benchmarks/bench_e2e.py [--items 4] [--duration 10] [--scenarios cli_remux server ...]
+       python benchmarks/bench_e2e.py --compare benchmarks/results/e2e-<time>.json [--tolerance 0.15]
+"""
+
+import argparse
+import json
+import os
+import platform
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+APP_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(APP_DIR))
+
+from local_origin import LocalOrigin
+from media_fixtures import DEFAULT_DURATION, generate, item_urls
+
+RESULTS_DIR = BENCH_DIR / 'results'
+OUTPUT_EXTS = ('.mp4', '.m4a', '.webm', '.mp3')
+# Metrics compared against a baseline (all lower is better)
+COMPARED = ('wall_s', 'cpu_s_per_output_min', 'peak_rss_mb')
+
+
+def mixed_urls(base_url, items):
+    """A batch cycling through remux, transcode and progressive items"""
+    sets = [item_urls(base_url, name, items) for name in ('h264', 'vp9', 'progressive')]
+    return [sets[i % 3][i] for i in range(items)]
+
+
+# Scenarios run in the child process; each returns the number of items that succeeded
+
+def scenario_cli(media_set, overlap=False):
+    def run(args, out_dir):
+        import youtube_downloader_cli as cli
+        urls = item_urls(args.origin, media_set, args.items)
+        return sum(bool(cli.download_video(url, out_dir, f'item{n}', overlap=overlap))
+                   for n, url in enumerate(urls, 1))
+    return run
+
+
+def scenario_pipeline(args, out_dir):
+    import youtube_downloader_cli as cli
+    return cli.download_pipeline(mixed_urls(args.origin, args.items), out_dir, [], workers=args.workers)
+
+
+def scenario_gui(args, out_dir):
+    from cancellation import JobHandle
+    from gui_events import ProgressCoalescer
+    from youtube_downloader_gui import YouTubeDownloaderGUI
+
+    # The worker thread only talks to the window through these queues, so no Tk root is needed
+    urls = mixed_urls(args.origin, args.items)
+    gui = YouTubeDownloaderGUI.__new__(YouTubeDownloaderGUI)
+    gui.message_queue = queue.Queue()
+    gui.progress_events = ProgressCoalescer()
+    gui.stop_requested = False
+    gui.batch_handle = JobHandle('batch')
+    gui.total_jobs = len(urls)
+    gui.download_worker(urls, str(out_dir), [], "Best Quality", args.workers)
+    return len(outputs(out_dir))
+
+
+def scenario_server(args, out_dir):
+    try:
+        import flask  # noqa: F401  (job_server exits when Flask is missing)
+    except ImportError:
+        return None
+    from werkzeug.serving import make_server
+    import job_server
+    from file_serving import sendfile_request_handler
+
+    downloads = Path(out_dir) / 'server'
+    scheduler = job_server.JobScheduler(downloads, workers=args.workers)
+    server = make_server('127.0.0.1', 0, job_server.create_app(scheduler), threaded=True,
+                         request_handler=sendfile_request_handler())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.port}'
+
+    def client(n, url):
+        # Same calls as public/script.js: submit, follow the SSE stream, fetch the file
+        body = json.dumps({'url': url, 'filename': f'item{n}'}).encode()
+        request = urllib.request.Request(f'{base}/download', data=body,
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request) as response:
+            job_id = json.load(response)['jobId']
+        event = {}
+        with urllib.request.urlopen(f'{base}/events/{job_id}') as stream:
+            for line in stream:
+                if line.startswith(b'data:'):
+                    event = json.loads(line[5:])
+                    if event.get('status') in ('completed', 'error'):
+                        break
+        if event.get('status') != 'completed':
+            return False
+        with urllib.request.urlopen(f"{base}/file/{urllib.request.quote(event['filename'])}") as response:
+            (Path(out_dir) / event['filename']).write_bytes(response.read())
+        return True
+
+    try:
+        urls = mixed_urls(args.origin, args.items)
+        with ThreadPoolExecutor(len(urls)) as executor:
+            return sum(executor.map(client, range(1, len(urls) + 1), urls))
+    finally:
+        server.shutdown()
+
+
+SCENARIOS = {
+    'cli_remux': scenario_cli('h264'),
+    'cli_transcode': scenario_cli('vp9'),
+    # Same items, transcoded while they download (compare with cli_transcode under --rate)
+    'cli_overlap': scenario_cli('vp9', overlap=True),
+    'cli_progressive': scenario_cli('progressive'),
+    'pipeline': scenario_pipeline,
+    'gui_worker': scenario_gui,
+    'server': scenario_server,
+}
+
+
+def outputs(out_dir):
+    return [p for p in Path(out_dir).iterdir() if p.is_file() and p.suffix in OUTPUT_EXTS]
+
+
+def peak_rss_mb():
+    """(this process, largest child) peak resident set in MiB"""
+    try:
+        import resource
+    except ImportError:
+        return _windows_peak_rss_mb(), None
+    # ru_maxrss is in bytes on macOS, KiB elsewhere
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return tuple(resource.getrusage(who).ru_maxrss * scale / 1024 ** 2
+                 for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+
+
+def _windows_peak_rss_mb():
+    try:
+        import ctypes
+        from ctypes import wintypes
+    except ImportError:
+        return None
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in (
+                'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                    ctypes.byref(counters), counters.cb):
+        return None
+    return counters.PeakWorkingSetSize / 1024 ** 2
+
+
+def run_child(args):
+    """Run one scenario in this (fresh) process and write its measurements to args.result_file"""
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    before = os.times()
+    start = time.perf_counter()
+    succeeded = SCENARIOS[args.child](args, out_dir)
+    wall = time.perf_counter() - start
+    after = os.times()
+
+    if succeeded is None:
+        result = {'skipped': 'Flask not installed'}
+    else:
+        cpu = sum(getattr(after, f) - getattr(before, f)
+                  for f in ('user', 'system', 'children_user', 'children_system'))
+        output_minutes = succeeded * args.duration / 60
+        rss, children_rss = peak_rss_mb()
+        result = {
+            'items': args.items,
+            'succeeded': succeeded,
+            'wall_s': round(wall, 3),
+            'cpu_s': round(cpu, 3),
+            'cpu_s_per_output_min': round(cpu / output_minutes, 3) if output_minutes else None,
+            'peak_rss_mb': round(rss, 1) if rss else None,
+            'peak_child_rss_mb': round(children_rss, 1) if children_rss else None,
+            'output_bytes': sum(p.stat().st_size for p in outputs(out_dir)),
+        }
+    with open(args.result_file, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+
+
+def run_scenario(name, args, origin, tmp):
+    """Run a scenario in a subprocess with its own empty cache and output directory"""
+    scratch = Path(tmp) / name
+    cache = scratch / 'cache'
+    result_file = scratch / 'result.json'
+    cache.mkdir(parents=True)
+    env = dict(os.environ, XDG_CACHE_HOME=str(cache), LOCALAPPDATA=str(cache))
+    cmd = [sys.executable, str(Path(__file__).resolve()), '--child', name, '--origin', origin.base_url,
+           '--out-dir', str(scratch / 'out'), '--result-file', str(result_file),
+           '--items', str(args.items), '--duration', str(args.duration), '--workers', str(args.workers)]
+
+    sent = origin.bytes_sent
+    output = None if args.verbose else subprocess.DEVNULL
+    code = subprocess.run(cmd, cwd=APP_DIR, env=env, stdout=output, stderr=output).returncode
+    sent = origin.bytes_sent - sent
+    if code or not result_file.exists():
+        return {'error': f'exit code {code}'}
+
+    with open(result_file, encoding='utf-8') as f:
+        result = json.load(f)
+    if 'skipped' not in result:
+        result['origin_bytes'] = sent
+        result['origin_mb_s'] = round(sent / result['wall_s'] / 1024 ** 2, 2)
+    return result
+
+
+def versions():
+    try:
+        git = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=APP_DIR,
+                             capture_output=True, text=True).stdout.strip()
+    except OSError:
+        git = None
+    try:
+        from yt_dlp.version import __version__ as yt_dlp_version
+    except ImportError:
+        yt_dlp_version = None
+    return {'git': git or None, 'yt_dlp': yt_dlp_version,
+            'python': platform.python_version(), 'platform': platform.platform()}
+
+
+def compare(report, baseline_path, tolerance):
+    """Print changes against a baseline report; returns the regressions found"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\ncompared with {baseline_path} ({baseline['version'].get('git')}), tolerance {tolerance:.0%}")
+    regressions = []
+    for name, result in report['scenarios'].items():
+        old = baseline['scenarios'].get(name) or {}
+        for metric in COMPARED:
+            if not result.get(metric) or not old.get(metric):
+                continue
+            change = result[metric] / old[metric] - 1
+            flag = ''
+            if change > tolerance:
+                flag = '  REGRESSION'
+                regressions.append((name, metric, change))
+            print(f"  {name:<16} {metric:<22} {old[metric]:>9} -> {result[metric]:>9} {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=4, help="items per scenario")
+    parser.add_argument('--duration', type=int, default=DEFAULT_DURATION, help="seconds of media per item")
+    parser.add_argument('--workers', type=int, default=2, help="workers for the pipeline, GUI and server")
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--latency', type=float, default=0.02, help="origin delay per request (seconds)")
+    parser.add_argument('--rate', type=int, default=0, help="origin bytes/s per connection (0: unlimited)")
+    parser.add_argument('--media-dir', help="keep generated media here to reuse between runs")
+    parser.add_argument('--output', help="result file (default benchmarks/results/e2e-<time>.json)")
+    parser.add_argument('--compare', metavar='BASELINE', help="earlier result file to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="allowed slowdown before failing")
+    parser.add_argument('--verbose', action='store_true', help="show the scenarios' own output")
+    # Internal: run one scenario (see run_scenario)
+    parser.add_argument('--child', choices=list(SCENARIOS), help=argparse.SUPPRESS)
+    parser.add_argument('--origin', help=argparse.SUPPRESS)
+    parser.add_argument('--out-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        media_dir = Path(args.media_dir) if args.media_dir else Path(tmp) / 'media'
+        print(f"generating {args.duration}s fixtures in {media_dir}...")
+        fixtures = generate(media_dir, duration=args.duration)
+
+        report = {
+            'suite': 'e2e',
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'version': versions(),
+            'params': {'items': args.items, 'duration': args.duration, 'workers': args.workers,
+                       'latency': args.latency, 'rate': args.rate, 'fixtures': fixtures['params']},
+            'scenarios': {},
+        }
+        print(f"{'scenario':<16} {'ok':>5} {'wall s':>8} {'MB/s':>7} {'cpu s/min':>10} {'rss MB':>7} {'child MB':>9}")
+        with LocalOrigin(default_latency=args.latency, default_rate=args.rate, media_dir=media_dir) as origin:
+            for name in args.scenarios:
+                result = run_scenario(name, args, origin, tmp)
+                report['scenarios'][name] = result
+                if 'wall_s' not in result:
+                    print(f"{name:<16} {result.get('skipped') or result.get('error')}")
+                    continue
+                print(f"{name:<16} {result['succeeded']:>2}/{result['items']:<2} {result['wall_s']:>8.2f} "
+                      f"{result['origin_mb_s']:>7.2f} {result['cpu_s_per_output_min'] or 0:>10.2f} "
+                      f"{result['peak_rss_mb'] or 0:>7.0f} {result['peak_child_rss_mb'] or 0:>9.0f}")
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"e2e-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults: {output}")
+
+    failed = [name for name, result in report['scenarios'].items()
+              if 'error' in result or result.get('succeeded', result.get('items')) != result.get('items')]
+    if failed:
+        print(f"FAILED scenarios: {', '.join(failed)}")
+    regressions = compare(report, args.compare, args.tolerance) if args.compare else []
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+    sys.exit(1 if failed or regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Benchmark - job server /file: delete after the first response vs retention store
+Serves one finished file from a server subprocess in three ways:
+  delete     the previous endpoint: send_from_directory, file deleted when the response ends
+  range      retention store + Range/If-Range, blocks read and written by Python
+  sendfile   the same with the sendfile request handler (job_server's default)
+and reports, per mode, full-file throughput and the server's CPU seconds per GB
+served, then whether a transfer cut off halfway can be resumed (Range +
+If-Range) and whether a second device can fetch the file again. With delete,
+both need the job run again: a full re-download and re-encode.
+
+Usage: python benchmarks/bench_file_serving.py [--size 256] [--repeat 4]
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
+import logging
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+MODES = ('delete', 'range', 'sendfile')
+READ_SIZE = 1024 * 1024
+
+
+def serve(mode, directory):
+    """Server process: print the port, serve until killed; GET /cpu gives its CPU seconds"""
+    from flask import jsonify, send_from_directory
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    if mode == 'delete':
+        from flask import Flask
+
+        app = Flask(__name__)
+
+        @app.get('/file/<path:filename>')
+        def file(filename):
+            file_path = Path(directory) / filename
+            if not file_path.is_file():
+                return 'File not found', 404
+            response = send_from_directory(directory, filename, as_attachment=True)
+            response.direct_passthrough = False
+
+            def cleanup():
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+            response.call_on_close(cleanup)
+            return response
+        handler = None
+    else:
+        import job_server
+        from file_serving import sendfile_request_handler
+
+        app = job_server.create_app(job_server.JobScheduler(directory, workers=1))
+        handler = sendfile_request_handler() if mode == 'sendfile' else None
+
+    @app.get('/cpu')
+    def cpu():
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return jsonify(seconds=usage.ru_utime + usage.ru_stime)
+
+    kwargs = {'request_handler': handler} if handler else {}
+    server = make_server('127.0.0.1', 0, app, threaded=True, **kwargs)
+    print(server.port, flush=True)
+    server.serve_forever()
+
+
+def request(port, path, headers=None):
+    """GET path; (status, headers, body sha256, body bytes)"""
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    conn.request('GET', path, headers=headers or {})
+    response = conn.getresponse()
+    digest, total, buf = hashlib.sha256(), 0, bytearray(READ_SIZE)
+    while True:
+        n = response.readinto(buf)
+        if not n:
+            break
+        digest.update(memoryview(buf)[:n])
+        total += n
+    conn.close()
+    return response.status, dict(response.getheaders()), digest.hexdigest(), total
+
+
+def server_cpu(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    conn.request('GET', '/cpu')
+    seconds = json.loads(conn.getresponse().read())['seconds']
+    conn.close()
+    return seconds
+
+
+def cut_off(port, path, nbytes):
+    """Read the headers and about nbytes of the body, then drop the connection; (etag, bytes read)"""
+    sock = socket.create_connection(('127.0.0.1', port))
+    sock.sendall(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n'.encode())
+    data = b''
+    while b'\r\n\r\n' not in data:
+        data += sock.recv(65536)
+    head, body = data.split(b'\r\n\r\n', 1)
+    etag = next((line.split(b':', 1)[1].strip().decode() for line in head.split(b'\r\n')
+                 if line.lower().startswith(b'etag:')), None)
+    read = len(body)
+    while read < nbytes:
+        read += len(sock.recv(min(READ_SIZE, nbytes - read)))
+    sock.close()
+    return etag, read
+
+
+def restore(pristine, target, timeout=5):
+    """Put the file back for the next request once the server has deleted it (delete mode)"""
+    deadline = time.monotonic() + timeout
+    while target.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    if not target.exists():
+        os.link(pristine, target)
+
+
+def run_mode(mode, pristine, digest, size, repeat, work):
+    directory = work / mode
+    directory.mkdir()
+    target = directory / 'video.mp4'
+    os.link(pristine, target)
+    proc = subprocess.Popen([sys.executable, __file__, '--serve', mode, '--dir', str(directory)],
+                            stdout=subprocess.PIPE, text=True)
+    try:
+        port = int(proc.stdout.readline())
+        path = '/file/video.mp4'
+
+        # Full transfers; delete mode gets the file put back between them (not counted)
+        seconds = cpu = 0.0
+        ok = True
+        for _ in range(repeat):
+            if mode == 'delete':
+                restore(pristine, target)
+            before = server_cpu(port)
+            start = time.perf_counter()
+            status, _, body_digest, _ = request(port, path)
+            seconds += time.perf_counter() - start
+            cpu += server_cpu(port) - before
+            ok &= status == 200 and body_digest == digest
+        gb = size * repeat / 1024 ** 3
+
+        # A transfer cut off halfway, then resumed where it stopped
+        if mode == 'delete':
+            restore(pristine, target)
+        etag, read = cut_off(port, path, size // 2)
+        time.sleep(0.2)
+        resume_headers = {'Range': f'bytes={read}-', 'If-Range': etag or ''}
+        status, _, resumed_digest, resumed = request(port, path, resume_headers)
+        with open(pristine, 'rb') as f:
+            f.seek(read)
+            tail = hashlib.sha256(f.read()).hexdigest()
+        resume_ok = status == 206 and resumed == size - read and resumed_digest == tail
+
+        # A second device asking for the same file
+        second, _, second_digest, _ = request(port, path)
+        second_ok = second == 200 and second_digest == digest
+        return {
+            'ok': ok,
+            'mbps': size * repeat / 1024 ** 2 / seconds,
+            'cpu_per_gb': cpu / gb,
+            'resume': f"{status}, {resumed / 1024 ** 2:.1f} MB" if resume_ok else f"{status}, rerun job",
+            'resume_ok': resume_ok,
+            'second': f"{second}" if second_ok else f"{second}, rerun job",
+            'second_ok': second_ok,
+        }
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=256, help="MB in the served file")
+    parser.add_argument('--repeat', type=int, default=4, help="full transfers per mode")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--serve', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve, args.dir)
+        return
+
+    try:
+        import flask  # noqa: F401
+    except ImportError:
+        print("This benchmark needs Flask: pip install flask")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work = Path(tmp)
+        pristine = work / 'pristine.mp4'
+        size = args.size * 1024 ** 2
+        digest = hashlib.sha256()
+        with open(pristine, 'wb') as f:
+            for _ in range(args.size):
+                block = os.urandom(1024 ** 2)
+                digest.update(block)
+                f.write(block)
+        digest = digest.hexdigest()
+        # Warm the page cache so every mode reads from memory
+        with open(pristine, 'rb') as f, open(os.devnull, 'wb') as sink:
+            shutil.copyfileobj(f, sink, READ_SIZE)
+
+        print(f"{args.size} MB file, {args.repeat} full transfers per mode")
+        print(f"{'mode':<10} {'MB/s':>8} {'cpu s/GB':>9}  {'resume at 50%':<18} second fetch")
+        results = {}
+        for mode in args.modes:
+            result = results[mode] = run_mode(mode, pristine, digest, size, args.repeat, work)
+            print(f"{mode:<10} {result['mbps']:>8.0f} {result['cpu_per_gb']:>9.2f}  {result['resume']:<18} "
+                  f"{result['second']}{'' if result['ok'] else '  BROKEN'}")
+
+    ok = all(r['ok'] for r in results.values())
+    for mode in ('range', 'sendfile'):
+        if mode in results:
+            ok &= results[mode]['resume_ok'] and results[mode]['second_ok']
+    if 'sendfile' in results and 'delete' in results:
+        ratio = results['sendfile']['cpu_per_gb'] / results['delete']['cpu_per_gb']
+        print(f"sendfile: {ratio:.0%} of the server CPU per GB of the delete-after-read endpoint")
+        ok &= ratio < 1
+    print("retained files resume and serve again" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark - adaptive fragment concurrency for DASH/HLS downloads
+Downloads the segmented HLS and DASH fixtures (see media_fixtures.generate_segmented)
+from the local origin with a round-trip latency on every request, and compares
+  serial     one fragment at a time (--fragments 1, yt-dlp's default)
+  fixed      yt-dlp's own pool of a fixed size (the ceiling) for comparison
+  adaptive   the AIMD window up to the same ceiling (see adaptive_fragments)
+A second pass injects HTTP 503 errors on a share of the fragment requests to
+show the window backing off, and a third runs parallel downloads against one
+host to check the per-host cap on fragment requests in flight at the origin.
+
+Usage: python benchmarks/bench_fragments.py [--latency 0.1] [--ceiling 8] [--duration 60] [--error-rate 0.05]
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from adaptive_fragments import FRAGMENT_STATS
+from local_origin import LocalOrigin, OriginHandler
+from media_fixtures import find_ffmpeg, generate_segmented, item_urls
+from ydl_session import DownloadSession
+
+
+class FlakyHandler(OriginHandler):
+    """Answers a share of fragment requests with 503 and counts the requests in flight"""
+
+    def do_GET(self, head=False):
+        server = self.server
+        is_fragment = '_seg_' in self.path or '_chunk_' in self.path
+        if is_fragment and random.random() < server.error_rate:
+            self.send_error(503)
+            return
+        with server.flight_lock:
+            server.in_flight += 1
+            server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+        try:
+            super().do_GET(head)
+        finally:
+            with server.flight_lock:
+                server.in_flight -= 1
+
+
+def make_origin(media_dir, latency):
+    origin = LocalOrigin(handler=FlakyHandler, default_latency=latency, media_dir=media_dir)
+    origin.error_rate = 0.0
+    origin.flight_lock = threading.Lock()
+    origin.in_flight = origin.peak_in_flight = 0
+    return origin
+
+
+def opts(out_dir, fragments, adaptive, host_limit):
+    return {
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+        'format': 'bestvideo+bestaudio/best',
+        'merge_output_format': 'mp4',
+        'outtmpl': str(out_dir / '%(id)s.%(ext)s'),
+        'segments': 1,
+        'ffmpeg_location': find_ffmpeg(),
+        'concurrent_fragment_downloads': fragments,
+        'adaptive_fragments': adaptive,
+        'fragment_host_limit': host_limit,
+        'retries': 10,
+        'fragment_retries': 10,
+        'retry_sleep_functions': {'http': lambda n: 0.1, 'fragment': lambda n: 0.1},
+    }
+
+
+def download(urls, out_dir, fragments, adaptive, host_limit):
+    """Download urls side by side (one session each); (seconds, bytes written)"""
+    errors = []
+
+    def run(url):
+        try:
+            with DownloadSession(opts(out_dir, fragments, adaptive, host_limit)) as session:
+                session.download(url, str(out_dir / '%(id)s.%(ext)s'), probe=False)
+        except Exception as e:
+            errors.append(e)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run, args=(url,)) for url in urls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+    return elapsed, sum(p.stat().st_size for p in out_dir.glob('*.mp4'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.1, help="seconds before every response")
+    parser.add_argument('--ceiling', type=int, default=8, help="most fragments in flight per stream")
+    parser.add_argument('--duration', type=int, default=60, help="seconds of media (1 s fragments)")
+    parser.add_argument('--error-rate', type=float, default=0.05, help="share of fragment requests answered 503")
+    parser.add_argument('--parallel', type=int, default=3, help="downloads at once for the per-host check")
+    parser.add_argument('--host-limit', type=int, default=8, help="per-host cap for the per-host check")
+    parser.add_argument('--media-dir', help="keep the generated fixtures here to reuse between runs")
+    args = parser.parse_args()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        media_dir = Path(args.media_dir) if args.media_dir else tmp / 'media'
+        print(f"generating {args.duration}s of 1s fragments in {media_dir}...")
+        generate_segmented(media_dir, duration=args.duration)
+        counter = iter(range(1, 10 ** 6))
+
+        def url(media_set):
+            n = next(counter)
+            return item_urls(origin.base_url, media_set, n)[n - 1]
+
+        with make_origin(media_dir, args.latency) as origin:
+            print(f"{args.latency * 1000:.0f} ms per request, ceiling {args.ceiling}")
+            print(f"{'stream':<6} {'mode':<10} {'wall s':>8} {'MB/s':>7} {'speedup':>8}  window")
+            for media_set in ('hls', 'dash'):
+                serial = None
+                for mode, fragments, adaptive in (('serial', 1, False), ('fixed', args.ceiling, False),
+                                                  ('adaptive', args.ceiling, True)):
+                    out_dir = tmp / f'{media_set}-{mode}'
+                    before = FRAGMENT_STATS.streams
+                    seconds, size = download([url(media_set)], out_dir, fragments, adaptive, 10 ** 6)
+                    serial = serial or seconds
+                    window = FRAGMENT_STATS.last.summary() if FRAGMENT_STATS.streams > before else '-'
+                    print(f"{media_set:<6} {mode:<10} {seconds:>8.2f} {size / seconds / 1024 ** 2:>7.2f} "
+                          f"{serial / seconds:>7.2f}x  {window}")
+                    if mode == 'adaptive':
+                        ok &= seconds < serial
+
+            origin.error_rate = args.error_rate
+            print(f"\nwith {args.error_rate:.0%} of the fragment requests failing (503)")
+            for mode, fragments, adaptive in (('serial', 1, False), ('adaptive', args.ceiling, True)):
+                before = (FRAGMENT_STATS.streams, FRAGMENT_STATS.retries, FRAGMENT_STATS.backoffs)
+                seconds, size = download([url('dash')], tmp / f'flaky-{mode}', fragments, adaptive, 10 ** 6)
+                retries = FRAGMENT_STATS.retries - before[1]
+                backoffs = FRAGMENT_STATS.backoffs - before[2]
+                detail = f"{retries} retries, {backoffs} backoffs" if adaptive else ''
+                print(f"{'dash':<6} {mode:<10} {seconds:>8.2f} {size / seconds / 1024 ** 2:>7.2f}  {detail}")
+            origin.error_rate = 0.0
+
+            origin.peak_in_flight = 0
+            seconds, _ = download([url('dash') for _ in range(args.parallel)], tmp / 'hosts', args.ceiling, True,
+                                  args.host_limit)
+            capped = origin.peak_in_flight <= args.host_limit
+            ok &= capped
+            print(f"\n{args.parallel} parallel DASH downloads, per-host cap {args.host_limit}: "
+                  f"peak {origin.peak_in_flight} requests in flight at the origin "
+                  f"({'ok' if capped else 'over the cap'}), {seconds:.2f}s")
+    print("adaptive fetching beat the serial baseline" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Stress benchmark - 100k synthetic yt-dlp progress events through the GUI event path
+Download threads push events, paced over --seconds like real downloads, while a
+100 ms UI timer drains them exactly like YouTubeDownloaderGUI.check_queue;
+reports per-tick handler time and widget load. The UI counts as responsive when
+the p99 tick (nearest rank) stays under 50 ms; the run records --seconds / 0.1
+ticks, so the p99 is not just the slowest tick and one scheduler hiccup on a
+busy machine does not decide it.
+
+Uses a real Tk Text widget when a display is available, a line-counting stand-in otherwise.
+
+Usage: python benchmarks/bench_gui_events.py [--events 100000] [--jobs 8] [--seconds 20] [--legacy]
+"""
+
+import argparse
+import math
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gui_events import ProgressCoalescer, BoundedLog, MAX_MESSAGES_PER_TICK
+
+TICK = 0.1  # check_queue interval in the GUI
+RESPONSIVE_MS = 50  # a tick slower than this is a visible stall
+BURST = 50  # progress callbacks a download thread makes back to back (one per block read)
+
+
+class FakeText:
+    """Minimal stand-in for tk.Text that keeps the same line bookkeeping"""
+
+    def __init__(self):
+        self.content = []
+
+    def config(self, **kwargs):
+        pass
+
+    def see(self, index):
+        pass
+
+    def insert(self, index, text):
+        self.content.extend(text.rstrip('\n').split('\n'))
+
+    def delete(self, start, end):
+        del self.content[:int(end.split('.')[0]) - 1]
+
+    def line_count(self):
+        return len(self.content)
+
+
+def make_widget():
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+        root.withdraw()
+        text = tk.Text(root)
+        text.line_count = lambda: int(text.index('end-1c').split('.')[0])
+        return root, text
+    except Exception:
+        return None, FakeText()
+
+
+def percentile(ordered, share):
+    """Nearest-rank percentile of an ascending list (share: 0.99 for the p99)"""
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+def produce(job, count, coalescer, messages, legacy, seconds):
+    """One download thread: `count` progress callbacks spread over `seconds`, a log line at start and end"""
+    total = 50 * 1024 * 1024
+    messages.put(('log', f"[{job}] Processing: synthetic://{job}"))
+    start = time.perf_counter()
+    for n in range(1, count + 1):
+        if n % BURST == 0:
+            time.sleep(max(0.0, start + seconds * n / count - time.perf_counter()))
+        downloaded = total * n // count
+        if legacy:
+            # Old behavior: every callback becomes a queued log line
+            messages.put(('log', f"[{job}] Progress: {downloaded / total * 100:.1f}% | Speed: 5.00 MB/s | ETA: 1s"))
+        else:
+            coalescer.update(job, downloaded, total, speed=5 * 1024 * 1024, eta=1)
+    coalescer.finish(job)
+    messages.put(('log', f"[{job}] ✓ Done"))
+
+
+def tick(messages, log_view, coalescer, jobs, legacy, state):
+    """Body of check_queue"""
+    lines = []
+    try:
+        for _ in range(MAX_MESSAGES_PER_TICK if not legacy else sys.maxsize):
+            msg_type, data = messages.get_nowait()
+            lines.append(data)
+    except queue.Empty:
+        pass
+
+    if legacy:
+        for line in lines:  # one widget insert per line, no cap
+            log_view.widget.insert('end', line + '\n')
+    else:
+        log_view.append(lines)
+
+    snapshot = coalescer.drain()
+    if snapshot is not None:
+        state['progress'] = ProgressCoalescer.overall(snapshot, jobs)
+        state['detail'] = ProgressCoalescer.describe(snapshot)
+        state['refreshes'] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=100_000)
+    parser.add_argument('--jobs', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=20, help="time the events are spread over (0: as fast as the threads can push them)")
+    parser.add_argument('--legacy', action='store_true', help="replay the old log-every-callback behavior")
+    args = parser.parse_args()
+
+    root, widget = make_widget()
+    log_view = BoundedLog(widget)
+    coalescer = ProgressCoalescer()
+    messages = queue.Queue()
+    state = {'progress': 0.0, 'detail': None, 'refreshes': 0}
+
+    per_job = args.events // args.jobs
+    producers = [threading.Thread(target=produce,
+                                  args=(job, per_job, coalescer, messages, args.legacy, args.seconds))
+                 for job in range(1, args.jobs + 1)]
+
+    start = time.perf_counter()
+    for t in producers:
+        t.start()
+
+    durations = []
+    next_tick = time.perf_counter()
+    while any(t.is_alive() for t in producers) or not messages.empty():
+        time.sleep(max(0.0, next_tick - time.perf_counter()))
+        tick_start = time.perf_counter()
+        tick(messages, log_view, coalescer, args.jobs, args.legacy, state)
+        if root is not None:
+            root.update_idletasks()
+        durations.append((time.perf_counter() - tick_start) * 1000)
+        next_tick = tick_start + TICK
+    # One last drain so the bar reaches its final value
+    time.sleep(coalescer.interval)
+    tick(messages, log_view, coalescer, args.jobs, args.legacy, state)
+    elapsed = time.perf_counter() - start
+
+    durations.sort()
+    p99 = percentile(durations, 0.99)
+    print(f"mode:              {'legacy (log every callback)' if args.legacy else 'coalesced'}")
+    print(f"widget:            {'tk.Text' if root is not None else 'stand-in (no display)'}")
+    print(f"events pushed:     {per_job * args.jobs} from {args.jobs} threads in {elapsed:.2f}s")
+    print(f"UI ticks:          {len(durations)}, progress refreshes: {state['refreshes']}")
+    print(f"tick time (ms):    median {percentile(durations, 0.5):.2f}, p99 {p99:.2f}, max {durations[-1]:.2f}")
+    print(f"log lines held:    {widget.line_count()}")
+    print(f"final progress:    {state['progress']:.0f}%")
+    responsive = p99 < RESPONSIVE_MS
+    print(f"UI responsive:     {'yes' if responsive else 'NO'} (p99 tick under {RESPONSIVE_MS} ms)")
+
+    if root is not None:
+        root.destroy()
+    sys.exit(0 if responsive else 1)
+
+
+if __name__ == "__main__":
+    main()
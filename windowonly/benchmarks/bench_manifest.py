@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark - manifest batch mode vs one CLI process per URL
+Downloads the same number of synthetic videos from the local origin:
+  per-process   one `youtube_downloader_cli.py URL DIR NAME` run per item, as a
+                script driving the CLI would (interpreter, yt-dlp import and
+                ffmpeg probe paid every time)
+  manifest      one `--manifest -` run per --workers value, items read from stdin
+and compares wall time, CPU seconds of the child processes (ffmpeg included),
+the time until the first NDJSON result record arrives, and checks every item
+was reported done and written, and that the exit codes match the results.
+Then checks the job journal keys items on what they ask for: one URL listed
+twice under one file name, at best and at 480p, writes both files, and a
+second run of the same manifest skips both lines.
+
+Usage: python benchmarks/bench_manifest.py [--items 12] [--workers 1 4] [--set h264]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from local_origin import LocalOrigin
+from media_fixtures import generate, item_urls
+
+CLI = str(ROOT / 'youtube_downloader_cli.py')
+
+
+def child_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def per_process(urls, out_dir, env):
+    """One CLI process per URL; (wall s, cpu s, first result s, items done)"""
+    cpu, start = child_cpu(), time.perf_counter()
+    first = None
+    done = 0
+    for n, url in enumerate(urls, 1):
+        proc = subprocess.run([sys.executable, CLI, url, str(out_dir), f'item{n}', '--no-journal'],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL,
+                              env=env)
+        if first is None:
+            first = time.perf_counter() - start
+        done += proc.returncode == 0 and (out_dir / f'item{n}.mp4').exists()
+    return time.perf_counter() - start, child_cpu() - cpu, first, done
+
+
+def manifest(urls, out_dir, env, workers):
+    """One --manifest run reading the URLs from stdin; (wall s, cpu s, first result s, items done)"""
+    cpu, start = child_cpu(), time.perf_counter()
+    lines = ''.join(f"{url}\titem{n}\n" for n, url in enumerate(urls, 1))
+    proc = subprocess.Popen([sys.executable, CLI, '--manifest', '-', '-o', str(out_dir), '--workers', str(workers),
+                             '--no-journal'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, text=True, env=env)
+    proc.stdin.write(lines)
+    proc.stdin.close()
+    first = None
+    records = []
+    for line in proc.stdout:
+        if first is None:
+            first = time.perf_counter() - start
+        records.append(json.loads(line))
+    code = proc.wait()
+    items = [r for r in records if r['type'] == 'item']
+    summary = records[-1] if records and records[-1]['type'] == 'summary' else {}
+    done = sum(1 for r in items if r['status'] == 'done' and all(Path(f).exists() for f in r['files']))
+    # Exit code 0 only when every item is done, as the summary says
+    consistent = summary.get('exit_code') == code and (code == 0) == (done == len(urls))
+    return time.perf_counter() - start, child_cpu() - cpu, first, done if consistent else -1
+
+
+def run_manifest(lines, out_dir, env):
+    """One --manifest run with its journal on; (exit code, item records)"""
+    proc = subprocess.run([sys.executable, CLI, '--manifest', '-', '-o', str(out_dir), '--workers', '1'],
+                          input=lines, capture_output=True, text=True, env=env)
+    return proc.returncode, [r for r in map(json.loads, proc.stdout.splitlines()) if r['type'] == 'item']
+
+
+def duplicate_url(url, out_dir, env):
+    """The same URL and file name at two qualities, run twice; True when nothing was skipped wrongly"""
+    lines = f"{url}\tclip\tbest\n{url}\tclip\t480p\n"
+    expected = [out_dir / 'clip.mp4', out_dir / 'clip.480p.mp4']
+    code, first = run_manifest(lines, out_dir, env)
+    written = all(path.exists() for path in expected)
+    print(f"first run:  exit {code}, {', '.join(r['status'] for r in first)}, "
+          f"{' '.join(path.name for path in expected if path.exists()) or 'no files'}")
+    code_again, again = run_manifest(lines, out_dir, env)
+    print(f"second run: exit {code_again}, {', '.join(r['status'] for r in again)}")
+    return (code == 0 and written and [r['status'] for r in first] == ['done', 'done']
+            and code_again == 0 and [r['status'] for r in again] == ['skipped', 'skipped'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=12)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4], help="manifest runs to compare")
+    parser.add_argument('--set', default='h264', choices=('h264', 'vp9', 'progressive'),
+                        help="media set (h264: remux, vp9: transcode)")
+    parser.add_argument('--duration', type=int, default=4, help="seconds of media per item")
+    parser.add_argument('--media-dir', help="keep the generated fixtures here to reuse between runs")
+    args = parser.parse_args()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        media_dir = Path(args.media_dir) if args.media_dir else tmp / 'media'
+        print(f"generating {args.duration}s fixtures in {media_dir}...")
+        generate(media_dir, duration=args.duration)
+        # A fresh cache per run, so every item is downloaded and encoded
+        env = dict(os.environ, XDG_CACHE_HOME=str(tmp / 'cache'))
+
+        print(f"{args.items} items of {args.set}")
+        print(f"{'mode':<16} {'wall s':>8} {'cpu s':>8} {'first s':>8} {'done':>6}")
+        n = 0
+        runs = [('per-process', None)] + [(f'manifest -w{w}', w) for w in args.workers]
+        results = {}
+        with LocalOrigin(media_dir=media_dir) as origin:
+            for label, workers in runs:
+                # New URLs per run: nothing comes from the media or metadata caches
+                urls = item_urls(origin.base_url, args.set, n + args.items)[n:]
+                n += args.items
+                out_dir = tmp / label.replace(' ', '_')
+                if workers is None:
+                    wall, cpu, first, done = per_process(urls, out_dir, env)
+                else:
+                    wall, cpu, first, done = manifest(urls, out_dir, env, workers)
+                results[label] = wall, cpu
+                ok &= done == args.items
+                print(f"{label:<16} {wall:>8.2f} {cpu:>8.2f} {first:>8.2f} {done if done >= 0 else 'BAD':>6}")
+
+        wall, cpu = results['per-process']
+        for label, (batch_wall, batch_cpu) in results.items():
+            if label != 'per-process':
+                print(f"{label}: {batch_wall / wall:.0%} of the wall time, {batch_cpu / cpu:.0%} of the CPU "
+                      f"of one process per URL")
+                ok &= batch_cpu < cpu
+
+        print("\njournal: one URL and file name at best and at 480p")
+        with LocalOrigin(media_dir=media_dir) as origin:
+            url = item_urls(origin.base_url, args.set, n + 1)[n]
+            ok &= duplicate_url(url, tmp / 'duplicate', env)
+    print("every item done, less CPU in one process, both qualities written" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Benchmark - time to first download for a large playlist, resolved up front vs. listed lazily
+A local extractor stand-in (SyntheticPlaylistIE) lists the playlist in pages of
+PAGE_SIZE entries with a delay per page, like a channel's continuation requests;
+every entry is a video on the local origin (see media_fixtures).
+
+  eager   DownloadSession.download(playlist URL): yt-dlp resolves every entry
+          before it starts the first download (the behaviour before playlist_stream)
+  lazy    PlaylistStream through DownloadEngine, like the CLI and GUI batch modes
+
+Time to first download is measured up to the first progress report of a media
+download. Memory is the tracemalloc peak while a whole playlist goes through the
+engine with an instant job, next to yt-dlp's own flat listing of the same playlist.
+
+Usage: python benchmarks/bench_playlist.py [--entries 300] [--large 20000] [--page-delay 0.2]
+"""
+
+import argparse
+import gc
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from yt_dlp.extractor.common import InfoExtractor
+
+from download_engine import DownloadEngine
+from local_origin import LocalOrigin
+from media_fixtures import find_ffmpeg, generate
+from playlist_stream import PlaylistStream
+from ydl_session import DownloadSession, SessionPool
+
+PAGE_SIZE = 100
+
+
+class SyntheticPlaylistIE(InfoExtractor):
+    """synthetic-playlist:<count> - count entries, PAGE_SIZE per page, page_delay seconds per page"""
+    IE_NAME = 'synthetic:playlist'
+    _VALID_URL = r'synthetic-playlist:(?P<count>\d+)'
+    base_url = None
+    page_delay = 0.0
+
+    def _entries(self, count):
+        for first in range(1, count + 1, PAGE_SIZE):
+            time.sleep(self.page_delay)
+            for n in range(first, min(count, first + PAGE_SIZE - 1) + 1):
+                # About what a flat YouTube entry carries
+                yield self.url_result(
+                    f'{self.base_url}/media/h264~{n}.mpd', 'Generic', f'h264~{n}', f'Entry {n}',
+                    description=f'Synthetic entry {n} ' * 8, duration=4, view_count=n,
+                    thumbnails=[{'url': f'{self.base_url}/thumb/{n}/{size}.jpg', 'width': size}
+                                for size in (120, 320, 480, 640)])
+
+    def _real_extract(self, url):
+        count = int(self._match_valid_url(url).group('count'))
+        return self.playlist_result(self._entries(count), f'synthetic{count}', f'Synthetic playlist ({count})')
+
+
+def opts(out_dir):
+    return {
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+        'format': 'bestvideo+bestaudio/best',
+        'merge_output_format': 'mp4',
+        'outtmpl': str(out_dir / '%(id)s.%(ext)s'),
+        'segments': 1,
+        'ffmpeg_location': find_ffmpeg(),
+    }
+
+
+def register(session):
+    """Add the stand-in to a session, ahead of the generic extractor (which accepts any URL)"""
+    ie = SyntheticPlaylistIE()
+    session.ydl.add_info_extractor(ie)
+    session.ydl._ies = {ie.ie_key(): ie, **session.ydl._ies}
+
+
+def first_download_eager(url, out_dir):
+    """Seconds until the first media download starts when yt-dlp resolves the playlist itself"""
+    started = {}
+    start = time.perf_counter()
+
+    def hook(d):
+        if d['status'] == 'downloading':
+            started.setdefault('at', time.perf_counter() - start)
+            raise Exception("STOP_REQUESTED")
+
+    with DownloadSession(opts(out_dir)) as session:
+        register(session)
+        try:
+            session.download(url, str(out_dir / '%(id)s.%(ext)s'), progress_hook=hook)
+        except Exception:
+            pass
+    return started.get('at')
+
+
+def first_download_lazy(url, out_dir, workers):
+    """Seconds until the first media download starts with PlaylistStream feeding DownloadEngine"""
+    started = {}
+    stop = threading.Event()
+    start = time.perf_counter()
+
+    def hook(d):
+        if d['status'] == 'downloading':
+            started.setdefault('at', time.perf_counter() - start)
+            stop.set()
+        if stop.is_set():
+            raise Exception("STOP_REQUESTED")
+
+    with DownloadSession(opts(out_dir)) as lister, SessionPool(opts(out_dir)) as sessions:
+        register(lister)
+        stream = PlaylistStream(lister, [url])
+
+        def job(index, entry):
+            sessions.get().download(entry, str(out_dir / '%(id)s.%(ext)s'), progress_hook=hook)
+            return True
+
+        DownloadEngine(workers=workers, should_stop=stop.is_set).run(stream, job)
+    return started.get('at')
+
+
+def peak_memory(fn):
+    """(result, tracemalloc peak MB) of fn()"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        return result, tracemalloc.get_traced_memory()[1] / 1024 ** 2
+    finally:
+        tracemalloc.stop()
+
+
+def listing_memory(url, out_dir):
+    """Peak MB for yt-dlp's flat listing and for the lazy stream through the engine (instant jobs)"""
+    def flat():
+        with DownloadSession({**opts(out_dir), 'extract_flat': 'in_playlist'}) as session:
+            register(session)
+            return len(session.ydl.extract_info(url, download=False)['entries'])
+
+    def lazy():
+        with DownloadSession(opts(out_dir)) as lister:
+            register(lister)
+            return len(DownloadEngine(workers=4).run(PlaylistStream(lister, [url]), lambda index, entry: True))
+
+    return peak_memory(flat), peak_memory(lazy)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=300, help="playlist size for the time to first download")
+    parser.add_argument('--large', type=int, nargs='+', default=[2000, 20000],
+                        help="playlist sizes for the memory comparison")
+    parser.add_argument('--page-delay', type=float, default=0.2, help="seconds per page of %d entries" % PAGE_SIZE)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--media-dir', help="keep the generated fixtures here to reuse between runs")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        media_dir = Path(args.media_dir) if args.media_dir else tmp / 'media'
+        generate(media_dir)
+        SyntheticPlaylistIE.page_delay = args.page_delay
+        with LocalOrigin(media_dir=media_dir) as origin:
+            SyntheticPlaylistIE.base_url = origin.base_url
+            url = f'synthetic-playlist:{args.entries}'
+            pages = -(-args.entries // PAGE_SIZE)
+            print(f"{args.entries} entries, {pages} pages of {PAGE_SIZE}, {args.page_delay}s per page")
+            print(f"{'mode':<8} {'first download s':>17}")
+            for label, run in (('eager', lambda: first_download_eager(url, tmp / 'eager')),
+                               ('lazy', lambda: first_download_lazy(url, tmp / 'lazy', args.workers))):
+                seconds = run()
+                print(f"{label:<8} {'failed' if seconds is None else f'{seconds:.2f}':>17}")
+
+            SyntheticPlaylistIE.page_delay = 0.0
+            print(f"\n{'entries':>8} {'flat list MB':>13} {'lazy stream MB':>15}")
+            for count in args.large:
+                (listed, flat_mb), (ran, lazy_mb) = listing_memory(f'synthetic-playlist:{count}', tmp / 'mem')
+                check = '' if listed == ran == count else f"  (listed {listed}, ran {ran})"
+                print(f"{count:>8} {flat_mb:>13.1f} {lazy_mb:>15.1f}{check}")
+
+
+if __name__ == "__main__":
+    main()
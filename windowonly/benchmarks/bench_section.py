@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark - time-range clips against full downloads
+Downloads each synthetic media set from the local origin twice, whole and as a
+--section clip (see section_clip), and compares the bytes served by the origin,
+wall time and encode time. The sets cover every way a clip is fetched:
+  progressive   one MP4 file, read by ffmpeg with byte-range seeks
+  h264 / vp9    DASH with one file per stream (transcoded for vp9)
+  dash / hls    segmented DASH and HLS, cut to the fragments covering the range
+Every origin connection is paced to --rate: unpaced, a loopback connection
+fills megabytes of socket buffers that ffmpeg closes unread when it seeks,
+which would count as transferred. Sources whose codecs yt-dlp does not report
+(the progressive file, HLS) are transcoded by a clip, as by the pipeline, while
+the full download keeps the file as it is.
+
+Usage: python benchmarks/bench_section.py [--duration 120] [--section 60-90] [--rate 8M] [--media-dir DIR]
+"""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from local_origin import LocalOrigin
+from media_fixtures import find_ffmpeg, generate, generate_segmented, item_urls
+from bandwidth import parse_rate
+from section_clip import parse_section, format_section
+from ydl_session import DownloadSession
+
+MEDIA_SETS = ('progressive', 'h264', 'vp9', 'dash', 'hls')
+
+
+def media_seconds(path):
+    """Duration of a media file from ffmpeg's header, or None"""
+    result = subprocess.run([find_ffmpeg(), '-hide_banner', '-i', str(path)], capture_output=True, text=True)
+    for line in result.stderr.splitlines():
+        if 'Duration:' in line:
+            hours, minutes, seconds = line.split('Duration:')[1].split(',')[0].strip().split(':')
+            return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    return None
+
+
+def download(origin, url, out_dir, section):
+    """One download on a fresh session; (origin bytes, wall seconds, encode seconds, encode path, output path)"""
+    opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+        'format': 'bestvideo+bestaudio/best',
+        'merge_output_format': 'mp4',
+        'ffmpeg_location': find_ffmpeg(),
+    }
+    before = origin.bytes_sent
+    start = time.perf_counter()
+    with DownloadSession(opts) as session:
+        _, encode_path = session.download(url, str(out_dir / '%(id)s.%(ext)s'), section=section)
+        output = session.last_output
+        encode = session.last_timer.phases.get('encode', {}).get('seconds', 0.0)
+    return origin.bytes_sent - before, time.perf_counter() - start, encode, encode_path, Path(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=int, default=120, help="seconds of media")
+    parser.add_argument('--section', type=parse_section, default='60-90', help="time range to clip (START-END)")
+    parser.add_argument('--rate', type=parse_rate, default='8M', help="bytes per second per origin connection")
+    parser.add_argument('--sets', nargs='+', choices=MEDIA_SETS, default=list(MEDIA_SETS))
+    parser.add_argument('--media-dir', help="keep the generated fixtures here to reuse between runs")
+    args = parser.parse_args()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        media_dir = Path(args.media_dir) if args.media_dir else tmp / 'media'
+        print(f"generating {args.duration}s of media in {media_dir}...")
+        generate(media_dir, duration=args.duration)
+        generate_segmented(media_dir, duration=args.duration)
+        counter = iter(range(1, 10 ** 6))
+
+        print(f"section {format_section(args.section)} of {args.duration}s, "
+              f"{args.rate / 1024 ** 2:g} MB/s per connection")
+        print(f"{'set':<12} {'mode':<8} {'origin MB':>10} {'wall s':>8} {'encode s':>9} {'output s':>9}  encode path")
+        with LocalOrigin(media_dir=media_dir, default_rate=args.rate) as origin:
+            for media_set in args.sets:
+                results = {}
+                for mode, section in (('full', None), ('section', args.section)):
+                    n = next(counter)
+                    url = item_urls(origin.base_url, media_set, n)[n - 1]
+                    out_dir = tmp / f'{media_set}-{mode}'
+                    nbytes, wall, encode, encode_path, output = download(origin, url, out_dir, section)
+                    results[mode] = nbytes, wall
+                    length = media_seconds(output)
+                    print(f"{media_set:<12} {mode:<8} {nbytes / 1024 ** 2:>10.2f} {wall:>8.2f} {encode:>9.2f} "
+                          f"{length or 0:>9.2f}  {encode_path}")
+                    if section and (length is None or abs(length - (section[1] - section[0])) > 1.5):
+                        print(f"  clip is {length}s long, expected {section[1] - section[0]:g}s")
+                        ok = False
+                full, clip = results['full'], results['section']
+                ok &= clip[0] < full[0]
+                print(f"{'':<12} {'':<8} {clip[0] / full[0]:>9.0%}  {clip[1] / full[1]:>7.0%}  of the full download")
+    print("every clip fetched less than the full download" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark - aggregate throughput of one download as the number of byte-range segments grows
+The local origin caps every connection's bandwidth, like a CDN throttling per connection
+
+Usage: python benchmarks/bench_segments.py [--size 16777216] [--rate 4194304] [--segments 1 2 4 8]
+       python benchmarks/bench_segments.py --cut 1048576   (drop every response after 1 MiB)
+"""
+
+import argparse
+import hashlib
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from local_origin import LocalOrigin, payload
+from ydl_session import DownloadSession
+
+
+def expected_digest(size):
+    digest = hashlib.sha256()
+    for start in range(0, size, 1024 * 1024):
+        digest.update(payload(start, min(start + 1024 * 1024, size) - 1))
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=16 * 1024 * 1024, help="file size in bytes")
+    parser.add_argument('--rate', type=int, default=4 * 1024 * 1024, help="bytes/s per connection")
+    parser.add_argument('--segments', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--cut', type=int, default=0, help="drop each response after this many bytes")
+    args = parser.parse_args()
+
+    expected = expected_digest(args.size)
+    print(f"file: {args.size / 1024 ** 2:.0f} MiB, cap per connection: {args.rate / 1024 ** 2:.1f} MiB/s"
+          + (f", responses cut after {args.cut} bytes" if args.cut else ""))
+    print(f"{'segments':>8} {'seconds':>8} {'MiB/s':>8} {'speedup':>8} {'requests':>9}  content")
+
+    with LocalOrigin() as origin, tempfile.TemporaryDirectory() as tmp:
+        query = {'size': args.size, 'rate': args.rate}
+        if args.cut:
+            query['cut'] = args.cut
+        url = origin.url('/blob/stream.mp4', **query)
+        baseline = None
+        for segments in args.segments:
+            opts = {'quiet': True, 'no_warnings': True, 'noprogress': True, 'format': 'best',
+                    'segments': segments, 'retries': 50}
+            requests = origin.requests
+            with DownloadSession(opts) as session:
+                start = time.perf_counter()
+                session.download(url, str(Path(tmp) / f"seg{segments}.%(ext)s"), probe=False)
+                elapsed = time.perf_counter() - start
+
+            ok = file_digest(Path(tmp) / f"seg{segments}.mp4") == expected
+            baseline = baseline or elapsed
+            print(f"{segments:>8} {elapsed:>8.2f} {args.size / elapsed / 1024 ** 2:>8.2f} "
+                  f"{baseline / elapsed:>7.1f}x {origin.requests - requests:>9}  {'ok' if ok else 'CORRUPT'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark - per-item overhead of a fresh YoutubeDL per URL vs. one reused DownloadSession
+Small direct-media files are served by the local origin and resolved by yt-dlp's generic extractor.
+The reused session must also open fewer connections: keep-alive needs the requests
+package (yt-dlp[default], see requirements.txt), and the run fails without it.
+
+Usage: python benchmarks/bench_session_reuse.py [--items 30] [--size 65536]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import yt_dlp
+
+from local_origin import LocalOrigin
+from ydl_session import DownloadSession
+
+
+def base_opts():
+    return {
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+        'format': 'best',
+    }
+
+
+def run_fresh(urls, out_dir):
+    for i, url in enumerate(urls):
+        opts = base_opts()
+        opts['outtmpl'] = str(out_dir / f"fresh_{i}.%(ext)s")
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            ydl.download([url])
+
+
+def run_reused(urls, out_dir):
+    with DownloadSession(base_opts()) as session:
+        for i, url in enumerate(urls):
+            session.download(url, str(out_dir / f"reused_{i}.%(ext)s"), probe=False)
+
+
+def measure(origin, runner, urls, out_dir):
+    connections = origin.connections
+    start = time.perf_counter()
+    runner(urls, out_dir)
+    elapsed = time.perf_counter() - start
+    return elapsed, origin.connections - connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=30)
+    parser.add_argument('--size', type=int, default=64 * 1024, help="file size in bytes")
+    args = parser.parse_args()
+
+    with LocalOrigin() as origin, tempfile.TemporaryDirectory() as tmp:
+        out_dir = Path(tmp)
+        urls = [origin.url(f"/blob/clip{i}.mp4", size=args.size) for i in range(args.items)]
+
+        # Warm up imports and the lazy extractor list so neither mode pays it alone
+        run_reused(urls[:1], out_dir)
+
+        print(f"{args.items} items, {args.size // 1024} KiB each")
+        print(f"{'mode':>8} {'wall (s)':>9} {'per item (ms)':>14} {'connections':>12}")
+        results = {}
+        for name, runner in (('fresh', run_fresh), ('reused', run_reused)):
+            elapsed, connections = measure(origin, runner, urls, out_dir)
+            results[name] = elapsed, connections
+            print(f"{name:>8} {elapsed:>9.2f} {elapsed / args.items * 1000:>14.1f} {connections:>12}")
+
+        (fresh, fresh_connections), (reused, reused_connections) = results['fresh'], results['reused']
+        print(f"Per-item overhead saved by reuse: {(fresh - reused) / args.items * 1000:.1f} ms")
+        # Every item opens at least one connection per request without keep-alive
+        pooled = reused_connections < fresh_connections * 3 // 4
+        print(f"Connections kept alive: {'yes' if pooled else 'NO'} ({reused_connections} vs {fresh_connections})")
+        if not pooled:
+            print('Install the requests package for keep-alive: pip install "yt-dlp[default]"')
+    sys.exit(0 if pooled and reused < fresh else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark - startup cost of the entry point
+Runs `main.py` with -X importtime for paths that should answer without yt-dlp
+or Flask (help, usage errors), reports wall time, total import time and which
+heavy modules were loaded, next to a bare `import yt_dlp` for reference.
+Also times the ffmpeg toolchain probe cold and from its on-disk cache.
+
+Usage: python benchmarks/bench_startup.py [--rounds 5]
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ('yt_dlp', 'flask', 'imageio_ffmpeg', 'tkinter')
+
+# (label, arguments to main.py)
+CASES = [
+    ('--help', ['--help']),
+    ('cli --help', ['cli', '--help']),
+    ('cli bad argument', ['cli', '--segments', '99']),
+    ('serve --help', ['serve', '--help']),
+    ('gui --help', ['gui', '--help']),
+]
+
+
+def run(args, env):
+    """(wall seconds, cumulative import microseconds, top-level modules imported)"""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=APP_DIR, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors='replace')
+    wall = time.perf_counter() - start
+    # "import time: self [us] | cumulative | imported package"; nested imports are indented
+    rows = re.findall(r'^import time:\s+\d+ \|\s+(\d+) \| (\S.*)$', proc.stderr, re.MULTILINE)
+    total = sum(int(cumulative) for cumulative, name in rows if not name.startswith(' '))
+    loaded = {name.strip().split('.')[0] for _, name in rows}
+    return wall, total, loaded
+
+
+def measure(args, env, rounds):
+    runs = [run(args, env) for _ in range(rounds)]
+    return (statistics.median(r[0] for r in runs), statistics.median(r[1] for r in runs),
+            [m for m in HEAVY_MODULES if m in runs[0][2]])
+
+
+def probe_times(env, rounds):
+    """Median seconds for toolchain.probe() with an empty cache and with a warm one"""
+    code = ("import time, toolchain; t = time.perf_counter(); toolchain.probe(); "
+            "print(time.perf_counter() - t)")
+    cold, warm = [], []
+    for _ in range(rounds):
+        with tempfile.TemporaryDirectory() as cache:
+            env = {**env, 'XDG_CACHE_HOME': cache, 'LOCALAPPDATA': cache}
+            for times in (cold, warm):
+                out = subprocess.run([sys.executable, '-c', code], cwd=APP_DIR, env=env,
+                                     capture_output=True, text=True, check=True).stdout
+                times.append(float(out))
+    return statistics.median(cold), statistics.median(warm)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    env = {**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'}
+    print(f"{args.rounds} rounds, median shown")
+    print(f"{'command':<22} {'wall ms':>8} {'import ms':>10}  heavy modules loaded")
+    for label, argv in [*((label, ['main.py', *argv]) for label, argv in CASES),
+                        ('import yt_dlp (ref)', ['-c', 'import yt_dlp'])]:
+        wall, imports, heavy = measure(argv, env, args.rounds)
+        print(f"{label:<22} {wall * 1000:>8.0f} {imports / 1000:>10.0f}  {', '.join(heavy) or '-'}")
+
+    cold, warm = probe_times(env, args.rounds)
+    print(f"\ntoolchain probe: cold {cold * 1000:.1f} ms, cached {warm * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Benchmark - time to first byte of the job server's file flow vs. streaming mode
+File flow: POST /download, wait for 'completed' on /events, then GET /file.
+Streaming: GET /stream, fragmented MP4 sent while ffmpeg produces it.
+Media come from the local origin with a per-connection bandwidth cap.
+
+Usage: python benchmarks/bench_stream_ttfb.py [--duration 30] [--rate 1048576] [--rounds 2]
+"""
+
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+try:
+    import flask  # noqa: F401  (job_server exits when Flask is missing)
+except ImportError:
+    print("This benchmark needs Flask: pip install flask")
+    sys.exit(1)
+from werkzeug.serving import make_server
+
+import job_server
+from file_serving import sendfile_request_handler
+from local_origin import LocalOrigin
+from media_fixtures import find_ffmpeg, generate, item_urls
+
+
+class DiskWatcher:
+    """
+    Largest growth of a directory's total size while the watcher runs (the
+    server keeps earlier outputs in its retention store)
+    """
+
+    def __init__(self, directory, interval=0.05):
+        self.directory = Path(directory)
+        self.interval = interval
+        self.peak = 0
+        self._base = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _size(self):
+        return sum(p.stat().st_size for p in self.directory.iterdir() if p.is_file())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                size = self._size()
+            except OSError:
+                continue  # a file vanished mid-scan
+            self.peak = max(self.peak, size - self._base)
+
+    def __enter__(self):
+        self._base = self._size()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def read_body(response, start, sink):
+    """Copy a response to sink; returns (seconds to first body byte, bytes)"""
+    first = None
+    total = 0
+    while True:
+        chunk = response.read1(64 * 1024)
+        if not chunk:
+            return first, total
+        if first is None:
+            first = time.perf_counter() - start
+        total += len(chunk)
+        sink.write(chunk)
+
+
+def file_flow(base, url, name, out_dir):
+    start = time.perf_counter()
+    request = urllib.request.Request(f'{base}/download', data=json.dumps({'url': url, 'filename': name}).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        job_id = json.load(response)['jobId']
+    event = {}
+    with urllib.request.urlopen(f'{base}/events/{job_id}') as events:
+        for line in events:
+            if line.startswith(b'data:'):
+                event = json.loads(line[5:])
+                if event['status'] in ('completed', 'error'):
+                    break
+    if event.get('status') != 'completed':
+        raise RuntimeError(f"job failed: {event}")
+    path = out_dir / event['filename']
+    with urllib.request.urlopen(f"{base}/file/{urllib.parse.quote(event['filename'])}") as response, \
+            open(path, 'wb') as sink:
+        first, total = read_body(response, start, sink)
+    return first, time.perf_counter() - start, total, path
+
+
+def stream_flow(base, url, name, out_dir):
+    start = time.perf_counter()
+    path = out_dir / f'{name}.mp4'
+    query = urllib.parse.urlencode({'url': url, 'filename': name})
+    with urllib.request.urlopen(f'{base}/stream?{query}') as response, open(path, 'wb') as sink:
+        first, total = read_body(response, start, sink)
+    return first, time.perf_counter() - start, total, path
+
+
+def playable_seconds(ffmpeg, path):
+    """Decoded duration of a result (checks the output is complete, not just non-empty)"""
+    proc = subprocess.run([ffmpeg, '-hide_banner', '-i', str(path), '-f', 'null', '-'],
+                          capture_output=True, text=True, errors='replace')
+    times = re.findall(r'time=(\d+):(\d+):(\d+(?:\.\d+)?)', proc.stderr)
+    if proc.returncode or not times:
+        return None
+    hours, minutes, seconds = times[-1]
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=int, default=30, help="seconds of media per item")
+    parser.add_argument('--rate', type=int, default=1024 * 1024, help="origin bytes/s per connection")
+    parser.add_argument('--rounds', type=int, default=2)
+    parser.add_argument('--media-dir', help="keep generated media here to reuse between runs")
+    args = parser.parse_args()
+
+    ffmpeg = find_ffmpeg()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        media_dir = Path(args.media_dir) if args.media_dir else tmp / 'media'
+        print(f"generating {args.duration}s fixtures in {media_dir}...")
+        generate(media_dir, duration=args.duration)
+
+        downloads = tmp / 'downloads'
+        received = tmp / 'received'
+        received.mkdir()
+        downloads.mkdir()
+        scheduler = job_server.JobScheduler(downloads, workers=2)
+        server = make_server('127.0.0.1', 0, job_server.create_app(scheduler), threaded=True,
+                         request_handler=sendfile_request_handler())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f'http://127.0.0.1:{server.port}'
+
+        print(f"origin cap {args.rate / 1024 ** 2:.1f} MiB/s per connection, {args.rounds} rounds, median shown")
+        print(f"{'source':<12} {'mode':<7} {'TTFB s':>8} {'total s':>8} {'MB':>6} {'disk MB':>8}  output")
+        n = 0
+        with LocalOrigin(default_rate=args.rate, media_dir=media_dir) as origin:
+            for media_set, label in (('h264', 'remux'), ('vp9', 'transcode')):
+                for mode, flow in (('file', file_flow), ('stream', stream_flow)):
+                    runs = []
+                    for _ in range(args.rounds):
+                        n += 1  # a new URL each time, so nothing comes from a cache
+                        url = item_urls(origin.base_url, media_set, n)[-1]
+                        with DiskWatcher(downloads) as disk:
+                            first, total, size, path = flow(base, url, f'item{n}', received)
+                        runs.append((first, total, size, disk.peak if mode == 'file' else 0,
+                                     playable_seconds(ffmpeg, path)))
+                    first, total, size, peak, seconds = (statistics.median(r[i] or 0 for r in runs)
+                                                         for i in range(5))
+                    ok = all(r[4] and abs(r[4] - args.duration) < 1 for r in runs)
+                    print(f"{label:<12} {mode:<7} {first:>8.2f} {total:>8.2f} {size / 1024 ** 2:>6.1f} "
+                          f"{peak / 1024 ** 2:>8.1f}  {f'ok ({seconds:.1f}s playable)' if ok else 'BROKEN'}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
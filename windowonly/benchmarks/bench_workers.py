@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark - worker mode throughput and failure recovery
+Queues downloads from the local origin, whose per-connection rate cap stands in
+for one machine's link, and works through them with 1, 2, 4 ... worker processes
+(queue_worker.py run --processes N) to see throughput scale with the workers.
+Then kills one of two workers (SIGKILL, like a crashed node) in the middle of a
+job and checks that its lease expires, another worker finishes the job and
+every job ends up done exactly once.
+
+Usage: python benchmarks/bench_workers.py [--items 12] [--processes 1 2 4] [--rate 1M] [--size 2M]
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR))
+
+from bandwidth import format_rate, parse_rate
+from local_origin import LocalOrigin
+from work_queue import STATE_DONE, STATE_LEASED, WorkQueue
+
+# Lease for the recovery check: short, so the killed worker's job comes back quickly
+RECOVERY_LEASE = 3.0
+
+
+def start_worker(queue_path, tmp, *args):
+    cmd = [sys.executable, str(APP_DIR / 'queue_worker.py'), 'run', '--queue', str(queue_path),
+           '--exit-when-empty', '--poll', '0.2', *args]
+    env = dict(os.environ, XDG_CACHE_HOME=str(Path(tmp) / 'cache'), LOCALAPPDATA=str(Path(tmp) / 'cache'))
+    return subprocess.Popen(cmd, cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def queue_jobs(queue_path, urls, out_dir):
+    with WorkQueue(queue_path) as queue:
+        queue.enqueue_many([(url, out_dir, None) for url in urls], {'segments': 1})
+
+
+def jobs_of(queue_path):
+    with WorkQueue(queue_path) as queue:
+        return queue.jobs(limit=100000)
+
+
+def scaling(origin, tmp, items, size, rate, processes):
+    """(wall seconds, seconds from the first lease to the last result, jobs done) for one worker count"""
+    queue_path = Path(tmp) / f'scale{processes}.sqlite3'
+    urls = [origin.url(f'/blob/p{processes}-item{n}.mp4', size=size, rate=rate) for n in range(items)]
+    queue_jobs(queue_path, urls, Path(tmp) / f'out{processes}')
+    start = time.perf_counter()
+    start_worker(queue_path, tmp, '--processes', str(processes)).wait()
+    wall = time.perf_counter() - start
+    jobs = jobs_of(queue_path)
+    done = [job for job in jobs if job['state'] == STATE_DONE]
+    busy = (max(job['finished_at'] for job in done) - min(job['started_at'] for job in jobs)) if done else None
+    return wall, busy, len(done)
+
+
+def recovery(origin, tmp, items, size, rate):
+    """Kill one of two workers mid-job; True when every job is done once and the lost one was re-leased"""
+    queue_path = Path(tmp) / 'recovery.sqlite3'
+    urls = [origin.url(f'/blob/rec-item{n}.mp4', size=size, rate=rate) for n in range(items)]
+    queue_jobs(queue_path, urls, Path(tmp) / 'out-recovery')
+    lease = ['--lease', str(RECOVERY_LEASE)]
+    victim = start_worker(queue_path, tmp, '--name', 'victim', *lease)
+    survivor = start_worker(queue_path, tmp, '--name', 'survivor', *lease)
+
+    # Kill the victim a second into its first download
+    lost = None
+    deadline = time.monotonic() + 60
+    while lost is None and time.monotonic() < deadline:
+        leased = [job for job in jobs_of(queue_path) if job['state'] == STATE_LEASED and job['worker'] == 'victim']
+        if leased and time.time() - leased[0]['started_at'] > 1.0:
+            lost = leased[0]['id']
+        time.sleep(0.1)
+    if lost is None:
+        print("  victim never leased a job")
+        victim.kill()
+        survivor.kill()
+        return False
+    victim.send_signal(signal.SIGKILL)
+    killed_at = time.time()
+    victim.wait()
+    code = survivor.wait(timeout=items * size / rate * 3 + 60)
+
+    jobs = jobs_of(queue_path)
+    job = next(job for job in jobs if job['id'] == lost)
+    done = sum(1 for job in jobs if job['state'] == STATE_DONE)
+    outputs = list((Path(tmp) / 'out-recovery').glob('*.mp4'))
+    print(f"  killed 'victim' during job {lost}; survivor exit code {code}")
+    print(f"  job {lost}: {job['state']} by {job['worker']} after {job['attempts']} leases, "
+          f"re-leased {job['started_at'] - killed_at:.1f}s after the kill (lease {RECOVERY_LEASE:g}s)")
+    print(f"  jobs done: {done}/{items}, output files: {len(outputs)}")
+    return (code == 0 and done == items == len(outputs) and job['state'] == STATE_DONE
+            and job['worker'] == 'survivor' and job['attempts'] == 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=12)
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--rate', type=parse_rate, default='1M', help="origin rate per connection")
+    parser.add_argument('--size', type=parse_rate, default='2M', help="bytes per item")
+    args = parser.parse_args()
+
+    ok = True
+    with LocalOrigin() as origin, tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.items} items of {args.size / 1024 ** 2:.1f} MB, origin {format_rate(args.rate)} per connection")
+        print(f"{'processes':>9} {'done':>6} {'wall s':>8} {'busy s':>8} {'items/s':>8} {'speedup':>8}")
+        base = None
+        for processes in args.processes:
+            wall, busy, done = scaling(origin, tmp, args.items, args.size, args.rate, processes)
+            ok &= done == args.items
+            throughput = done / busy if busy else 0
+            base = base or throughput
+            print(f"{processes:>9} {done:>6} {wall:>8.2f} {busy or 0:>8.2f} {throughput:>8.2f} "
+                  f"{throughput / base if base else 0:>7.2f}x")
+        print("recovery (2 workers, one killed)")
+        ok &= recovery(origin, tmp, min(args.items, 6), args.size, args.rate)
+    print("all jobs done once; the killed worker's job was finished by the other" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
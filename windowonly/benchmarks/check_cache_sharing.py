@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Cache check - two processes sharing one media cache evict by their joint use
+Each process opens the cache first, then stores a new output in turn while
+an older, unused entry sits in the cache; once the second store pushes the
+cache over its size bound, the old entry must go and both new outputs stay.
+
+Usage: python benchmarks/check_cache_sharing.py [--size 1048576]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from media_cache import MediaCache
+
+OLD, FIRST, SECOND = 'a0' * 16, 'b1' * 16, 'c2' * 16
+
+
+def store_when_told(directory, max_bytes, key, src, opened, go, done):
+    cache = MediaCache(directory, max_bytes=max_bytes)
+    opened.set()
+    go.wait()
+    cache.store(key, 'mp4', src)
+    done.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=1024 * 1024, help="bytes per cached output")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, 'output.mp4')
+        with open(src, 'wb') as f:
+            f.write(os.urandom(args.size))
+        directory = os.path.join(tmp, 'cache')
+        MediaCache(directory).store(OLD, 'mp4', src)
+        time.sleep(0.05)
+
+        # Room for two outputs: the second store evicts one entry
+        max_bytes = args.size * 5 // 2
+        events = []
+        workers = []
+        for key in (FIRST, SECOND):
+            opened, go, done = multiprocessing.Event(), multiprocessing.Event(), multiprocessing.Event()
+            worker = multiprocessing.Process(target=store_when_told,
+                                             args=(directory, max_bytes, key, src, opened, go, done))
+            worker.start()
+            opened.wait()
+            events.append((go, done))
+            workers.append(worker)
+        # Both caches are open before either stores, as with long-running workers
+        for go, done in events:
+            go.set()
+            done.wait()
+            time.sleep(0.05)
+        for worker in workers:
+            worker.join()
+
+        left = {path.stem for path in Path(directory).glob('??/*')}
+        ok = left == {FIRST, SECOND}
+        for label, key in (('old entry', OLD), ('first process', FIRST), ('second process', SECOND)):
+            print(f"{label:<15} {'kept' if key in left else 'evicted'}")
+    print("OK: the least recently used entry was evicted" if ok else "FAILED: a newer output was evicted")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Crash/resume check - kill the CLI mid-batch, run the same batch again and
+verify that items the job journal recorded as done are not fetched again
+
+The origin counts requests per file, so any repeated work shows up directly.
+
+Usage: python benchmarks/check_journal_resume.py [--items 8] [--kill-after 3]
+"""
+
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR))
+
+from local_origin import LocalOrigin
+from job_journal import JOURNAL_NAME, STATE_DONE
+
+
+def journal_rows(out_dir):
+    path = Path(out_dir) / JOURNAL_NAME
+    if not path.exists():
+        return []
+    db = sqlite3.connect(str(path), timeout=10)
+    try:
+        return db.execute('SELECT url, state, downloaded_bytes, total_bytes FROM jobs').fetchall()
+    except sqlite3.OperationalError:
+        return []  # table not created yet
+    finally:
+        db.close()
+
+
+def run_cli(urls, out_dir, env):
+    cmd = [sys.executable, str(APP_DIR / 'youtube_downloader_cli.py'), ';'.join(urls), str(out_dir), '',
+           '--no-cache']
+    return subprocess.Popen(cmd, cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def name_of(url):
+    return url.split('?')[0].rsplit('/', 1)[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=8)
+    parser.add_argument('--kill-after', type=int, default=3, help="kill once this many items are done")
+    parser.add_argument('--size', type=int, default=2 * 1024 * 1024)
+    parser.add_argument('--latency', type=float, default=0.3)
+    args = parser.parse_args()
+
+    with LocalOrigin() as origin, tempfile.TemporaryDirectory() as tmp:
+        out_dir = Path(tmp) / 'out'
+        env = dict(os.environ, XDG_CACHE_HOME=str(Path(tmp) / 'cache'))
+        urls = [origin.url(f'/blob/item{n}.mp4', size=args.size, latency=args.latency)
+                for n in range(1, args.items + 1)]
+
+        # Run 1: kill the process (no cleanup, like a crash) once enough items are done
+        proc = run_cli(urls, out_dir, env)
+        while proc.poll() is None:
+            done = [row for row in journal_rows(out_dir) if row[1] == STATE_DONE]
+            if len(done) >= args.kill_after:
+                proc.kill()
+                break
+            time.sleep(0.05)
+        proc.wait()
+
+        rows = journal_rows(out_dir)
+        done_names = {name_of(url) for url, state, *_ in rows if state == STATE_DONE}
+        print(f"run 1 killed with {len(done_names)}/{args.items} done")
+        for url, state, downloaded, total in sorted(rows):
+            if state != STATE_DONE:
+                print(f"  {name_of(url)}: {state}" + (f" at {downloaded}/{total} bytes" if downloaded else ""))
+
+        # Run 2: same batch to completion
+        before = dict(origin.path_requests)
+        start = time.perf_counter()
+        code = run_cli(urls, out_dir, env).wait()
+        elapsed = time.perf_counter() - start
+        repeated = {name: origin.path_requests[f'/blob/{name}'] - before.get(f'/blob/{name}', 0)
+                    for name in done_names}
+        outputs = sorted(p.name for p in out_dir.glob('*.mp4'))
+
+        print(f"run 2 exit code {code} in {elapsed:.2f}s, outputs: {len(outputs)}/{args.items}")
+        print(f"requests in run 2 for items done in run 1: {sum(repeated.values())}")
+
+        ok = code == 0 and len(outputs) == args.items and not any(repeated.values())
+        print("OK: finished work was not repeated" if ok else f"FAILED: {repeated}")
+        sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
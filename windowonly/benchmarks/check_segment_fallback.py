@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Resume check - stop a segmented download partway, then finish it where the
+segmented path does not apply, and verify the output byte for byte
+  probe-fails   the size probe of the second run fails (a transient error)
+  one-segment   the second run asks for a single connection
+The .part file of a segmented download is preallocated to full size; a stock
+single-connection resume of it would take the unwritten zeros for data.
+
+Usage: python benchmarks/check_segment_fallback.py [--size 8388608] [--stop-at 0.4]
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from local_origin import LocalOrigin, payload
+from ydl_session import DownloadSession
+
+SCENARIOS = ('probe-fails', 'one-segment')
+
+
+def digest_of(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stop_after(nbytes):
+    """Progress hook that stops the download once nbytes are in"""
+    def hook(d):
+        if d['status'] == 'downloading' and (d.get('downloaded_bytes') or 0) >= nbytes:
+            raise Exception("STOP_REQUESTED")
+    return hook
+
+
+def download(url, outtmpl, segments, hook=None):
+    opts = {'quiet': True, 'no_warnings': True, 'noprogress': True, 'format': 'best',
+            'segments': segments, 'retries': 3}
+    with DownloadSession(opts) as session:
+        session.download(url, outtmpl, progress_hook=hook, probe=False)
+
+
+def run(origin, scenario, size, stop_at, rate, out_dir):
+    url = origin.url('/blob/video.mp4', size=size, rate=rate)
+    outtmpl = str(out_dir / 'video.%(ext)s')
+    part = out_dir / 'video.mp4.part'
+
+    # Run 1: four ranges, stopped partway (the .part file and its range state stay)
+    try:
+        download(url, outtmpl, 4, stop_after(int(size * stop_at)))
+    except Exception as e:
+        if 'STOP_REQUESTED' not in str(e):
+            raise
+    partial = part.exists() and Path(f"{part}.segments").exists()
+
+    # Run 2: the same output, on a path that is not the four-range download
+    try:
+        if scenario == 'probe-fails':
+            download(origin.url('/blob/video.mp4', size=size, rate=rate, probe='fail'), outtmpl, 4)
+        else:
+            download(url, outtmpl, 1)
+    except Exception as e:
+        return partial, None, str(e).splitlines()[0]
+    output = out_dir / 'video.mp4'
+    return partial, output.exists() and digest_of(output), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=8 * 1024 * 1024)
+    parser.add_argument('--stop-at', type=float, default=0.4, help="share of the file downloaded in run 1")
+    parser.add_argument('--rate', type=int, default=4 * 1024 * 1024, help="bytes/s per connection")
+    args = parser.parse_args()
+
+    expected = hashlib.sha256(payload(0, args.size - 1)).hexdigest()
+    ok = True
+    with LocalOrigin() as origin, tempfile.TemporaryDirectory() as tmp:
+        for scenario in SCENARIOS:
+            out_dir = Path(tmp) / scenario
+            os.makedirs(out_dir)
+            partial, digest, error = run(origin, scenario, args.size, args.stop_at, args.rate, out_dir)
+            intact = digest == expected
+            ok &= partial and intact
+            print(f"{scenario:<12} stopped run left a partial file: {'yes' if partial else 'NO'}, "
+                  f"output: {'intact' if intact else 'CORRUPT' if digest else error or 'missing'}")
+    print("OK: partial segmented downloads finish intact" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
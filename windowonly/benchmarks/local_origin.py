@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Local HTTP origin used by the benchmarks
+Serves synthetic payloads with configurable latency so runs are offline and repeatable
+
+    /blob/<name>?size=<bytes>&latency=<seconds>&rate=<bytes per second>&cut=<bytes>&probe=fail
+    /media/<file>?latency=...&rate=...     (files from media_dir, see media_fixtures)
+
+The Content-Type follows the name's extension (e.g. /blob/a.mp4 is served as video/mp4),
+which lets yt-dlp's generic extractor treat the URL as a direct media link.
+Single byte ranges are honored (206), and rate caps the bandwidth of each
+response, like a CDN throttling per connection, and cut drops the connection
+after that many bytes of each response. probe=fail answers one-byte range
+requests (bytes=0-0, a size probe) with 503, like a transient error. The blob body is a fixed byte
+pattern (see payload()), so downloads can be checked for correctness.
+Media names may carry an item suffix (h264~3.mpd serves h264.mpd), which
+gives every batch item its own URL and video ID.
+"""
+
+import mimetypes
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+CHUNK = 64 * 1024
+
+mimetypes.add_type('application/dash+xml', '.mpd')
+mimetypes.add_type('audio/mp4', '.m4a')
+
+# Prime length, so a block copied to the wrong offset never matches by accident
+_PATTERN = bytes((i * 7 + i // 251) % 256 for i in range(65521))
+
+
+def payload(start, end):
+    """Bytes start..end (inclusive) of every blob"""
+    out = bytearray()
+    pos = start
+    while pos <= end:
+        offset = pos % len(_PATTERN)
+        piece = _PATTERN[offset:offset + end - pos + 1]
+        out += piece
+        pos += len(piece)
+    return bytes(out)
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+    def setup(self):
+        super().setup()
+        # One call per TCP connection, so keep-alive reuse shows up as fewer connections
+        self.server.count_connection()
+
+    def _query(self):
+        parsed = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        return parsed.path, query
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    def _media_file(self, path):
+        """File in media_dir for /media/<name>[~<item>].<ext>, or None"""
+        if not self.server.media_dir or not path.startswith('/media/'):
+            return None
+        name = os.path.basename(path)
+        name = re.sub(r'~\d+(?=\.\w+$)', '', name)
+        file_path = os.path.join(self.server.media_dir, name)
+        return file_path if os.path.isfile(file_path) else None
+
+    def do_GET(self, head=False):
+        path, query = self._query()
+        media = self._media_file(path)
+        if media:
+            size = os.path.getsize(media)
+        elif path.startswith('/blob/'):
+            size = int(query.get('size', 1024 * 1024))
+        else:
+            self.send_error(404)
+            return
+
+        latency = float(query.get('latency', self.server.default_latency))
+        rate = float(query.get('rate', self.server.default_rate))
+        cut = int(query.get('cut', 0))
+        self.server.count_request(path)
+        if query.get('probe') == 'fail' and self.headers.get('Range') == 'bytes=0-0':
+            self.send_error(503)
+            return
+
+        # Simulated network round-trip before the first byte
+        if latency:
+            time.sleep(latency)
+
+        start, end = 0, size - 1
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+        if match and match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            if start > end:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if head:
+            return
+
+        # Simulated dropped connection: the body stops short of Content-Length
+        stop_at = min(end + 1, start + cut) if cut else end + 1
+        source = open(media, 'rb') if media else None
+        started = time.monotonic()
+        pos = start
+        try:
+            if source:
+                source.seek(start)
+            while pos < stop_at:
+                n = min(CHUNK, stop_at - pos)
+                block = source.read(n) if source else payload(pos, pos + n - 1)
+                self.wfile.write(block)
+                pos += len(block)
+                self.server.count_bytes(len(block))
+                if rate:
+                    # Sleep until this connection is back under its bandwidth cap
+                    ahead = (pos - start) / rate - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        finally:
+            if source:
+                source.close()
+        if pos <= end:
+            self.close_connection = True
+
+
+class LocalOrigin(ThreadingHTTPServer):
+    """Threaded origin server that runs in the background"""
+    daemon_threads = True
+
+    def __init__(self, handler=OriginHandler, port=0, default_latency=0.0, default_rate=0, media_dir=None):
+        super().__init__(('127.0.0.1', port), handler)
+        self.default_latency = default_latency
+        self.default_rate = default_rate
+        self.media_dir = str(media_dir) if media_dir else None
+        self.bytes_sent = 0
+        self.requests = 0
+        self.path_requests = Counter()
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def handle_error(self, request, client_address):
+        # Clients (e.g. yt-dlp's generic extractor sniffing a file) may hang up early
+        exc = sys.exc_info()[1]
+        if isinstance(exc, (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+    def count_request(self, path=None):
+        with self._lock:
+            self.requests += 1
+            self.path_requests[path] += 1
+
+    def count_bytes(self, n):
+        with self._lock:
+            self.bytes_sent += n
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def url(self, path, **query):
+        qs = '&'.join(f"{k}={v}" for k, v in query.items())
+        return f"{self.base_url}{path}" + (f"?{qs}" if qs else '')
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
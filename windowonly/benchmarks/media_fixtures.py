@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Synthetic media for the offline benchmarks
+Generates H.264/AAC and VP9/Opus streams with ffmpeg and DASH manifests that
+yt-dlp's generic extractor turns into separate video/audio formats (with codecs),
+so downloads go through the same format selection, merge and encode paths as real sites
+"""
+
+import json
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+DEFAULT_DURATION = 10
+DEFAULT_SIZE = '640x360'
+
+# name -> (file, ffmpeg output args, MPD mimeType, MPD codecs)
+STREAMS = {
+    'h264': ('video_h264.mp4', ['-an', '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+                                '-movflags', '+faststart'], 'video/mp4', 'avc1.64001e'),
+    'aac': ('audio_aac.m4a', ['-vn', '-c:a', 'aac', '-b:a', '128k'], 'audio/mp4', 'mp4a.40.2'),
+    'vp9': ('video_vp9.webm', ['-an', '-c:v', 'libvpx-vp9', '-deadline', 'realtime', '-cpu-used', '8',
+                               '-b:v', '800k'], 'video/webm', 'vp9'),
+    'opus': ('audio_opus.webm', ['-vn', '-c:a', 'libopus', '-b:a', '96k'], 'audio/webm', 'opus'),
+}
+
+# Media sets served to the downloader: DASH pairs and one progressive file
+SETS = {
+    'h264': ('h264', 'aac'),  # already iPhone-compatible: remux
+    'vp9': ('vp9', 'opus'),   # needs a full transcode
+}
+PROGRESSIVE = 'progressive_h264.mp4'
+# Fragmented H.264/AAC for the native HLS and DASH downloaders (see generate_segmented)
+SEGMENTED = {'hls': 'hls.m3u8', 'dash': 'dash.mpd'}
+
+_MPD = '''<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT{duration}S"
+     minBufferTime="PT1.5S" profiles="urn:mpeg:dash:profile:isoff-on-demand:2011">
+  <Period>
+{adaptation_sets}
+  </Period>
+</MPD>
+'''
+
+_ADAPTATION_SET = '''    <AdaptationSet mimeType="{mime}" contentType="{kind}">
+      <Representation id="{name}" codecs="{codecs}" bandwidth="{bandwidth}"{extra}><BaseURL>{file}</BaseURL></Representation>
+    </AdaptationSet>'''
+
+
+def find_ffmpeg():
+    """ffmpeg from imageio-ffmpeg when installed, else the one on PATH"""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except ImportError:
+        return shutil.which('ffmpeg')
+
+
+def _sources(duration, size):
+    return ['-f', 'lavfi', '-i', f'testsrc2=size={size}:rate=30:duration={duration}',
+            '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={duration}']
+
+
+def _manifest(directory, streams, duration):
+    sets = []
+    for name in streams:
+        file, _, mime, codecs = STREAMS[name]
+        kind = mime.split('/')[0]
+        bitrate = int(os.path.getsize(directory / file) * 8 / duration)
+        if kind == 'video':
+            width, height = DEFAULT_SIZE.split('x')
+            extra = f' width="{width}" height="{height}" frameRate="30"'
+        else:
+            extra = ' audioSamplingRate="48000"'
+        sets.append(_ADAPTATION_SET.format(mime=mime, kind=kind, name=name, codecs=codecs,
+                                           bandwidth=bitrate, extra=extra, file=file))
+    return _MPD.format(duration=duration, adaptation_sets='\n'.join(sets))
+
+
+def generate(directory, duration=DEFAULT_DURATION, size=DEFAULT_SIZE, ffmpeg=None):
+    """
+    Create the streams, manifests and progressive file in directory (reused when
+    already generated with the same parameters). Returns the fixture description.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp_path = directory / 'fixtures.json'
+    params = {'duration': duration, 'size': size, 'streams': sorted(STREAMS)}
+    try:
+        with open(stamp_path, encoding='utf-8') as f:
+            fixtures = json.load(f)
+        if fixtures.get('params') == params:
+            return fixtures
+    except (OSError, ValueError):
+        pass
+
+    ffmpeg = ffmpeg or find_ffmpeg()
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg not found (pip install imageio-ffmpeg)")
+
+    base = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-y'] + _sources(duration, size)
+    for file, args, _, _ in STREAMS.values():
+        subprocess.run(base + args + [str(directory / file)], check=True)
+    subprocess.run(base + ['-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+                           '-c:a', 'aac', '-b:a', '128k', '-movflags', '+faststart',
+                           str(directory / PROGRESSIVE)], check=True)
+
+    for name, streams in SETS.items():
+        (directory / f'{name}.mpd').write_text(_manifest(directory, streams, duration), encoding='utf-8')
+
+    fixtures = {'params': params, 'duration': duration, 'sets': sorted(SETS), 'progressive': PROGRESSIVE}
+    with open(stamp_path, 'w', encoding='utf-8') as f:
+        json.dump(fixtures, f)
+    return fixtures
+
+
+def generate_segmented(directory, duration=DEFAULT_DURATION, segment=1.0, size=DEFAULT_SIZE, ffmpeg=None):
+    """
+    Create an HLS playlist (muxed fMP4 segments) and a DASH manifest (fMP4
+    segments, separate video and audio) of segment seconds each in directory,
+    next to the other fixtures; every fragment is a request of its own. Reused
+    when already generated with the same parameters. (fMP4 rather than MPEG-TS
+    for HLS: some static ffmpeg builds crash demuxing TS.)
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp_path = directory / 'segmented.json'
+    params = {'duration': duration, 'segment': segment, 'size': size, 'hls': 'fmp4'}
+    try:
+        with open(stamp_path, encoding='utf-8') as f:
+            if json.load(f).get('params') == params:
+                return params
+    except (OSError, ValueError):
+        pass
+
+    ffmpeg = ffmpeg or find_ffmpeg()
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg not found (pip install imageio-ffmpeg)")
+    for old in list(directory.glob('hls_*.m4s')) + list(directory.glob('dash_*.m4s')):
+        old.unlink()
+
+    gop = str(int(30 * segment))
+    encode = (['-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', '-g', gop, '-keyint_min', gop,
+               '-sc_threshold', '0', '-c:a', 'aac', '-b:a', '128k'])
+    base = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-y'] + _sources(duration, size) + encode
+    subprocess.run(base + ['-f', 'hls', '-hls_time', str(segment), '-hls_playlist_type', 'vod',
+                           '-hls_segment_type', 'fmp4', '-hls_fmp4_init_filename', 'hls_init.mp4',
+                           '-hls_segment_filename', str(directory / 'hls_seg_%04d.m4s'),
+                           str(directory / SEGMENTED['hls'])], check=True)
+    subprocess.run(base + ['-map', '0:v', '-map', '1:a', '-f', 'dash', '-seg_duration', str(segment),
+                           '-use_template', '1', '-use_timeline', '0',
+                           '-init_seg_name', 'dash_init_$RepresentationID$.m4s',
+                           '-media_seg_name', 'dash_chunk_$RepresentationID$_$Number%05d$.m4s',
+                           str(directory / SEGMENTED['dash'])], check=True)
+    with open(stamp_path, 'w', encoding='utf-8') as f:
+        json.dump({'params': params}, f)
+    return params
+
+
+def item_urls(base_url, media_set, count):
+    """
+    count distinct URLs on the origin at base_url for one media set ('h264', 'vp9',
+    'progressive', or 'hls' / 'dash' from generate_segmented).
+
+    Each URL has its own file name, so yt-dlp sees a different video ID per item
+    and nothing is served from the media cache; the origin maps them back to the
+    shared fixture (see local_origin, /media/<name>~<n>.<ext>).
+    """
+    if media_set in SEGMENTED:
+        name, ext = SEGMENTED[media_set].split('.')
+    else:
+        name, ext = ('progressive_h264', 'mp4') if media_set == 'progressive' else (media_set, 'mpd')
+    return [f'{base_url}/media/{name}~{n}.{ext}' for n in range(1, count + 1)]
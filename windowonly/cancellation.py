@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Job Cancellation
+Cancellable job handles: the ffmpeg (and other) child processes a job starts
+are tracked, and cancel() ends them and their process group at once instead of
+waiting for the job's next progress callback
+"""
+
+import contextlib
+import os
+import signal
+import subprocess
+import threading
+import time
+
+# Message of every stop/cancel exception; the batch runners compare str(e) with it
+STOP_REQUESTED = "STOP_REQUESTED"
+# Seconds a child gets to exit after the polite signal before it is killed. Short: on
+# SIGTERM ffmpeg flushes its encoder and finishes the file, work a cancel throws away
+TERMINATE_GRACE = 0.5
+# Windows: no console window for taskkill
+_CREATE_NO_WINDOW = 0x08000000
+
+_local = threading.local()
+
+
+class JobCancelled(Exception):
+    """The job was cancelled (str() is STOP_REQUESTED, like the stop requests of the batch runners)"""
+
+    def __init__(self, message=STOP_REQUESTED):
+        super().__init__(message)
+
+
+def group_kwargs(kwargs=None):
+    """Popen keyword arguments that start a child as the leader of a process group of its own"""
+    if os.name == 'nt':
+        flags = (kwargs or {}).get('creationflags', 0) | subprocess.CREATE_NEW_PROCESS_GROUP
+        return {'creationflags': flags}
+    return {'start_new_session': True}
+
+
+def start_process_group():
+    """Make the calling process lead a new process group (a pool initializer; no-op on Windows)"""
+    if os.name != 'nt':
+        os.setsid()
+
+
+def _group_alive(pid):
+    try:
+        os.killpg(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def kill_tree(pid, grace=TERMINATE_GRACE, proc=None):
+    """
+    End the process group led by pid (the process and everything it started).
+
+    POSIX: SIGTERM first, SIGKILL for what is left after grace seconds.
+    Windows: taskkill /T, which walks the process tree. proc, the Popen of pid
+    when there is one, is waited for (and so reaped) instead of polled.
+    """
+    if os.name == 'nt':
+        subprocess.run(['taskkill', '/F', '/T', '/PID', str(pid)], capture_output=True,
+                       creationflags=_CREATE_NO_WINDOW)
+        return
+    try:
+        os.killpg(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    deadline = time.monotonic() + grace
+    if proc is not None:
+        try:
+            proc.wait(timeout=grace)
+        except subprocess.TimeoutExpired:
+            pass
+    # Children of the leader may still be running after it has exited
+    while _group_alive(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def current_handle():
+    """The JobHandle active on this thread (see JobHandle.active), or None"""
+    return getattr(_local, 'handle', None)
+
+
+class JobHandle:
+    """
+    Cancellation handle for one job, or for a whole batch (threads may share it).
+
+    Child processes started through popen()/run() are tracked, and so are the
+    ones yt-dlp starts (the merger's ffmpeg) on a thread where the handle is
+    active() once install() has run. Each starts as the leader of its own
+    process group. cancel() signals every tracked group at once, kills what is
+    still running after TERMINATE_GRACE and calls the on_cancel callbacks;
+    it does not wait, see wait_released(). check() raises JobCancelled once
+    the handle is cancelled, for loops and progress hooks.
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self.cancelled_at = None
+        # Set by cancel(discard=True): the job's partial files go too, not only ffmpeg's
+        self.discard = False
+        self._event = threading.Event()
+        self._lock = threading.RLock()
+        self._procs = []
+        self._reapers = []
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise JobCancelled()
+
+    def cancel(self, discard=False):
+        """
+        Stop the job: end its child processes and run the on_cancel callbacks.
+
+        With discard, the job also removes the partial downloads it leaves
+        (otherwise they stay to be resumed). Safe to call more than once.
+        """
+        with self._lock:
+            self.discard = self.discard or discard
+            if self._event.is_set():
+                return
+            self.cancelled_at = time.monotonic()
+            self._event.set()
+            procs, callbacks = list(self._procs), list(self._callbacks)
+        for proc in procs:
+            self._reap(proc.pid, proc)
+        for callback in callbacks:
+            callback()
+
+    def _reap(self, pid, proc=None):
+        # Escalation waits out the grace period on its own thread, so cancel() returns at once
+        thread = threading.Thread(target=kill_tree, args=(pid,), kwargs={'proc': proc}, daemon=True,
+                                  name=f"kill-{pid}")
+        thread.start()
+        with self._lock:
+            self._reapers.append(thread)
+
+    def kill_group(self, pid):
+        """End another process group led by pid (e.g. a pool worker) as part of this cancel"""
+        self._reap(pid)
+
+    def on_cancel(self, callback):
+        """Call callback() when the handle is cancelled (at once if it already is)"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def track(self, proc):
+        """Follow a running child process (started with group_kwargs) until it exits"""
+        with self._lock:
+            self._procs = [p for p in self._procs if p.poll() is None]
+            self._procs.append(proc)
+            cancelled = self._event.is_set()
+        if cancelled:
+            self._reap(proc.pid, proc)
+
+    def popen(self, cmd, **kwargs):
+        """subprocess.Popen in a process group of its own, tracked; raises JobCancelled once cancelled"""
+        self.check()
+        kwargs.update(group_kwargs(kwargs))
+        proc = subprocess.Popen(cmd, **kwargs)
+        self.track(proc)
+        return proc
+
+    def run(self, cmd, capture_output=False, **kwargs):
+        """subprocess.run through popen(); raises JobCancelled instead of returning a killed run"""
+        if capture_output:
+            kwargs.update(stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        proc = self.popen(cmd, **kwargs)
+        with proc:
+            try:
+                stdout, stderr = proc.communicate()
+            except BaseException:
+                kill_tree(proc.pid, proc=proc)
+                raise
+        self.check()
+        return subprocess.CompletedProcess(proc.args, proc.returncode, stdout, stderr)
+
+    def wait_released(self, timeout=None):
+        """Wait until every tracked process has ended; False if some still run after timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                procs, reapers = list(self._procs), list(self._reapers)
+            for thread in reapers:
+                thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            running = [p for p in procs if p.poll() is None]
+            if not running:
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    @contextlib.contextmanager
+    def active(self):
+        """Make this the current thread's handle, for the processes yt-dlp starts (see install)"""
+        previous = current_handle()
+        _local.handle = self
+        try:
+            yield self
+        finally:
+            _local.handle = previous
+
+
+@contextlib.contextmanager
+def cancel_on_interrupt(handle):
+    """
+    Cancel handle on Ctrl+C, then raise KeyboardInterrupt as usual.
+
+    Tracked children lead process groups of their own, so the terminal's
+    interrupt no longer reaches them; this passes it on. Main thread only.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield handle
+        return
+
+    def on_interrupt(signum, frame):
+        handle.cancel()
+        signal.default_int_handler(signum, frame)
+
+    previous = signal.signal(signal.SIGINT, on_interrupt)
+    try:
+        yield handle
+    finally:
+        signal.signal(signal.SIGINT, previous)
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install():
+    """
+    Track the processes yt-dlp starts (postprocessors, external downloaders).
+
+    yt-dlp's modules share one Popen class; it is swapped for a subclass that
+    registers each child with the handle active on the starting thread (and
+    starts it in its own process group). Threads without a handle are unaffected.
+    """
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        from yt_dlp.downloader import external
+        from yt_dlp.postprocessor import ffmpeg
+        from yt_dlp.utils import Popen
+
+        class TrackedPopen(Popen):
+            def __init__(self, args, *remaining, **kwargs):
+                handle = current_handle()
+                if handle is not None:
+                    handle.check()
+                    kwargs.update(group_kwargs(kwargs))
+                super().__init__(args, *remaining, **kwargs)
+                if handle is not None:
+                    handle.track(self)
+
+        ffmpeg.Popen = TrackedPopen
+        external.Popen = TrackedPopen
+        _installed = True
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Chunked Encode
+Transcodes a long video on several ffmpeg processes at once: the source video is
+cut at keyframes (stream copy), the pieces are encoded to H.264 side by side while
+the audio is encoded to AAC, and the results are joined with the concat demuxer
+into one +faststart MP4
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from encode_profile import VIDEO_TRANSCODE_ARGS, AUDIO_TRANSCODE_ARGS, FASTSTART_ARGS, TRANSCODE_ARGS
+from job_metrics import probe_duration
+
+# ffmpeg processes encoding at once; 1 turns chunked encoding off
+DEFAULT_CHUNK_ENCODERS = os.cpu_count() or 1
+# Shorter videos are encoded in one piece: splitting and joining would cost more than it saves
+MIN_CHUNKED_SECONDS = 120
+MIN_CHUNK_SECONDS = 10
+# More chunks than encoders, so the last chunks still find idle cores
+CHUNKS_PER_ENCODER = 3
+
+
+class EncodeError(Exception):
+    """An ffmpeg step of the chunked encode failed"""
+
+
+def chunk_seconds_for(duration, encoders):
+    """Target chunk length for a video, or None when it should be encoded in one piece"""
+    if encoders <= 1 or not duration or duration < MIN_CHUNKED_SECONDS:
+        return None
+    return max(MIN_CHUNK_SECONDS, duration / (encoders * CHUNKS_PER_ENCODER))
+
+
+def _run(cmd, handle=None):
+    # With a cancellation handle, a cancel kills the run and raises JobCancelled
+    run = handle.run if handle is not None else subprocess.run
+    proc = run(cmd, capture_output=True, text=True, errors='replace')
+    if proc.returncode:
+        raise EncodeError(proc.stderr.strip()[-500:] or f"ffmpeg exited with {proc.returncode}")
+
+
+def chunked_transcode(ffmpeg, inputs, output, encoders, chunk_seconds, handle=None):
+    """
+    Encode inputs (the stream dicts of encode_profile.build_ffmpeg_command) into output.
+
+    The pieces are kept in a temporary folder next to output and removed afterwards.
+    The video is cut where its keyframes are, so pieces run a little past
+    chunk_seconds. Returns the number of chunks; raises EncodeError (or
+    JobCancelled when handle, a cancellation.JobHandle, is cancelled).
+    """
+    ffmpeg = ffmpeg or 'ffmpeg'
+    base = [ffmpeg, '-y', '-hide_banner', '-loglevel', 'error']
+    video = next((s for s in inputs if s['video']), None)
+    audio = next((s for s in inputs if s['audio']), None)
+    if video is None:
+        raise EncodeError("no video stream to encode in chunks")
+    # Encoders share the cores instead of each starting a thread per core
+    threads = max(1, (os.cpu_count() or 1) // encoders)
+
+    work = Path(tempfile.mkdtemp(prefix='.chunks-', dir=Path(output).parent))
+    try:
+        _run(base + list(video.get('input_args', ())) + ['-i', video['path'], '-map', '0:v:0', '-c', 'copy',
+             '-f', 'segment', '-segment_time', f'{chunk_seconds:.3f}', '-reset_timestamps', '1',
+             str(work / 'source%05d.mkv')], handle)
+        sources = sorted(work.glob('source*.mkv'))
+
+        jobs = []
+        if audio is not None:
+            jobs.append(base + list(audio.get('input_args', ())) + ['-i', audio['path'], '-map', '0:a:0', '-vn']
+                        + AUDIO_TRANSCODE_ARGS + [str(work / 'audio.m4a')])
+        for source in sources:
+            jobs.append(base + ['-i', str(source), '-map', '0:v:0', '-an'] + VIDEO_TRANSCODE_ARGS
+                        + ['-threads', str(threads), str(source.with_name(source.stem + '.mp4'))])
+        with ThreadPoolExecutor(max_workers=encoders) as pool:
+            # list() waits for every job and raises the first failure
+            list(pool.map(_run, jobs, [handle] * len(jobs)))
+
+        listing = work / 'chunks.txt'
+        listing.write_text(''.join(f"file '{source.stem}.mp4'\n" for source in sources), encoding='utf-8')
+        cmd = base + ['-f', 'concat', '-safe', '0', '-i', str(listing)]
+        if audio is not None:
+            cmd += ['-i', str(work / 'audio.m4a'), '-map', '0:v:0', '-map', '1:a:0']
+        _run(cmd + ['-c', 'copy'] + FASTSTART_ARGS + [str(output)], handle)
+        return len(sources)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def transcode_merged(ffmpeg, path, output, encoders, has_audio=True, duration=None, handle=None):
+    """
+    Transcode a stream-copied merge (see ydl_session): in chunks when the video is
+    long enough, else in one ffmpeg run. Returns the chunk count (0: one piece).
+    """
+    ffmpeg = ffmpeg or 'ffmpeg'
+    chunk_seconds = chunk_seconds_for(duration or probe_duration(path, ffmpeg), encoders)
+    if chunk_seconds is None:
+        _run([ffmpeg, '-y', '-hide_banner', '-loglevel', 'error', '-i', path] + TRANSCODE_ARGS + [str(output)],
+             handle)
+        return 0
+    inputs = [{'path': path, 'video': True, 'audio': has_audio}]
+    return chunked_transcode(ffmpeg, inputs, output, encoders, chunk_seconds, handle)
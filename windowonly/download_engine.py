@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Download Engine
+Bounded-concurrency batch runner with a per-host connection cap
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+# Defaults used by the GUI and CLI batch modes
+DEFAULT_WORKERS = 3
+MAX_WORKERS = 16
+# Items pulled from the batch source ahead of the workers (a lazily listed playlist
+# is only read this far ahead, however long it is)
+DEFAULT_MAX_PENDING = 32
+# Connections per stream (see segmented_download); kept here so front ends can
+# build their options without importing yt-dlp
+DEFAULT_SEGMENTS = 4
+MAX_SEGMENTS = 16
+# Ceiling of the adaptive window of parallel fragment fetches per DASH/HLS stream,
+# and of the fetches to one host across all streams (see adaptive_fragments)
+DEFAULT_FRAGMENTS = 8
+MAX_FRAGMENTS = 32
+DEFAULT_HOST_FRAGMENTS = 16
+
+
+def host_of(url):
+    """Return the host part of a URL (used as the per-host limiter key)"""
+    host = urlparse(url).hostname or ''
+    # Treat www.youtube.com / m.youtube.com / youtube.com as the same host
+    for prefix in ('www.', 'm.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return host
+
+
+class DownloadEngine:
+    """
+    Run a batch of download jobs with at most `workers` running at once
+    and at most `max_per_host` of them talking to the same host (by default
+    as many as workers: a batch is usually all on one host, and the workers
+    setting is what the front ends offer to limit it).
+
+    The job callable receives (index, url) and returns True on success.
+    A job may raise Exception("STOP_REQUESTED") to abort the whole batch.
+    The URLs may come from a lazy iterable (see playlist_stream): a feeder
+    thread reads it while the jobs run, keeping at most max_pending waiting.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_per_host=None, should_stop=None,
+                 max_pending=DEFAULT_MAX_PENDING):
+        self.workers = max(1, min(int(workers), MAX_WORKERS))
+        self.max_per_host = max(1, int(max_per_host or self.workers))
+        self.max_pending = max(1, int(max_pending))
+        self.should_stop = should_stop or (lambda: False)
+
+        self._cond = threading.Condition()
+        self._host_active = {}
+        self._running = 0
+        self._stopped = False
+        self._fed = False
+        self._feed_error = None
+
+    def _stop_requested(self):
+        return self._stopped or self.should_stop()
+
+    def _next_ready(self, pending):
+        """Pop the first pending item whose host still has a free slot"""
+        for _ in range(len(pending)):
+            index, url = pending[0]
+            if self._host_active.get(host_of(url), 0) < self.max_per_host:
+                return pending.popleft()
+            pending.rotate(-1)
+        return None
+
+    def _run_one(self, job, index, url, on_result):
+        success = False
+        error = None
+        try:
+            success = bool(job(index, url))
+        except Exception as e:
+            if str(e) == "STOP_REQUESTED":
+                self._stopped = True
+            else:
+                error = e
+        finally:
+            host = host_of(url)
+            with self._cond:
+                self._host_active[host] -= 1
+                self._running -= 1
+                self._cond.notify_all()
+
+        if on_result:
+            on_result(index, url, success, error)
+        return success
+
+    def _feed(self, urls, pending, start):
+        """Move items from urls into pending (feeder thread); the source is read outside the lock"""
+        try:
+            for item in enumerate(urls, start):
+                with self._cond:
+                    while len(pending) >= self.max_pending and not self._stop_requested():
+                        self._cond.wait(timeout=0.5)
+                    if self._stop_requested():
+                        return
+                    pending.append(item)
+                    self._cond.notify_all()
+        except Exception as e:
+            self._feed_error = e
+        finally:
+            with self._cond:
+                self._fed = True
+                self._cond.notify_all()
+
+    def run(self, urls, job, on_result=None, start=1):
+        """
+        Run job(index, url) for every URL (index is 1-based by default).
+
+        Returns a dict mapping index -> True/False. Items that never started
+        because a stop was requested are not included. An error raised by the
+        urls iterable is raised once the jobs already started have finished.
+        """
+        pending = deque()
+        results = {}
+        failures = []
+        self._fed = False
+        self._feed_error = None
+
+        def collect(index, future):
+            # Futures are not kept, so a long batch holds one result per item and nothing more
+            try:
+                results[index] = future.result()
+            except BaseException as e:
+                failures.append(e)
+
+        feeder = threading.Thread(target=self._feed, args=(urls, pending, start), daemon=True,
+                                  name='download-feed')
+        feeder.start()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='download') as pool:
+            with self._cond:
+                while not self._stop_requested():
+                    item = None
+                    if self._running < self.workers:
+                        item = self._next_ready(pending)
+
+                    if item is None:
+                        if self._fed and not pending:
+                            break
+                        # Wait for a slot (either global or per-host) or for the next item
+                        self._cond.wait(timeout=0.5)
+                        continue
+
+                    index, url = item
+                    host = host_of(url)
+                    self._host_active[host] = self._host_active.get(host, 0) + 1
+                    self._running += 1
+                    # Room in pending for the feeder
+                    self._cond.notify_all()
+                    future = pool.submit(self._run_one, job, index, url, on_result)
+                    future.add_done_callback(lambda f, index=index: collect(index, f))
+
+        feeder.join()
+        if failures:
+            raise failures[0]
+        if self._feed_error is not None:
+            raise self._feed_error
+        return results
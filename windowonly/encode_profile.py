@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Encode Profile
+Decides per job whether the merged output can be stream-copied (remux) or needs
+an H.264/AAC re-encode for iPhone compatibility
+"""
+
+import threading
+
+# Full re-encode (the original behavior for every download); the video and audio
+# halves are also used on their own by the chunked encode (see chunked_encode)
+VIDEO_TRANSCODE_ARGS = ['-c:v', 'libx264', '-preset', 'fast', '-crf', '23']
+AUDIO_TRANSCODE_ARGS = ['-c:a', 'aac', '-b:a', '192k']
+FASTSTART_ARGS = ['-movflags', '+faststart']
+TRANSCODE_ARGS = VIDEO_TRANSCODE_ARGS + AUDIO_TRANSCODE_ARGS + FASTSTART_ARGS
+
+# Stream copy for merging before a chunked encode (the merged file is the encode's source)
+COPY_ARGS = ['-c', 'copy']
+
+# Source is already H.264 + AAC: copy the streams, only move the moov atom
+REMUX_ARGS = COPY_ARGS + FASTSTART_ARGS
+
+# "Audio Only (MP3)" preset
+MP3_ARGS = ['-vn', '-c:a', 'libmp3lame', '-b:a', '192k']
+
+# Fragmented MP4 for pipes: an empty moov up front, then self-contained fragments
+# of about a second, so output can be sent while it is produced (no seekable file needed)
+STREAM_MP4_ARGS = ['-movflags', 'frag_keyframe+empty_moov+default_base_moof',
+                   '-frag_duration', '1000000', '-f', 'mp4']
+
+# Codec prefixes as reported by yt-dlp in 'vcodec' / 'acodec'
+IPHONE_VIDEO_CODECS = ('avc1', 'avc3', 'h264')
+IPHONE_AUDIO_CODECS = ('mp4a', 'aac')
+
+# Encode paths recorded per job
+PATH_REMUX = 'remux'
+PATH_TRANSCODE = 'transcode'
+PATH_NONE = 'none'  # single progressive file, no merger runs
+PATH_AUDIO = 'audio'  # MP3 extraction
+PATH_CACHED = 'cached'  # served from the local media cache, nothing downloaded or encoded
+PATH_RENDITIONS = 'renditions'  # several outputs from one decode (see renditions)
+
+
+def _codec(value):
+    """Normalize a yt-dlp codec string ('avc1.64001F' -> 'avc1', 'none' -> None)"""
+    if not value or value == 'none':
+        return None
+    return value.split('.')[0].lower()
+
+
+def stream_codecs(info):
+    """Return (vcodec, acodec) of the formats yt-dlp selected for this video"""
+    vcodec = acodec = None
+    for fmt in info.get('requested_formats') or [info]:
+        vcodec = vcodec or _codec(fmt.get('vcodec'))
+        acodec = acodec or _codec(fmt.get('acodec'))
+    return vcodec, acodec
+
+
+def is_iphone_compatible(info):
+    """True when the selected streams are already H.264 video + AAC audio"""
+    vcodec, acodec = stream_codecs(info)
+    if vcodec is None or not vcodec.startswith(IPHONE_VIDEO_CODECS):
+        return False
+    # Video-only sources are fine, there is simply no audio track to copy
+    return acodec is None or acodec.startswith(IPHONE_AUDIO_CODECS)
+
+
+def choose_merger_args(info):
+    """
+    Pick the ffmpeg merger arguments for an extracted (processed) info dict.
+
+    Returns (path, args) where path is one of PATH_REMUX / PATH_TRANSCODE / PATH_NONE.
+    """
+    if info.get('_type', 'video') != 'video':
+        # Playlists mix sources; keep the safe re-encode for every entry
+        return PATH_TRANSCODE, TRANSCODE_ARGS
+    if not info.get('requested_formats'):
+        return PATH_NONE, TRANSCODE_ARGS
+    if is_iphone_compatible(info):
+        return PATH_REMUX, REMUX_ARGS
+    return PATH_TRANSCODE, TRANSCODE_ARGS
+
+
+class EncodeStats:
+    """Thread-safe counters of the encode path taken per job"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {PATH_REMUX: 0, PATH_TRANSCODE: 0, PATH_NONE: 0, PATH_AUDIO: 0, PATH_CACHED: 0,
+                       PATH_RENDITIONS: 0}
+
+    def record(self, path):
+        with self._lock:
+            self.counts[path] = self.counts.get(path, 0) + 1
+
+    @property
+    def hit_rate(self):
+        """Share of merged jobs that took the remux fast path"""
+        merged = self.counts[PATH_REMUX] + self.counts[PATH_TRANSCODE]
+        return self.counts[PATH_REMUX] / merged if merged else 0.0
+
+    def summary(self):
+        renditions = f", renditions {self.counts[PATH_RENDITIONS]}" if self.counts[PATH_RENDITIONS] else ""
+        return (f"remux {self.counts[PATH_REMUX]}, transcode {self.counts[PATH_TRANSCODE]}, "
+                f"no merge {self.counts[PATH_NONE]}, cached {self.counts[PATH_CACHED]}{renditions} "
+                f"(remux hit rate {self.hit_rate:.0%})")
+
+
+ENCODE_STATS = EncodeStats()
+
+
+def apply_merger_args(ydl, info):
+    """
+    Pick the merger arguments from the selected codecs of an extracted info dict.
+
+    The merger reads 'postprocessor_args' from ydl.params when it runs, so the
+    choice is applied on the live instance before process_ie_result. Returns the path.
+    """
+    path, args = choose_merger_args(info)
+    ydl.params['postprocessor_args'] = dict(ydl.params.get('postprocessor_args') or {}, merger=args)
+    return path
+
+
+def build_ffmpeg_command(ffmpeg, inputs, output, args):
+    """
+    ffmpeg command that muxes/encodes the downloaded streams into one output
+    (a stream's optional 'input_args' go before its -i, e.g. HTTP headers for a URL input)
+    """
+    cmd = [ffmpeg, '-y', '-hide_banner', '-loglevel', 'error']
+    for stream in inputs:
+        cmd += list(stream.get('input_args', ())) + ['-i', stream['path']]
+
+    # First video track and first audio track, wherever they are
+    video = next((i for i, s in enumerate(inputs) if s['video']), None)
+    audio = next((i for i, s in enumerate(inputs) if s['audio']), None)
+    if video is not None and '-vn' not in args:
+        cmd += ['-map', f'{video}:v:0']
+    if audio is not None:
+        cmd += ['-map', f'{audio}:a:0']
+
+    return cmd + list(args) + [output]
+
+
+def choose_encode_args(info, audio_only=False):
+    """
+    Pick (path, args, ext) for an explicit ffmpeg run over already downloaded streams.
+
+    Unlike choose_merger_args, a single progressive file is still re-muxed or
+    transcoded here, because the staged pipeline always writes the final file itself.
+    """
+    if audio_only:
+        return PATH_AUDIO, MP3_ARGS, 'mp3'
+    if is_iphone_compatible(info):
+        return PATH_REMUX, REMUX_ARGS, 'mp4'
+    return PATH_TRANSCODE, TRANSCODE_ARGS, 'mp4'
+
+
+def streaming_args(args):
+    """Encode args for a pipe: +faststart (which rewrites a finished file) becomes fragmented MP4"""
+    args = list(args)
+    if '-movflags' in args:
+        index = args.index('-movflags')
+        del args[index:index + 2]
+    return args + STREAM_MP4_ARGS
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - File Serving
+Finished outputs of the job server kept in a retention store (TTL after the
+last read, bounded total size) instead of being deleted after the first
+response, served with Range/If-Range support so interrupted transfers resume,
+and sent with sendfile (no copies through Python) where the WSGI server allows
+"""
+
+import functools
+import mimetypes
+import os
+import threading
+import time
+import unicodedata
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import quote
+
+# Seconds an output stays after it was finished or last read
+DEFAULT_RETENTION_TTL = 60 * 60
+DEFAULT_RETENTION_BYTES = 5 * 1024 ** 3  # 5 GiB
+# Seconds between sweeps for expired outputs
+SWEEP_INTERVAL = 60
+# Read size when the server has no zero-copy file wrapper
+SERVE_BLOCK_SIZE = 1024 * 1024
+
+
+class ServedFile:
+    """
+    One retained file opened for one response, limited to a byte span.
+
+    Reads stop at the end of the span, so a WSGI file wrapper that reads to
+    EOF sends the range only. Closing it ends the file's lease in the store.
+    """
+
+    mode = 'rb'
+
+    def __init__(self, store, name, fileobj):
+        self.name = name
+        self._store = store
+        self._file = fileobj
+        stat = os.fstat(fileobj.fileno())
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        self.end = self.size
+        self._closed = False
+
+    def span(self, start, end):
+        """Limit reads to bytes [start, end)"""
+        self._file.seek(start)
+        self.end = end
+
+    @property
+    def remaining(self):
+        return max(0, self.end - self._file.tell())
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def tell(self):
+        return self._file.tell()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def read(self, size=-1):
+        remaining = self.remaining
+        size = remaining if size is None or size < 0 else min(size, remaining)
+        return self._file.read(size) if size else b''
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._file.close()
+        self._store.release(self.name)
+
+
+class RetentionStore:
+    """
+    Finished outputs in one directory, kept for ttl seconds after they were
+    added or last read, within max_bytes in total.
+
+    Files being served (open ServedFiles) are never removed. Over max_bytes
+    the least recently used files go first, except the newest one, so a
+    single output larger than the bound can still be fetched until it expires.
+    Files already in the directory when the store is created are adopted with
+    their mtime as last use, so outputs of an earlier run expire as well.
+    """
+
+    def __init__(self, directory, ttl=DEFAULT_RETENTION_TTL, max_bytes=DEFAULT_RETENTION_BYTES):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.served = 0
+        self.evicted = 0
+
+        self._lock = threading.Lock()
+        # name -> [size, last use]
+        self._files = {}
+        self._leases = {}
+        self._newest = None
+        self._sweeper = None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for path in self.directory.iterdir():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if path.is_file():
+                self._files[path.name] = [stat.st_size, stat.st_mtime]
+
+    def add(self, path):
+        """Keep a finished output of this directory, then sweep"""
+        path = Path(path)
+        try:
+            size = path.stat().st_size
+        except OSError:
+            return
+        with self._lock:
+            self._files[path.name] = [size, time.time()]
+            self._newest = path.name
+            self._sweep()
+
+    def open(self, name):
+        """ServedFile for a retained file (leased until closed), or None"""
+        if not name or os.path.basename(name) != name:
+            return None
+        with self._lock:
+            if name not in self._files:
+                return None
+            try:
+                fileobj = open(self.directory / name, 'rb')
+            except OSError:
+                self._files.pop(name, None)
+                return None
+            self._leases[name] = self._leases.get(name, 0) + 1
+            self._files[name][1] = time.time()
+            self.served += 1
+        try:
+            return ServedFile(self, name, fileobj)
+        except OSError:
+            fileobj.close()
+            self.release(name)
+            return None
+
+    def release(self, name):
+        with self._lock:
+            leases = self._leases.get(name, 0) - 1
+            if leases > 0:
+                self._leases[name] = leases
+            else:
+                self._leases.pop(name, None)
+            # The TTL runs from the end of the last transfer
+            if name in self._files:
+                self._files[name][1] = time.time()
+
+    def sweep(self):
+        """Remove expired files and evict down to max_bytes; returns the names removed"""
+        with self._lock:
+            return self._sweep()
+
+    def _sweep(self):
+        now = time.time()
+        removed = []
+        for name, (_, used) in list(self._files.items()):
+            if name not in self._leases and now - used >= self.ttl:
+                removed += self._remove(name)
+
+        total = sum(size for size, _ in self._files.values())
+        if total > self.max_bytes:
+            for used, name in sorted((used, name) for name, (_, used) in self._files.items()):
+                if total <= self.max_bytes:
+                    break
+                if name in self._leases or name == self._newest:
+                    continue
+                total -= self._files[name][0]
+                removed += self._remove(name)
+        return removed
+
+    def _remove(self, name):
+        try:
+            os.remove(self.directory / name)
+        except FileNotFoundError:
+            self._files.pop(name, None)
+            return []
+        except OSError:
+            # In use elsewhere (Windows); tried again on the next sweep
+            return []
+        self._files.pop(name, None)
+        self.evicted += 1
+        return [name]
+
+    def start(self, interval=SWEEP_INTERVAL):
+        """Sweep every interval seconds on a daemon thread"""
+        def sweeper():
+            while True:
+                time.sleep(interval)
+                self.sweep()
+
+        if self._sweeper is None:
+            self._sweeper = threading.Thread(target=sweeper, name='retention-sweeper', daemon=True)
+            self._sweeper.start()
+
+    def usage(self):
+        """(files, bytes) currently retained"""
+        with self._lock:
+            return len(self._files), sum(size for size, _ in self._files.values())
+
+    def summary(self):
+        files, total = self.usage()
+        return f"retained {files} files ({total / 1024 ** 2:.1f} MB), served {self.served}, evicted {self.evicted}"
+
+
+def content_disposition(name):
+    """attachment header value for name (RFC 6266 filename* when it is not ASCII)"""
+    simple = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+    simple = simple.replace('\\', '_').replace('"', '_')
+    if simple == name:
+        return f'attachment; filename="{name}"'
+    return f"attachment; filename=\"{simple}\"; filename*=UTF-8''{quote(name, safe='')}"
+
+
+def _if_range_matches(if_range, served):
+    """False when If-Range names another version of the file (the range is then ignored)"""
+    if if_range.etag:
+        return if_range.etag == served.etag
+    if if_range.date:
+        return int(if_range.date.timestamp()) == int(served.mtime)
+    return True
+
+
+def serve_file(store, name, request):
+    """
+    Flask response for GET/HEAD /file/<name> from store.
+
+    Handles If-None-Match/If-Modified-Since (304), a single byte range (206;
+    416 when it is outside the file) unless If-Range names another version,
+    and hands the open file to the server's wsgi.file_wrapper, which sends
+    it with sendfile on servers that support it (see SendfileWrapper).
+    """
+    from flask import abort
+
+    served = store.open(name)
+    if served is None:
+        abort(404, 'File not found')
+    try:
+        return _file_response(served, request)
+    except Exception:
+        served.close()
+        raise
+
+
+def _file_response(served, request):
+    from flask import Response
+    from werkzeug.http import http_date, is_resource_modified, quote_etag
+    from werkzeug.wsgi import wrap_file
+
+    headers = {'Accept-Ranges': 'bytes', 'ETag': quote_etag(served.etag), 'Last-Modified': http_date(served.mtime)}
+    modified = datetime.fromtimestamp(served.mtime, timezone.utc)
+    if not is_resource_modified(request.environ, served.etag, last_modified=modified):
+        served.close()
+        return Response(status=304, headers=headers)
+
+    headers.update({
+        'Content-Type': mimetypes.guess_type(served.name)[0] or 'application/octet-stream',
+        'Content-Disposition': content_disposition(served.name),
+    })
+    status, start, end = 200, 0, served.size
+    byte_range = request.range
+    # Several ranges in one request are answered with the whole file
+    if (byte_range is not None and byte_range.units == 'bytes' and len(byte_range.ranges) == 1
+            and _if_range_matches(request.if_range, served)):
+        span = byte_range.range_for_length(served.size)
+        if span is None:
+            served.close()
+            return Response(status=416, headers={**headers, 'Content-Range': f'bytes */{served.size}'})
+        status, (start, end) = 206, span
+        headers['Content-Range'] = f'bytes {start}-{end - 1}/{served.size}'
+    headers['Content-Length'] = str(end - start)
+
+    if request.method == 'HEAD':
+        served.close()
+        return Response(status=status, headers=headers)
+    served.span(start, end)
+    # The wrapper closes the file (ending the lease) when the response ends, also on disconnects
+    body = wrap_file(request.environ, served, SERVE_BLOCK_SIZE)
+    return Response(body, status=status, headers=headers, direct_passthrough=True)
+
+
+class SendfileWrapper:
+    """
+    wsgi.file_wrapper that sends a ServedFile's span straight from the page
+    cache to the client socket (socket.sendfile: os.sendfile where the
+    platform has it, plain sends otherwise, e.g. on TLS sockets); other
+    files are read in blocks like werkzeug's FileWrapper
+    """
+
+    def __init__(self, sock, filelike, block_size=SERVE_BLOCK_SIZE):
+        self.sock = sock
+        self.filelike = filelike
+        self.block_size = block_size
+
+    def __iter__(self):
+        if not isinstance(self.filelike, ServedFile):
+            # Other files (send_file, static files) may be cut to a range by the caller's iterator
+            yield from iter(functools.partial(self.filelike.read, self.block_size), b'')
+            return
+        # An empty chunk makes the server write the status line and headers first
+        yield b''
+        if self.filelike.remaining:
+            self.sock.sendfile(self.filelike, self.filelike.tell(), self.filelike.remaining)
+
+    def close(self):
+        self.filelike.close()
+
+
+def sendfile_request_handler():
+    """
+    werkzeug request handler class whose requests carry a SendfileWrapper as
+    wsgi.file_wrapper; pass it as request_handler to app.run or make_server
+    """
+    from werkzeug.serving import WSGIRequestHandler
+
+    class SendfileRequestHandler(WSGIRequestHandler):
+        def make_environ(self):
+            environ = super().make_environ()
+            environ['wsgi.file_wrapper'] = functools.partial(SendfileWrapper, self.connection)
+            return environ
+
+    return SendfileRequestHandler
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Growing File Feed
+Serves stream files that are still being downloaded to ffmpeg over loopback HTTP,
+so the encode reads the bytes that have arrived while the rest is still coming
+(several inputs at once, which plain pipes cannot do portably)
+"""
+
+import os
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHUNK_SIZE = 256 * 1024
+POLL_INTERVAL = 0.05
+# Containers ffmpeg can demux front to back without seeking
+SEQUENTIAL_EXTS = ('webm', 'mkv', 'mka', 'weba', 'ts')
+# MP4 family: only readable while growing when the moov box comes before the media data
+MP4_EXTS = ('mp4', 'm4a', 'm4v', 'mov')
+
+
+class FeedFailed(Exception):
+    """The download behind a feed failed or was cancelled"""
+
+
+class GrowingFile:
+    """
+    A file that a yt-dlp downloader is writing, read from the start as it grows.
+
+    Data is read from the downloader's .part file and, once it is renamed, from
+    the final path; files are reopened per read so the rename also works on
+    Windows. Downloaders that write out of order (segmented_download) report the
+    readable prefix as 'contiguous_bytes' in their progress hooks, see progress().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.failed = False
+        self._done = threading.Event()
+        # Readable bytes for out-of-order writers; None means the whole current file
+        self._limit = 0 if os.path.exists(f"{path}.part.segments") else None
+
+    def progress(self, d):
+        """Feed a yt-dlp progress hook dict for this file"""
+        if 'contiguous_bytes' in d:
+            self._limit = d['contiguous_bytes']
+
+    def finish(self, failed=False):
+        """The download ended (renamed to path on success)"""
+        self.failed = failed
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """Wait for the download to end (at most timeout seconds); True once it has"""
+        if not self._done.wait(timeout):
+            return False
+        if self.failed:
+            raise FeedFailed(self.path)
+        return True
+
+    def _read(self, offset, size):
+        limit = None if self._done.is_set() else self._limit
+        if limit is not None:
+            size = min(size, limit - offset)
+            if size <= 0:
+                return b''
+        for candidate in (f"{self.path}.part", self.path):
+            try:
+                with open(candidate, 'rb') as f:
+                    f.seek(offset)
+                    return f.read(size)
+            except FileNotFoundError:
+                continue
+        return b''
+
+    def read_at(self, offset, size):
+        """Up to size bytes at offset, waiting for them; b'' at the end of the finished file"""
+        while True:
+            # Checked before reading: once finished, an empty read really is the end
+            done = self._done.is_set()
+            data = self._read(offset, size)
+            if data or done:
+                if done and self.failed:
+                    raise FeedFailed(self.path)
+                return data
+            time.sleep(POLL_INTERVAL)
+
+    def chunks(self, chunk_size=CHUNK_SIZE):
+        offset = 0
+        while True:
+            data = self.read_at(offset, chunk_size)
+            if not data:
+                return
+            offset += len(data)
+            yield data
+
+    def _read_exact(self, offset, size):
+        data = b''
+        while len(data) < size:
+            more = self.read_at(offset + len(data), size - len(data))
+            if not more:
+                break
+            data += more
+        return data
+
+    def sequential(self):
+        """
+        True when ffmpeg can read this file while it grows; waits for the first
+        bytes of MP4-family files, whose moov box must come before mdat.
+        """
+        ext = os.path.splitext(self.path)[1][1:].lower()
+        if ext in SEQUENTIAL_EXTS:
+            return True
+        if ext not in MP4_EXTS:
+            return False
+        offset = 0
+        while True:
+            header = self._read_exact(offset, 16)
+            if len(header) < 8:
+                return False
+            size, kind = int.from_bytes(header[:4], 'big'), header[4:8]
+            if size == 1 and len(header) == 16:
+                size = int.from_bytes(header[8:16], 'big')
+            if kind == b'moov':
+                return True
+            if kind == b'mdat' or size < 8:
+                return False
+            offset += size
+
+
+class FeedServer:
+    """Loopback HTTP server for GrowingFile feeds (one GET reads a feed from the start)"""
+
+    def __init__(self):
+        self._feeds = {}
+        feeds = self._feeds
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                feed = feeds.get(self.path.lstrip('/'))
+                if feed is None:
+                    self.send_error(404)
+                    return
+                # No length and no ranges: ffmpeg reads it as a non-seekable stream up to the close
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.end_headers()
+                try:
+                    for chunk in feed.chunks():
+                        self.wfile.write(chunk)
+                except (FeedFailed, ConnectionError):
+                    pass  # a truncated input; the caller sees the failed download
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def url_for(self, feed):
+        token = secrets.token_hex(8)
+        self._feeds[token] = feed
+        return f"http://127.0.0.1:{self._server.server_port}/{token}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
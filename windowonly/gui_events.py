@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - GUI Event Helpers
+Coalesced progress updates and a line-capped log view, so long batches
+cannot flood the Tk main loop or grow the log without limit
+"""
+
+import threading
+import time
+
+# At most this many progress refreshes per second reach the widgets
+PROGRESS_UPDATES_PER_SECOND = 4
+# Lines kept in the log widget (older lines are dropped)
+LOG_MAX_LINES = 1000
+# Queue messages handled per check_queue tick; the rest wait for the next tick
+MAX_MESSAGES_PER_TICK = 500
+
+
+class ProgressCoalescer:
+    """
+    Latest-value-wins store for per-job progress.
+
+    Download threads call update() for every yt-dlp progress callback; the
+    UI thread calls drain() on its timer and gets at most one snapshot per
+    interval, however many callbacks arrived in between.
+    """
+
+    def __init__(self, updates_per_second=PROGRESS_UPDATES_PER_SECOND, clock=time.monotonic):
+        self.interval = 1.0 / updates_per_second
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._dirty = False
+        self._last_flush = 0.0
+        self.received = 0
+
+    def update(self, job, downloaded, total, speed=None, eta=None):
+        with self._lock:
+            self._jobs[job] = {
+                'fraction': min(downloaded / total, 1.0) if total else 0.0,
+                'downloaded': downloaded,
+                'total': total,
+                'speed': speed,
+                'eta': eta,
+            }
+            self._dirty = True
+            self.received += 1
+
+    def finish(self, job):
+        """Mark a job complete (it then counts as 100% in overall())"""
+        with self._lock:
+            self._jobs[job] = {'fraction': 1.0, 'downloaded': 0, 'total': 0, 'speed': None, 'eta': None}
+            self._dirty = True
+
+    def reset(self):
+        with self._lock:
+            self._jobs.clear()
+            self._dirty = True
+
+    def drain(self):
+        """Snapshot {job: progress} if something changed and the interval has passed, else None"""
+        now = self.clock()
+        with self._lock:
+            if not self._dirty or now - self._last_flush < self.interval:
+                return None
+            self._dirty = False
+            self._last_flush = now
+            return {job: dict(p) for job, p in self._jobs.items()}
+
+    @staticmethod
+    def overall(snapshot, total_jobs):
+        """Batch completion in percent: each job contributes its own fraction"""
+        if not total_jobs:
+            return 0.0
+        return sum(p['fraction'] for p in snapshot.values()) / total_jobs * 100
+
+    @staticmethod
+    def describe(snapshot):
+        """'Speed: ... | ETA: ...' for the jobs still downloading (speeds add up, the longest ETA wins), or None"""
+        active = [p for p in snapshot.values() if p['total'] and p['fraction'] < 1.0]
+        if not active:
+            return None
+        speed = sum(p['speed'] or 0 for p in active)
+        etas = [p['eta'] for p in active if p['eta'] is not None]
+        speed_str = f"{speed / 1024 / 1024:.2f} MB/s" if speed else "N/A"
+        eta_str = f"{max(etas):.0f}s" if etas else "N/A"
+        jobs = f"{len(active)} downloading | " if len(active) > 1 else ""
+        return f"{jobs}Speed: {speed_str} | ETA: {eta_str}"
+
+
+class BoundedLog:
+    """
+    Append-only view over a Tk Text widget that never holds more than max_lines.
+
+    Lines from one tick are inserted with a single widget call, and only the
+    last max_lines of a burst are inserted at all.
+    """
+
+    def __init__(self, widget, max_lines=LOG_MAX_LINES):
+        self.widget = widget
+        self.max_lines = max_lines
+        self.lines = 0
+
+    def append(self, lines):
+        if not lines:
+            return
+        lines = [line for text in lines for line in str(text).split('\n')][-self.max_lines:]
+
+        self.widget.config(state='normal')
+        self.widget.insert('end', '\n'.join(lines) + '\n')
+        self.lines += len(lines)
+        excess = self.lines - self.max_lines
+        if excess > 0:
+            self.widget.delete('1.0', f'{excess + 1}.0')
+            self.lines -= excess
+        self.widget.see('end')
+        self.widget.config(state='disabled')
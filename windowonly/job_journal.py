@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Job Journal
+Write-ahead record of every batch item in the output directory, so an
+interrupted batch skips finished items and resumes partial ones on the next run
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from metadata_cache import normalize_url
+from section_clip import format_section
+
+JOURNAL_NAME = '.ydownloader-journal.sqlite3'
+
+STATE_QUEUED = 'queued'
+STATE_DOWNLOADING = 'downloading'
+STATE_ENCODING = 'encoding'
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+
+# Byte offsets are written at most this often per item
+PROGRESS_INTERVAL = 1.0
+
+_COLUMNS = ('url_key, outtmpl, profile, url, state, output, part_file, downloaded_bytes, total_bytes, '
+            'attempts, error, updated_at')
+
+
+def job_profile(fmt=None, renditions=None, section=None):
+    """
+    What an item asks for, as journaled next to its URL and output template: the
+    yt-dlp format, the renditions and the section. Requests for the same URL and
+    file name that differ in any of them are separate jobs.
+    """
+    parts = []
+    if fmt:
+        parts.append(f"format={fmt}")
+    if renditions:
+        parts.append(f"renditions={','.join(sorted(renditions))}")
+    if section is not None:
+        parts.append(f"section={format_section(section)}")
+    return ';'.join(parts)
+
+
+class JobJournal:
+    """
+    One row per (URL, output template, profile) in <output dir>/.ydownloader-journal.sqlite3
+    (profile: see job_profile).
+
+    Every state change is committed before the work it describes continues
+    (WAL mode), so a killed process leaves an accurate record behind. Partial
+    downloads keep their .part file; yt-dlp continues it from the recorded offset.
+    """
+
+    def __init__(self, directory):
+        self.path = Path(directory) / JOURNAL_NAME
+        self._lock = threading.Lock()
+        self._last_progress = {}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10)
+        with self._db:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            columns = [row[1] for row in self._db.execute('PRAGMA table_info(jobs)')]
+            if columns and 'profile' not in columns:
+                # Journals keyed on URL and template alone: their rows keep an empty
+                # profile, which no request has, so those items run once more
+                self._db.execute('ALTER TABLE jobs RENAME TO jobs_unprofiled')
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    url_key TEXT NOT NULL,
+                    outtmpl TEXT NOT NULL,
+                    profile TEXT NOT NULL DEFAULT '',
+                    url TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    output TEXT,
+                    part_file TEXT,
+                    downloaded_bytes INTEGER DEFAULT 0,
+                    total_bytes INTEGER,
+                    attempts INTEGER DEFAULT 0,
+                    error TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (url_key, outtmpl, profile)
+                )''')
+            if columns and 'profile' not in columns:
+                legacy = _COLUMNS.replace('profile', "''")
+                self._db.execute(f'INSERT INTO jobs ({_COLUMNS}) SELECT {legacy} FROM jobs_unprofiled')
+                self._db.execute('DROP TABLE jobs_unprofiled')
+
+    def enqueue(self, items, profile=''):
+        """Record (url, outtmpl) pairs as queued; items already in the journal keep their state"""
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT OR IGNORE INTO jobs (url_key, outtmpl, profile, url, state, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(normalize_url(url), outtmpl, profile, url, STATE_QUEUED, now) for url, outtmpl in items])
+
+    def get(self, url, outtmpl, profile=''):
+        """Journal row for an item as a dict, or None"""
+        with self._lock:
+            cursor = self._db.execute('SELECT * FROM jobs WHERE url_key = ? AND outtmpl = ? AND profile = ?',
+                                      (normalize_url(url), outtmpl, profile))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([c[0] for c in cursor.description], row))
+
+    def finished(self, url, outtmpl, profile=''):
+        """Output path of an item finished in an earlier run, or None if it still has to run"""
+        row = self.get(url, outtmpl, profile)
+        if row is None or row['state'] != STATE_DONE:
+            return None
+        if not row['output'] or not Path(row['output']).exists():
+            # Finished once, but the file has since been moved or deleted
+            self.mark(url, outtmpl, STATE_QUEUED, profile=profile)
+            return None
+        return row['output']
+
+    def mark(self, url, outtmpl, state, output=None, error=None, profile=''):
+        """Move an item to state (starting a download also counts an attempt)"""
+        attempt = 1 if state == STATE_DOWNLOADING else 0
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT INTO jobs (url_key, outtmpl, profile, url, state, output, error, attempts, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (url_key, outtmpl, profile) DO UPDATE SET state = excluded.state, '
+                'output = COALESCE(excluded.output, output), error = excluded.error, '
+                'attempts = attempts + excluded.attempts, updated_at = excluded.updated_at',
+                (normalize_url(url), outtmpl, profile, url, state, output, error, attempt, time.time()))
+
+    def progress(self, url, outtmpl, d, profile=''):
+        """Record the byte offset from a yt-dlp progress hook dict (throttled)"""
+        key = (url, outtmpl, profile)
+        now = time.monotonic()
+        if d['status'] == 'downloading' and now - self._last_progress.get(key, 0) < PROGRESS_INTERVAL:
+            return
+        self._last_progress[key] = now
+        with self._lock, self._db:
+            self._db.execute(
+                'UPDATE jobs SET part_file = ?, downloaded_bytes = ?, total_bytes = ?, updated_at = ? '
+                'WHERE url_key = ? AND outtmpl = ? AND profile = ?',
+                (d.get('tmpfilename') or d.get('filename'), d.get('downloaded_bytes') or 0,
+                 d.get('total_bytes') or d.get('total_bytes_estimate'), time.time(),
+                 normalize_url(url), outtmpl, profile))
+
+    def counts(self):
+        """Number of items per state"""
+        with self._lock:
+            return dict(self._db.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+
+    def summary(self):
+        counts = self.counts()
+        return ", ".join(f"{state} {counts.get(state, 0)}" for state in
+                         (STATE_DONE, STATE_FAILED, STATE_QUEUED, STATE_DOWNLOADING, STATE_ENCODING))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Job Metrics
+Per-job phase timeline (extract, video, audio, encode) with bytes, speed and
+encode real-time factor, written as JSON lines or aggregated for Prometheus
+"""
+
+import json
+import re
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+METRICS_NAME = '.ydownloader-metrics.jsonl'
+
+PHASE_EXTRACT = 'extract'
+PHASE_VIDEO = 'video'
+PHASE_AUDIO = 'audio'
+PHASE_ENCODE = 'encode'
+PHASES = (PHASE_EXTRACT, PHASE_VIDEO, PHASE_AUDIO, PHASE_ENCODE)
+
+# Histogram buckets (upper bounds) for the Prometheus endpoint
+SECONDS_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+RTF_BUCKETS = (0.5, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def stream_phase(info):
+    """Phase a downloaded format belongs to (progressive formats count as video)"""
+    if info.get('vcodec') == 'none' and info.get('acodec') not in (None, 'none'):
+        return PHASE_AUDIO
+    return PHASE_VIDEO
+
+
+def probe_duration(path, ffmpeg=None):
+    """
+    Duration of a media file in seconds from ffmpeg's header read, or None.
+
+    Only needed when the extractor gave no duration (e.g. generic DASH manifests),
+    so the encode real-time factor can still be computed.
+    """
+    try:
+        proc = subprocess.run([ffmpeg or 'ffmpeg', '-hide_banner', '-i', str(path)],
+                              capture_output=True, text=True, errors='replace', timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    match = re.search(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)', proc.stderr)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+class JobTimer:
+    """
+    Phase timeline of one job on the monotonic clock.
+
+    Phases are contiguous: entering a phase ends the current one, so the
+    phase durations add up to the job's time up to the last phase change.
+    A phase entered twice (e.g. two video formats) accumulates.
+    Phases that ran at the same time (encode-while-download) are recorded with
+    add(); the amount by which they exceed the job's time is overlap_seconds.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.started = time.monotonic()
+        self.ended = None
+        self.phases = {}
+        self.current = None
+        self._since = self.started
+        self.media_seconds = None
+        # Seconds from the start to the first output byte, for streamed jobs
+        self.first_byte = None
+        self.encode_path = None
+        self.status = None
+        self.error = None
+
+    def _phase(self, name):
+        return self.phases.setdefault(name, {'seconds': 0.0, 'bytes': 0})
+
+    def enter(self, name):
+        """End the current phase and start name (None just ends the current phase)"""
+        now = time.monotonic()
+        if self.current is not None:
+            self._phase(self.current)['seconds'] += now - self._since
+        self.current = name
+        self._since = now
+        if name is not None:
+            self._phase(name)
+
+    def add(self, name, seconds, nbytes=0):
+        """Record a phase measured elsewhere (e.g. an encode in a worker process)"""
+        phase = self._phase(name)
+        phase['seconds'] += seconds
+        phase['bytes'] += nbytes
+
+    def on_progress(self, d):
+        """Feed a yt-dlp progress hook dict"""
+        name = stream_phase(d.get('info_dict') or {})
+        if name != self.current:
+            self.enter(name)
+        if d['status'] == 'finished':
+            self._phase(name)['bytes'] += d.get('downloaded_bytes') or d.get('total_bytes') or 0
+            self.enter(None)
+
+    def finish(self, status, encode_path=None, media_seconds=None, error=None):
+        self.enter(None)
+        self.ended = time.monotonic()
+        self.status = status
+        self.encode_path = encode_path or self.encode_path
+        self.media_seconds = media_seconds or self.media_seconds
+        self.error = error
+
+    @property
+    def overlap_seconds(self):
+        """Seconds of phase time that ran concurrently with other phases (0 for a sequential job)"""
+        total = (self.ended or time.monotonic()) - self.started
+        return max(0.0, sum(phase['seconds'] for phase in self.phases.values()) - total)
+
+    @property
+    def encode_rtf(self):
+        """Seconds of media encoded per second of wall time"""
+        encode = self.phases.get(PHASE_ENCODE, {}).get('seconds')
+        if not encode or not self.media_seconds:
+            return None
+        return self.media_seconds / encode
+
+    def as_dict(self):
+        phases = {}
+        for name, phase in self.phases.items():
+            entry = {'seconds': round(phase['seconds'], 3)}
+            if phase['bytes']:
+                entry['bytes'] = phase['bytes']
+                if phase['seconds']:
+                    entry['mb_s'] = round(phase['bytes'] / phase['seconds'] / 1024 ** 2, 2)
+            phases[name] = entry
+        rtf = self.encode_rtf
+        return {
+            'time': round(time.time(), 3),
+            'url': self.url,
+            'status': self.status,
+            'encode_path': self.encode_path,
+            'total_seconds': round((self.ended or time.monotonic()) - self.started, 3),
+            'media_seconds': self.media_seconds,
+            'phases': phases,
+            'encode_rtf': round(rtf, 2) if rtf else None,
+            'first_byte_seconds': round(self.first_byte, 3) if self.first_byte is not None else None,
+            'overlap_seconds': round(self.overlap_seconds, 3),
+            'error': self.error,
+        }
+
+    def summary(self):
+        """One-line timing for logs"""
+        parts = []
+        for name, phase in self.phases.items():
+            text = f"{name} {phase['seconds']:.1f}s"
+            if phase['bytes'] and phase['seconds']:
+                text += f" ({phase['bytes'] / phase['seconds'] / 1024 ** 2:.1f} MB/s)"
+            if name == PHASE_ENCODE and self.encode_rtf:
+                text += f" ({self.encode_rtf:.1f}x realtime)"
+            parts.append(text)
+        total = (self.ended or time.monotonic()) - self.started
+        # Rounding noise of back-to-back phases is not overlap
+        if self.overlap_seconds >= 0.1:
+            parts.append(f"overlap {self.overlap_seconds:.1f}s")
+        return f"{total:.1f}s total: " + " | ".join(parts)
+
+
+class JsonLinesSink:
+    """Append one JSON object per finished job to a file ('-' for stdout)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if path == '-':
+            self._file = sys.stdout
+        else:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(path, 'a', encoding='utf-8')
+
+    def emit(self, timer):
+        line = json.dumps(timer.as_dict(), ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        prefix = ''.join(f'{k}="{v}",' for k, v in labels.items())
+        for bound, count in zip(self.buckets, self.counts):
+            yield f'{name}_bucket{{{prefix}le="{bound}"}} {count}'
+        yield f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}'
+        suffix = f"{{{prefix.rstrip(',')}}}" if labels else ''
+        yield f'{name}_sum{suffix} {self.sum:.6f}'
+        yield f'{name}_count{suffix} {self.count}'
+
+
+class PrometheusMetrics:
+    """
+    Aggregates finished jobs into histograms and counters, rendered in the
+    Prometheus text exposition format (see job_server /metrics).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phase_seconds = {}
+        self._phase_bytes = {}
+        self._job_seconds = _Histogram(SECONDS_BUCKETS)
+        self._encode_rtf = _Histogram(RTF_BUCKETS)
+        self._jobs = {}
+
+    def observe(self, phase, seconds, nbytes=0):
+        """Record one phase duration (also used for phases outside the timer, like queue wait)"""
+        with self._lock:
+            self._phase_seconds.setdefault(phase, _Histogram(SECONDS_BUCKETS)).observe(seconds)
+            if nbytes:
+                self._phase_bytes[phase] = self._phase_bytes.get(phase, 0) + nbytes
+
+    def emit(self, timer):
+        for name, phase in timer.phases.items():
+            self.observe(name, phase['seconds'], phase['bytes'])
+        with self._lock:
+            key = (timer.status, timer.encode_path or 'none')
+            self._jobs[key] = self._jobs.get(key, 0) + 1
+            self._job_seconds.observe(timer.ended - timer.started)
+            if timer.encode_rtf:
+                self._encode_rtf.observe(timer.encode_rtf)
+
+    def render(self, gauges=None):
+        """Exposition text; gauges is an optional {name: value} of current values"""
+        out = []
+        with self._lock:
+            out += ['# HELP ydownloader_jobs_total Finished jobs by status and encode path',
+                    '# TYPE ydownloader_jobs_total counter']
+            out += [f'ydownloader_jobs_total{{status="{status}",encode_path="{path}"}} {count}'
+                    for (status, path), count in sorted(self._jobs.items())]
+            out += ['# HELP ydownloader_job_seconds Wall time per job',
+                    '# TYPE ydownloader_job_seconds histogram']
+            out += self._job_seconds.lines('ydownloader_job_seconds', {})
+            out += ['# HELP ydownloader_phase_seconds Wall time per job phase',
+                    '# TYPE ydownloader_phase_seconds histogram']
+            for phase, histogram in sorted(self._phase_seconds.items()):
+                out += histogram.lines('ydownloader_phase_seconds', {'phase': phase})
+            out += ['# HELP ydownloader_phase_bytes_total Bytes downloaded per phase',
+                    '# TYPE ydownloader_phase_bytes_total counter']
+            out += [f'ydownloader_phase_bytes_total{{phase="{phase}"}} {nbytes}'
+                    for phase, nbytes in sorted(self._phase_bytes.items())]
+            out += ['# HELP ydownloader_encode_realtime_factor Seconds of media encoded per second',
+                    '# TYPE ydownloader_encode_realtime_factor histogram']
+            out += self._encode_rtf.lines('ydownloader_encode_realtime_factor', {})
+        for name, value in (gauges or {}).items():
+            out += [f'# TYPE ydownloader_{name} gauge', f'ydownloader_{name} {value}']
+        return '\n'.join(out) + '\n'
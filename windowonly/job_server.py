@@ -0,0 +1,534 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Job Server
+Flask version of server.js: runs yt-dlp in-process with structured progress
+from progress hooks, and queues jobs above the concurrency limit (FIFO)
+instead of rejecting them. Same API: /download, /events/<jobId>, /file/<filename>,
+plus per-phase job timings for Prometheus at /metrics, a streaming mode
+(/stream) that sends fragmented MP4 while ffmpeg produces it, a shared
+bandwidth limit that can be read and changed at /bandwidth, and
+/cancel/<jobId>, which stops a job and its ffmpeg processes at once.
+A /download body may carry a section ("1:30-2:00") to fetch and encode only
+that time range, and renditions (["best", "720p", "mp3"]) to write several
+qualities from one download and one decode. Finished files stay in a retention
+store (TTL + size bound) and /file answers Range requests with sendfile, so an
+interrupted transfer resumes and a second device fetches the same file
+"""
+
+import sys
+import os
+import re
+import json
+import uuid
+import queue
+import argparse
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from youtube_downloader_cli import build_ydl_opts, require_yt_dlp, rate_arg
+from encode_profile import ENCODE_STATS
+from media_cache import shared_cache
+from metadata_cache import shared_metadata_cache
+from job_metrics import PrometheusMetrics
+from toolchain import ffmpeg_path
+from chunked_encode import DEFAULT_CHUNK_ENCODERS
+from bandwidth import DEFAULT_WEIGHT, shared_bandwidth, parse_rate, format_rate
+from cancellation import JobCancelled, JobHandle
+from section_clip import parse_section
+from renditions import parse_renditions
+from file_serving import DEFAULT_RETENTION_BYTES, DEFAULT_RETENTION_TTL, RetentionStore, serve_file, \
+    sendfile_request_handler
+
+# Flask and yt-dlp are imported when the server is built, not with this module,
+# so --help and argument errors answer without loading either
+
+# Phase name for the time a job waits in the queue before a worker takes it
+PHASE_QUEUE = 'queue'
+# Phase name for the time from a cancel request until the job's worker is free again
+PHASE_CANCEL = 'cancel'
+
+# Jobs running at once; later jobs wait in the queue
+MAX_CONCURRENT_JOBS = 5
+# Seconds a finished job stays visible so late /events subscribers still get the last event
+JOB_RETENTION = 10
+# Seconds between SSE keep-alive comments
+KEEPALIVE_INTERVAL = 15
+# Seconds /cancel waits for a running job to give its worker back before answering 202
+CANCEL_TIMEOUT = 10
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+PUBLIC_DIR = ROOT_DIR / 'public'
+DOWNLOADS_DIR = ROOT_DIR / 'downloads'
+
+TERMINAL_STATUSES = ('completed', 'error', 'cancelled')
+
+
+def require_flask():
+    """Exit with an install hint when Flask is missing"""
+    try:
+        import flask  # noqa: F401
+    except ImportError:
+        print("\n" + "="*60)
+        print("ERROR: Flask module not found!")
+        print("Please install it with: pip install flask")
+        print("="*60 + "\n")
+        sys.exit(1)
+
+
+class Job:
+    """One /download request and the SSE clients listening to it"""
+
+    def __init__(self, job_id, url, filename, weight=DEFAULT_WEIGHT, section=None, renditions=None):
+        self.id = job_id
+        self.url = url
+        self.filename = filename
+        # Share of the bandwidth limit next to the other running jobs
+        self.weight = weight
+        # (start, end) seconds to clip, or None for the whole video
+        self.section = section
+        # Rendition names written from one download, or None for the single default output
+        self.renditions = renditions
+        # Cancelling it kills the job's ffmpeg processes and ends its download
+        self.handle = JobHandle(job_id)
+        # Set once the job no longer holds a worker (finished, failed, cancelled)
+        self.released = threading.Event()
+        self.phase = 'initializing'  # initializing, video, audio, merging
+        self.encode_path = None
+        self.last_event = None
+        self.last_progress = None
+        self.clients = []
+        self.submitted = time.monotonic()
+
+
+class JobScheduler:
+    """
+    FIFO job queue served by a fixed set of worker threads.
+
+    Each worker keeps its own yt-dlp session (SessionPool), so extractor and
+    connection setup happen once per worker instead of once per job. Queued
+    jobs get a 'queued' event with their position whenever the queue moves.
+    Queue wait and every job's phase timings are aggregated in self.metrics.
+    Running jobs and streams share the bandwidth manager's limit by weight.
+    cancel() takes a job out of the queue, or stops it while it runs.
+    Finished outputs go to the retention store that /file serves from.
+    """
+
+    def __init__(self, downloads_dir=DOWNLOADS_DIR, workers=MAX_CONCURRENT_JOBS, cache=None, metadata=None,
+                 bandwidth=None, retention=None):
+        self.downloads_dir = Path(downloads_dir)
+        self.workers = workers
+        self.bandwidth = bandwidth
+        self.retention = retention or RetentionStore(self.downloads_dir)
+        self.retention.start()
+        self.jobs = {}
+        self._pending = deque()
+        self._running = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self.metrics = PrometheusMetrics()
+
+        from ydl_session import SessionPool
+        # Jobs run side by side, so a long transcode splits only over its share of the cores
+        opts = build_ydl_opts(chunk_encoders=max(1, DEFAULT_CHUNK_ENCODERS // workers))
+        opts['progress_hooks'] = []  # progress goes to the job's SSE clients, not stdout
+        opts['postprocessor_hooks'] = [self._postprocessor_hook]
+        self.sessions = SessionPool(opts, cache=cache, metadata=metadata, metrics=self.metrics,
+                                    bandwidth=bandwidth)
+        # Streams run on the request thread for as long as the client reads; same limit as jobs
+        self.stream_slots = threading.BoundedSemaphore(workers)
+
+        for n in range(workers):
+            threading.Thread(target=self._worker, name=f"job-worker-{n + 1}", daemon=True).start()
+
+    def submit(self, url, filename=None, weight=DEFAULT_WEIGHT, section=None, renditions=None):
+        """Queue a job; returns (job, position) where position 0 means it starts right away"""
+        job_id = str(uuid.uuid4())
+        final_filename = re.sub(r'[^a-zA-Z0-9_\-.]', '_', filename) if filename else f"video_{job_id}"
+        job = Job(job_id, url, final_filename, weight, section, renditions)
+
+        with self._cond:
+            self.jobs[job_id] = job
+            self._pending.append(job)
+            position = max(0, len(self._pending) - (self.workers - self._running))
+            if position:
+                self._broadcast(job, {'status': 'queued', 'position': position})
+            self._cond.notify()
+        print(f"Queued job {job_id} for: {url} (position {position})")
+        return job, position
+
+    def get(self, job_id):
+        with self._cond:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job, timeout=CANCEL_TIMEOUT):
+        """
+        Cancel a queued or running job; True once it has released its worker.
+
+        A queued job is dropped at once. A running one has its ffmpeg processes
+        killed and its download stopped; this waits up to timeout for its
+        worker to be free (the job's partial files are removed).
+        """
+        with self._cond:
+            queued = job in self._pending
+            if queued:
+                self._pending.remove(job)
+                for position, waiting in enumerate(self._pending, start=1):
+                    self._broadcast(waiting, {'status': 'queued', 'position': position})
+        if queued:
+            job.handle.cancel(discard=True)
+            self.broadcast(job, {'status': 'cancelled'})
+            job.released.set()
+            self._retire(job)
+            print(f"Job {job.id} cancelled while queued")
+            return True
+        job.handle.cancel(discard=True)
+        released = job.released.wait(timeout)
+        if released:
+            self.metrics.observe(PHASE_CANCEL, time.monotonic() - job.handle.cancelled_at)
+        return released
+
+    def subscribe(self, job):
+        """New client queue for job, primed with the last event sent"""
+        client = queue.Queue()
+        with self._cond:
+            if job.last_event is not None:
+                client.put(job.last_event)
+            job.clients.append(client)
+        return client
+
+    def unsubscribe(self, job, client):
+        with self._cond:
+            if client in job.clients:
+                job.clients.remove(client)
+
+    def broadcast(self, job, data):
+        with self._cond:
+            self._broadcast(job, data)
+
+    def _broadcast(self, job, data):
+        job.last_event = data
+        for client in job.clients:
+            client.put(data)
+
+    def stats(self):
+        with self._cond:
+            return {'workers': self.workers, 'running': self._running, 'queued': len(self._pending)}
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                job = self._pending.popleft()
+                self._running += 1
+                for position, waiting in enumerate(self._pending, start=1):
+                    self._broadcast(waiting, {'status': 'queued', 'position': position})
+            self.metrics.observe(PHASE_QUEUE, time.monotonic() - job.submitted)
+
+            try:
+                self._run(job)
+            finally:
+                with self._cond:
+                    self._running -= 1
+                job.released.set()
+                self._retire(job)
+
+    def _retire(self, job):
+        timer = threading.Timer(JOB_RETENTION, self._forget, args=(job.id,))
+        timer.daemon = True
+        timer.start()
+
+    def _forget(self, job_id):
+        with self._cond:
+            self.jobs.pop(job_id, None)
+            active = len(self.jobs)
+        print(f"Job {job_id} removed. Active jobs: {active}")
+
+    def _run(self, job):
+        print(f"Starting job {job.id} for: {job.url}")
+        self.downloads_dir.mkdir(parents=True, exist_ok=True)
+        outtmpl = str(self.downloads_dir / f"{job.filename}.%(ext)s")
+
+        self._local.job = job
+        session = self.sessions.get()
+        try:
+            info, encode_path = session.download(job.url, outtmpl, self._progress_hook_for(job), weight=job.weight,
+                                                 handle=job.handle, section=job.section, renditions=job.renditions)
+        except JobCancelled:
+            print(f"Job {job.id} cancelled after {time.monotonic() - job.handle.cancelled_at:.2f}s")
+            self.broadcast(job, {'status': 'cancelled'})
+            return
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            self.broadcast(job, {'status': 'error', 'message': 'Download failed'})
+            return
+        finally:
+            self._local.job = None
+
+        job.encode_path = encode_path
+        for path in session.last_outputs:
+            self.retention.add(path)
+        print(f"Job {job.id} finished (encode path: {encode_path}, stats: {ENCODE_STATS.summary()}, "
+              f"{self.retention.summary()})")
+        event = {'status': 'completed', 'filename': f"{job.filename}.{info.get('ext') or 'mp4'}",
+                 'encodePath': encode_path}
+        if job.renditions:
+            # One file per rendition, all served by /file/<filename>
+            files = [os.path.basename(path) for path in session.last_outputs]
+            event.update(filename=files[0], files=files)
+        self.broadcast(job, event)
+
+    def _progress_hook_for(self, job):
+        def hook(d):
+            if d['status'] != 'downloading':
+                return
+            fmt = d.get('info_dict') or {}
+            if fmt.get('vcodec') not in (None, 'none'):
+                job.phase = 'video'
+            elif fmt.get('acodec') not in (None, 'none'):
+                job.phase = 'audio'
+            elif job.phase == 'initializing':
+                job.phase = 'video'
+
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            if not total:
+                return
+            progress = round(min(d.get('downloaded_bytes', 0) / total * 100, 100.0), 1)
+            # Only changes of at least 0.1% reach the clients
+            if (job.phase, progress) == job.last_progress:
+                return
+            job.last_progress = (job.phase, progress)
+            self.broadcast(job, {'status': 'downloading', 'phase': job.phase, 'progress': progress})
+        return hook
+
+    def _postprocessor_hook(self, d):
+        job = getattr(self._local, 'job', None)
+        if job is not None and d['status'] == 'started' and d.get('postprocessor') == 'Merger':
+            job.phase = 'merging'
+            self.broadcast(job, {'status': 'merging', 'phase': 'merging', 'progress': 100})
+
+
+def create_app(scheduler, public_dir=PUBLIC_DIR):
+    """Flask app exposing the server.js API on top of a JobScheduler"""
+    from flask import Flask, Response, jsonify, request, send_from_directory
+    from ydl_session import DownloadSession
+    from stream_output import NotStreamable, open_stream
+
+    app = Flask(__name__, static_folder=str(public_dir), static_url_path='')
+
+    @app.get('/')
+    def index():
+        return send_from_directory(public_dir, 'index.html')
+
+    @app.post('/download')
+    def download():
+        body = request.get_json(silent=True) or {}
+        url = body.get('url')
+        if not url:
+            return jsonify(error='URL is required'), 400
+
+        weight = body.get('weight', DEFAULT_WEIGHT)
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight <= 0:
+            return jsonify(error='weight must be a positive number'), 400
+
+        section = body.get('section')
+        if section is not None:
+            try:
+                section = parse_section(section)
+            except ValueError as e:
+                return jsonify(error=str(e)), 400
+
+        renditions = body.get('renditions')
+        if renditions is not None:
+            try:
+                renditions = parse_renditions(renditions)
+            except ValueError as e:
+                return jsonify(error=str(e)), 400
+
+        job, position = scheduler.submit(url, body.get('filename'), weight, section, renditions)
+        return jsonify(jobId=job.id, position=position)
+
+    @app.post('/cancel/<job_id>')
+    def cancel(job_id):
+        job = scheduler.get(job_id)
+        if job is None:
+            return jsonify(error='Job not found'), 404
+        if job.released.is_set():
+            return jsonify(error='Job already finished', status=(job.last_event or {}).get('status')), 409
+
+        started = time.monotonic()
+        released = scheduler.cancel(job)
+        # A job finishing at that moment keeps its own final status; 202: the kill is under
+        # way but the worker is not free yet (the job's 'cancelled' event follows)
+        status = (job.last_event or {}).get('status') if released else 'cancelling'
+        return jsonify(jobId=job.id, status=status, released=released,
+                       seconds=round(time.monotonic() - started, 3)), 200 if released else 202
+
+    @app.get('/bandwidth')
+    def bandwidth_status():
+        if scheduler.bandwidth is None:
+            return jsonify(error='No bandwidth manager'), 404
+        # rate: the limit (0 = unlimited), current: measured total; bytes per second
+        return jsonify(scheduler.bandwidth.snapshot())
+
+    @app.route('/bandwidth', methods=['PUT', 'POST'])
+    def set_bandwidth():
+        if scheduler.bandwidth is None:
+            return jsonify(error='No bandwidth manager'), 404
+        body = request.get_json(silent=True) or {}
+        if 'rate' not in body:
+            return jsonify(error='rate is required (bytes per second, "2M", or 0 for unlimited)'), 400
+        try:
+            rate = parse_rate(body['rate'])
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        # Running downloads follow the new limit from their next block on
+        scheduler.bandwidth.set_rate(rate)
+        print(f"Bandwidth limit set to {format_rate(rate)}")
+        return jsonify(scheduler.bandwidth.snapshot())
+
+    @app.get('/events/<job_id>')
+    def events(job_id):
+        job = scheduler.get(job_id)
+        if job is None:
+            return jsonify(error='Job not found'), 404
+        client = scheduler.subscribe(job)
+
+        def stream():
+            try:
+                while True:
+                    try:
+                        data = client.get(timeout=KEEPALIVE_INTERVAL)
+                    except queue.Empty:
+                        yield ': keep-alive\n\n'
+                        continue
+                    yield f"data: {json.dumps(data)}\n\n"
+                    if data['status'] in TERMINAL_STATUSES:
+                        return
+            finally:
+                scheduler.unsubscribe(job, client)
+
+        return Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    @app.get('/stream')
+    def stream_video():
+        url = request.args.get('url')
+        if not url:
+            return jsonify(error='URL is required'), 400
+        filename = re.sub(r'[^a-zA-Z0-9_\-.]', '_', request.args.get('filename') or 'video')
+        # Streams are tied to a connection, so they are refused instead of queued
+        if not scheduler.stream_slots.acquire(blocking=False):
+            return jsonify(error='Too many streams, try again later or use /download'), 429
+
+        try:
+            with DownloadSession(scheduler.sessions.opts, metadata=scheduler.sessions.metadata) as session:
+                info, encoded = open_stream(session, url, ffmpeg_path(), metrics=scheduler.metrics)
+        except NotStreamable as e:
+            scheduler.stream_slots.release()
+            return jsonify(error=f'Cannot stream this video ({e}), use /download'), 409
+        except Exception as e:
+            scheduler.stream_slots.release()
+            print(f"Stream failed for {url}: {e}")
+            return jsonify(error='Stream failed to start'), 502
+        print(f"Streaming {url} ({encoded.encode_path})")
+
+        # Length is unknown up front; the client gets chunks as ffmpeg writes them
+        # Paced by the shared limit like the jobs; ffmpeg's reads slow down with the response
+        chunks = scheduler.bandwidth.throttle(encoded, url) if scheduler.bandwidth else iter(encoded)
+        response = Response(chunks, mimetype='video/mp4', headers={
+            'Content-Disposition': f'attachment; filename="{filename}.mp4"',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+            'X-Encode-Path': encoded.encode_path,
+        })
+
+        def cleanup():
+            # Runs when the response ends, also when the client disconnects mid-stream
+            encoded.close()
+            scheduler.stream_slots.release()
+        response.call_on_close(cleanup)
+        return response
+
+    @app.get('/stats/encode')
+    def encode_stats():
+        return jsonify({**ENCODE_STATS.counts, 'remuxHitRate': ENCODE_STATS.hit_rate})
+
+    @app.get('/stats/queue')
+    def queue_stats():
+        return jsonify(scheduler.stats())
+
+    @app.get('/metrics')
+    def metrics():
+        stats = scheduler.stats()
+        files, retained = scheduler.retention.usage()
+        gauges = {'workers': stats['workers'], 'jobs_running': stats['running'], 'jobs_queued': stats['queued'],
+                  'retained_files': files, 'retained_bytes': retained}
+        if scheduler.bandwidth is not None:
+            snapshot = scheduler.bandwidth.snapshot()
+            gauges.update(bandwidth_limit_bytes_per_second=snapshot['rate'],
+                          bandwidth_bytes_per_second=snapshot['current'])
+        return Response(scheduler.metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+    @app.get('/file/<path:filename>')
+    def file(filename):
+        # Kept after the response (unlike server.js) so Range requests can resume it
+        return serve_file(scheduler.retention, filename, request)
+
+    return app
+
+
+def size_arg(text):
+    """argparse type for --retention-size"""
+    try:
+        return parse_rate(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size {text!r} (examples: 500M, 20G)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="YouTube Downloader - Job Server")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 3000)))
+    parser.add_argument('--workers', type=int, default=MAX_CONCURRENT_JOBS,
+                        help="Jobs running at once; the rest are queued (default: %(default)s)")
+    parser.add_argument('--downloads-dir', default=str(DOWNLOADS_DIR))
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Do not use the local media/metadata caches")
+    parser.add_argument('--limit-rate', type=rate_arg, default=0, metavar='RATE',
+                        help="Total download rate shared by the running jobs (e.g. 4M; default: unlimited; "
+                             "can be changed later with PUT /bandwidth)")
+    parser.add_argument('--retention-ttl', type=int, default=DEFAULT_RETENTION_TTL, metavar='SECONDS',
+                        help="Keep finished files this long after they were finished or last read "
+                             "(default: %(default)s)")
+    parser.add_argument('--retention-size', type=size_arg, default=DEFAULT_RETENTION_BYTES, metavar='SIZE',
+                        help="Most disk space kept for finished files, least recently read go first "
+                             "(e.g. 20G; default: 5G)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    require_flask()
+    require_yt_dlp()
+    cache = metadata = None
+    if not args.no_cache:
+        cache, metadata = shared_cache(), shared_metadata_cache()
+
+    bandwidth = shared_bandwidth()
+    bandwidth.set_rate(args.limit_rate)
+    retention = RetentionStore(args.downloads_dir, ttl=args.retention_ttl, max_bytes=args.retention_size)
+    scheduler = JobScheduler(args.downloads_dir, workers=args.workers, cache=cache, metadata=metadata,
+                             bandwidth=bandwidth, retention=retention)
+    app = create_app(scheduler)
+    print(f"Server running at http://localhost:{args.port} ({args.workers} concurrent jobs, "
+          f"bandwidth {format_rate(bandwidth.rate)}, {retention.summary()})")
+    # threaded=True: each SSE stream holds a request thread for the life of its job;
+    # the request handler sends /file responses with sendfile
+    app.run(host=args.host, port=args.port, threaded=True, request_handler=sendfile_request_handler())
+
+
+if __name__ == "__main__":
+    main()
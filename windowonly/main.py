@@ -1,6 +1,40 @@
-def main():
-    print("Hello from windowonly!")
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Entry Point
+One command for every front end: `python main.py cli|gui|serve|worker [options]`.
+Only the chosen front end is imported, and each one parses its arguments before
+loading yt-dlp or Flask, so --help and usage errors return immediately
+"""
+
+import argparse
+import importlib
+import multiprocessing
+import sys
+
+# subcommand -> (module, help)
+COMMANDS = {
+    'cli': ('youtube_downloader_cli', "Download from the command line"),
+    'gui': ('youtube_downloader_gui', "Open the desktop window"),
+    'serve': ('job_server', "Run the web job server"),
+    'worker': ('queue_worker', "Take downloads from a shared work queue"),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='ydownloader', description="YouTube Downloader")
+    commands = parser.add_subparsers(dest='command', metavar='{' + ','.join(COMMANDS) + '}')
+    for name, (_, help_text) in COMMANDS.items():
+        # The front end's own parser handles the rest, including its --help
+        commands.add_parser(name, help=help_text, add_help=False)
+    args, rest = parser.parse_known_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 2
+    module = importlib.import_module(COMMANDS[args.command][0])
+    return module.main(rest)
 
 
 if __name__ == "__main__":
-    main()
+    # Needed for the encode process pool in the frozen (PyInstaller) build
+    multiprocessing.freeze_support()
+    sys.exit(main())
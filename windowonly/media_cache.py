@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Media Cache
+Content-addressed on-disk cache of finished outputs, keyed by video ID,
+selected formats and encode profile, with size-bounded LRU eviction
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3  # 5 GiB
+
+
+def cache_root():
+    """Per-user cache directory (shared by the CLI, GUI and server)"""
+    if os.name == 'nt' and os.environ.get('LOCALAPPDATA'):
+        return Path(os.environ['LOCALAPPDATA']) / 'YouTubeDownloader' / 'cache'
+    return Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'ydownloader'
+
+
+def link_or_copy(src, dest):
+    """Hardlink src to dest (instant, no extra space) and fall back to a copy across volumes"""
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if dest.exists():
+        dest.unlink()
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+class MediaCache:
+    """
+    Finished files stored as <dir>/<key[:2]>/<key>.<ext>.
+
+    Last-use times live in <dir>/index.sqlite3 so that hits do not touch the
+    file mtime (outputs are hardlinks of the cache entries). Every hit and
+    store is written there at once, so processes sharing the cache (queue
+    workers, the CLI beside the GUI) evict by each other's use too. Eviction
+    removes the least recently used entries once the total size exceeds
+    max_bytes; an entry with no recorded use counts from its file's mtime.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = Path(directory) if directory else cache_root() / 'media'
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.directory / 'index.sqlite3'), check_same_thread=False, timeout=10)
+        with self._db:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS used (
+                    name TEXT PRIMARY KEY,
+                    used_at REAL NOT NULL
+                )''')
+        self._import_index()
+
+    @staticmethod
+    def key_for(info, profile, ext, section=None):
+        """Cache key: extractor + video ID + selected format IDs + encode profile + output ext (+ clipped section)"""
+        parts = [
+            info.get('extractor_key') or info.get('extractor') or '',
+            str(info.get('id') or info.get('webpage_url') or ''),
+            str(info.get('format_id') or ''),
+            str(profile),
+            str(ext),
+        ]
+        if section is not None:
+            parts.append(f"{section[0]:g}-{section[1]:g}")
+        return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()[:32]
+
+    def _entry(self, key, ext):
+        return self.directory / key[:2] / f"{key}.{ext}"
+
+    def _import_index(self):
+        """Take over the last-use times of the index.json earlier versions kept"""
+        path = self.directory / 'index.json'
+        try:
+            with open(path, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._lock, self._db:
+            self._db.executemany('INSERT OR IGNORE INTO used VALUES (?, ?)', index.items())
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+    def _touch(self, name):
+        self._db.execute('INSERT OR REPLACE INTO used VALUES (?, ?)', (name, time.time()))
+
+    def lookup(self, key, ext):
+        """Return the cached file path, or None"""
+        entry = self._entry(key, ext)
+        with self._lock:
+            if not entry.exists():
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._db:
+                self._touch(entry.name)
+        return entry
+
+    def materialize(self, key, ext, dest):
+        """Produce dest from the cache; returns True on a hit"""
+        entry = self.lookup(key, ext)
+        if entry is None:
+            return False
+        link_or_copy(entry, dest)
+        return True
+
+    def store(self, key, ext, src):
+        """Add a finished output to the cache, then evict down to max_bytes"""
+        entry = self._entry(key, ext)
+        try:
+            link_or_copy(src, entry)
+        except OSError:
+            return
+        with self._lock, self._db:
+            self._touch(entry.name)
+            self._evict()
+
+    def _evict(self):
+        # Last-use times as every process sharing the cache has written them
+        used = dict(self._db.execute('SELECT name, used_at FROM used'))
+        entries = []
+        total = 0
+        for path in self.directory.glob('??/*'):
+            try:
+                stat = path.stat()
+            except OSError:
+                # Evicted by another process sharing the cache
+                continue
+            total += stat.st_size
+            entries.append((used.get(path.name, stat.st_mtime), stat.st_size, path))
+
+        entries.sort()
+        while total > self.max_bytes and entries:
+            _, size, path = entries.pop(0)
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            self._db.execute('DELETE FROM used WHERE name = ?', (path.name,))
+
+    def claim(self, key):
+        """
+        Single-flight for duplicate items in a batch.
+
+        Returns None when the caller is the first to fetch this key (it must call
+        release(key) when done); otherwise an Event to wait on before looking up again.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                self._flights[key] = threading.Event()
+            return flight
+
+    def release(self, key):
+        with self._lock:
+            flight = self._flights.pop(key, None)
+        if flight:
+            flight.set()
+
+    def acquire(self, key, ext, dest):
+        """
+        Materialize dest from the cache, waiting for an in-flight fetch of the same key.
+
+        Returns True on a hit; False means the caller now owns the fetch and must release(key).
+        """
+        while True:
+            if self.materialize(key, ext, dest):
+                return True
+            flight = self.claim(key)
+            if flight is None:
+                return False
+            flight.wait()
+
+    def summary(self):
+        return f"cache hits {self.hits}, misses {self.misses}"
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_cache():
+    """Process-wide cache in the default location (one instance, so single-flight spans all sessions)"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = MediaCache()
+        return _shared
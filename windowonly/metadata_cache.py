@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Metadata Cache
+SQLite cache of raw extract_info results (formats, title, duration, codecs)
+so retries and re-runs skip the extraction round-trip
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+
+from media_cache import cache_root
+
+# Stream URLs inside the formats expire (a few hours on YouTube), so keep this short
+DEFAULT_TTL = 60 * 60
+
+# Query parameters that do not change which video a URL points to
+_TRACKING_PARAMS = {'si', 'feature', 'pp', 't', 'start', 'ab_channel'}
+
+_YOUTUBE_ID = re.compile(
+    r'(?:youtube(?:-nocookie)?\.com/(?:watch\?(?:.*&)?v=|embed/|shorts/|live/|v/)|youtu\.be/)'
+    r'([0-9A-Za-z_-]{11})')
+
+
+def normalize_url(url):
+    """Map different spellings of the same video URL to one index key"""
+    url = url.strip()
+    match = _YOUTUBE_ID.search(url)
+    if match:
+        return f"youtube:{match.group(1)}"
+
+    parsed = urlparse(url)
+    query = [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+             if k not in _TRACKING_PARAMS and not k.startswith('utm_')]
+    return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), parsed.path,
+                       parsed.params, urlencode(query), ''))
+
+
+class MetadataCache:
+    """
+    Two tables: info (one row per extractor + video ID, with the raw
+    ie_result as JSON) and urls (normalized URL -> info key).
+    Entries older than ttl seconds are treated as misses.
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL):
+        self.path = path or cache_root() / 'metadata.sqlite3'
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10)
+        with self._db:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS info (
+                    key TEXT PRIMARY KEY,
+                    extractor TEXT,
+                    video_id TEXT,
+                    title TEXT,
+                    duration REAL,
+                    data TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )''')
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS urls (
+                    url TEXT PRIMARY KEY,
+                    key TEXT NOT NULL
+                )''')
+
+    def get(self, url):
+        """Return the cached raw ie_result for url, or None"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT info.data, info.fetched_at FROM urls JOIN info ON urls.key = info.key '
+                'WHERE urls.url = ?', (normalize_url(url),)).fetchone()
+            if row is None or time.time() - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, url, info):
+        """Store a sanitized raw ie_result (only single videos are cached)"""
+        if info.get('_type', 'video') != 'video' or not info.get('id'):
+            return
+        key = f"{info.get('extractor_key') or info.get('extractor')}:{info['id']}"
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO info VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, info.get('extractor_key'), info['id'], info.get('title'),
+                 info.get('duration'), json.dumps(info), time.time()))
+            for u in {url, info.get('webpage_url'), info.get('original_url')}:
+                if u:
+                    self._db.execute('INSERT OR REPLACE INTO urls VALUES (?, ?)', (normalize_url(u), key))
+
+    def purge_expired(self):
+        """Drop entries past the TTL (and URL index rows pointing at them)"""
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM info WHERE fetched_at < ?', (time.time() - self.ttl,))
+            self._db.execute('DELETE FROM urls WHERE key NOT IN (SELECT key FROM info)')
+
+    def summary(self):
+        return f"metadata hits {self.hits}, misses {self.misses}"
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_metadata_cache():
+    """Process-wide metadata cache in the default location"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = MetadataCache()
+        return _shared
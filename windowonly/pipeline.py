@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Staged Pipeline
+Download stage (threads, network-bound) feeding an encode stage (process pool, CPU-bound)
+through a bounded queue, so the NIC and the CPU are busy at the same time
+"""
+
+import glob
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from download_engine import DownloadEngine, DEFAULT_WORKERS
+from ydl_session import SessionPool
+from job_journal import STATE_DONE, STATE_FAILED, job_profile
+from job_metrics import PHASE_ENCODE, probe_duration
+from encode_profile import PATH_TRANSCODE, build_ffmpeg_command
+from chunked_encode import EncodeError, chunk_seconds_for, chunked_transcode
+from cancellation import start_process_group
+
+# Time a downloaded item waits for a free encode worker
+PHASE_ENCODE_QUEUE = 'encode_queue'
+
+# Sentinel that tells the encode dispatcher the download stage is finished
+_DONE = object()
+
+
+def _chunk_seconds(spec):
+    """Chunk length when this item's transcode is split across encoders, else None"""
+    encoders = spec.get('chunk_encoders') or 1
+    if spec['encode_path'] != PATH_TRANSCODE or encoders <= 1:
+        return None
+    video = next((s for s in spec['inputs'] if s['video']), None)
+    if video is None:
+        return None
+    return chunk_seconds_for(spec.get('duration') or probe_duration(video['path'], spec['ffmpeg']), encoders)
+
+
+def run_encode(spec):
+    """
+    Encode stage worker (runs in a pool process, so it must stay a top-level function).
+
+    Long transcodes are split across spec['chunk_encoders'] ffmpeg processes
+    (see chunked_encode). Returns a result dict; ffmpeg failures are reported, not raised.
+    """
+    start = time.monotonic()
+    chunks = 0
+    chunk_seconds = _chunk_seconds(spec)
+    if chunk_seconds:
+        try:
+            chunks = chunked_transcode(spec['ffmpeg'], spec['inputs'], spec['output'],
+                                       spec['chunk_encoders'], chunk_seconds)
+            error = None
+        except EncodeError as e:
+            error = str(e)
+    else:
+        cmd = build_ffmpeg_command(spec['ffmpeg'], spec['inputs'], spec['output'], spec['args'])
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        error = (proc.stderr.strip()[-500:] or f"ffmpeg exited with {proc.returncode}") if proc.returncode else None
+    result = {
+        'index': spec['index'],
+        'output': spec['output'],
+        'encode_path': spec['encode_path'],
+        'chunks': chunks,
+        'seconds': time.monotonic() - start,
+        'success': error is None,
+        'error': error,
+    }
+
+    # Intermediate stream files are only removed once the output exists
+    if result['success'] and spec.get('cleanup', True):
+        for stream in spec['inputs']:
+            try:
+                os.remove(stream['path'])
+            except OSError:
+                pass
+    return result
+
+
+class StagedPipeline:
+    """
+    Two-stage batch pipeline.
+
+    Download workers (DownloadEngine threads, one yt-dlp session each) fetch the
+    selected streams and put an encode spec on a bounded queue; a dispatcher feeds
+    the queue into a ProcessPoolExecutor running ffmpeg. When the queue is full the
+    download workers block, which keeps finished-but-unencoded files from piling up.
+
+    on_event(kind, data) receives ('log', str), ('depths', dict) and
+    ('item', (index, success)) events from any thread.
+    With a job journal, items finished in an earlier run are skipped.
+    Each item's phase timeline (including the wait for an encode worker) is
+    logged and, with a metrics sink, emitted once the item is finished.
+    With a bandwidth manager, the downloads share its rate limit.
+    A cancellation handle stops the whole run when it is cancelled: downloads
+    end at once and the encode processes (each leading a process group, so
+    ffmpeg goes with it) are killed instead of finishing their items.
+    """
+
+    def __init__(self, opts, ffmpeg='ffmpeg', download_workers=DEFAULT_WORKERS,
+                 encode_workers=None, queue_size=None, audio_only=False,
+                 on_event=None, should_stop=None, cache=None, metadata=None, journal=None, metrics=None,
+                 bandwidth=None, handle=None):
+        self.opts = opts
+        self.bandwidth = bandwidth
+        self.handle = handle
+        self.cache = cache
+        self.metadata = metadata
+        self.journal = journal
+        self.metrics = metrics
+        self.ffmpeg = ffmpeg or 'ffmpeg'
+        self.download_workers = download_workers
+        self.encode_workers = encode_workers or os.cpu_count() or 1
+        # opts['chunk_encoders'] is a budget of ffmpeg processes; the encode pool already
+        # runs encode_workers items at once, so each item splits only over its share
+        self.chunk_encoders = max(1, (opts.get('chunk_encoders') or 1) // self.encode_workers)
+        self.queue_size = queue_size or self.encode_workers * 2
+        self.audio_only = audio_only
+        self.on_event = on_event or (lambda kind, data: None)
+        stop_requested = should_stop or (lambda: False)
+        self.should_stop = lambda: stop_requested() or (handle is not None and handle.cancelled)
+
+        self._lock = threading.Lock()
+        self._encode_queue = queue.Queue(maxsize=self.queue_size)
+        self._depths = {'download_pending': 0, 'downloading': 0, 'encode_queued': 0, 'encoding': 0}
+
+    def _adjust(self, **deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                self._depths[key] += delta
+            depths = dict(self._depths)
+        self.on_event('depths', depths)
+
+    def depths(self):
+        """Current queue depth per stage"""
+        with self._lock:
+            return dict(self._depths)
+
+    def _put(self, spec):
+        """Blocking put that still notices a stop request"""
+        while not self.should_stop():
+            try:
+                self._encode_queue.put(spec, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self, items, progress_hook_factory=None):
+        """
+        Run the batch. items is an iterable of (url, outtmpl) pairs; returns {index: success}.
+
+        items may be lazy (a PlaylistStream being listed): it is read as the
+        download workers free up, and an item counts as pending once it is read.
+        progress_hook_factory(index) may return a yt-dlp progress hook per item.
+        """
+        results = {}
+        timers = {}
+        # Output template per item, from when it is read until it is finished
+        outtmpls = {}
+        # Journaled like DownloadSession.fetch_streams does: the format is all an item asks for
+        profile = job_profile(self.opts.get('format'))
+        sessions = SessionPool(self.opts, cache=self.cache, metadata=self.metadata, journal=self.journal,
+                               metrics=self.metrics, bandwidth=self.bandwidth)
+
+        def urls():
+            for index, (url, outtmpl) in enumerate(items, 1):
+                outtmpls[index] = outtmpl
+                if self.journal is not None:
+                    self.journal.enqueue([(url, outtmpl)], profile)
+                self._adjust(download_pending=1)
+                yield url
+
+        def release(spec):
+            # Lets duplicate items waiting on the same cache key continue
+            if spec.get('cache_key'):
+                self.cache.release(spec['cache_key'])
+
+        def finish_timer(index, status, encode_path=None, error=None):
+            timer = timers.pop(index, None)
+            if timer is None:
+                return
+            timer.finish(status, encode_path=encode_path, error=error)
+            if self.metrics is not None:
+                self.metrics.emit(timer)
+            if status == 'done':
+                self.on_event('log', f"[{index}] Timing: {timer.summary()}")
+
+        def download(index, url):
+            outtmpl = outtmpls[index]
+            done = self.journal.finished(url, outtmpl, profile) if self.journal is not None else None
+            if done:
+                self._adjust(download_pending=-1)
+                self.on_event('log', f"[{index}] ✓ Already done in an earlier run: {done}")
+                outtmpls.pop(index, None)
+                results[index] = True
+                self.on_event('item', (index, True))
+                return True
+
+            self._adjust(download_pending=-1, downloading=1)
+            try:
+                hook = progress_hook_factory(index) if progress_hook_factory else None
+                spec = sessions.get().fetch_streams(url, outtmpl, progress_hook=hook,
+                                                    audio_only=self.audio_only, handle=self.handle)
+            except Exception as e:
+                if str(e) == "STOP_REQUESTED" or self.should_stop():
+                    raise Exception("STOP_REQUESTED")
+                self.on_event('log', f"[{index}] ERROR downloading {url}: {e}")
+                outtmpls.pop(index, None)
+                results[index] = False
+                self.on_event('item', (index, False))
+                return False
+            finally:
+                self._adjust(downloading=-1)
+
+            # Not sent to the encode process; the encode phase is added when it reports back
+            timer = spec.pop('timer', None)
+            if spec.get('cached'):
+                self.on_event('log', f"[{index}] ✓ From cache: {spec['output']}")
+                outtmpls.pop(index, None)
+                results[index] = True
+                self.on_event('item', (index, True))
+                return True
+
+            timers[index] = timer
+            spec.update(index=index, ffmpeg=self.ffmpeg, chunk_encoders=self.chunk_encoders,
+                        queued_at=time.monotonic())
+            self.on_event('log', f"[{index}] Downloaded, queued for {spec['encode_path']}")
+            # Counted before the put so the dispatcher never sees a negative depth
+            self._adjust(encode_queued=1)
+            if not self._put(spec):
+                self._adjust(encode_queued=-1)
+                release(spec)
+                finish_timer(index, 'stopped')
+                raise Exception("STOP_REQUESTED")
+            return True
+
+        def on_encoded(spec, future):
+            try:
+                result = future.result()
+                if result['success'] and spec.get('cache_key'):
+                    self.cache.store(spec['cache_key'], spec['ext'], result['output'])
+            except Exception as e:
+                if self.handle is not None and self.handle.cancelled:
+                    discard_encode(spec)
+                    self.on_event('log', f"[{spec['index']}] Encode cancelled")
+                    finish_timer(spec['index'], 'stopped')
+                else:
+                    self.on_event('log', f"Encode worker failed: {e}")
+                return
+            finally:
+                release(spec)
+                slots.release()
+                self._adjust(encoding=-1)
+
+            results[result['index']] = result['success']
+            timer = timers.get(result['index'])
+            if timer is not None:
+                waited = time.monotonic() - spec['queued_at'] - result['seconds']
+                timer.add(PHASE_ENCODE_QUEUE, max(0.0, waited))
+                timer.add(PHASE_ENCODE, result['seconds'])
+                if not timer.media_seconds and result['success']:
+                    timer.media_seconds = probe_duration(result['output'], self.ffmpeg)
+            outtmpl = outtmpls.pop(result['index'], None)
+            if self.journal is not None:
+                url = spec['url']
+                if result['success']:
+                    self.journal.mark(url, outtmpl, STATE_DONE, output=result['output'], profile=profile)
+                else:
+                    self.journal.mark(url, outtmpl, STATE_FAILED, error=result['error'], profile=profile)
+            if result['success']:
+                chunks = f", {result['chunks']} chunks" if result['chunks'] else ''
+                self.on_event('log', f"[{result['index']}] ✓ Encoded ({result['encode_path']}{chunks}, "
+                                     f"{result['seconds']:.1f}s): {result['output']}")
+            else:
+                self.on_event('log', f"[{result['index']}] ERROR encoding: {result['error']}")
+            finish_timer(result['index'], 'done' if result['success'] else 'failed',
+                         result['encode_path'], result['error'])
+            self.on_event('item', (result['index'], result['success']))
+
+        def discard_encode(spec):
+            # A killed encode leaves a partial output and, when chunked, its pieces
+            try:
+                os.remove(spec['output'])
+            except OSError:
+                pass
+            folder = os.path.dirname(spec['output']) or '.'
+            for work in glob.glob(os.path.join(glob.escape(folder), '.chunks-*')):
+                if os.path.getmtime(work) >= started:
+                    shutil.rmtree(work, ignore_errors=True)
+
+        def kill_encoders(pool):
+            # Each pool process leads its own group, so its ffmpeg children go with it
+            for pid in list(pool._processes or ()):
+                self.handle.kill_group(pid)
+
+        slots = threading.Semaphore(self.encode_workers)
+        started = time.time()
+
+        def dispatch(pool):
+            while True:
+                spec = self._encode_queue.get()
+                if spec is _DONE:
+                    return
+                slots.acquire()
+                self._adjust(encode_queued=-1, encoding=1)
+                if self.should_stop():
+                    release(spec)
+                    slots.release()
+                    self._adjust(encoding=-1)
+                    finish_timer(spec['index'], 'stopped')
+                    continue
+                try:
+                    future = pool.submit(run_encode, spec)
+                except BrokenProcessPool:
+                    # The encode processes were killed by a cancel
+                    release(spec)
+                    slots.release()
+                    self._adjust(encoding=-1)
+                    finish_timer(spec['index'], 'stopped')
+                    continue
+                future.add_done_callback(lambda f, spec=spec: on_encoded(spec, f))
+
+        initializer = start_process_group if self.handle is not None else None
+        with ProcessPoolExecutor(max_workers=self.encode_workers, initializer=initializer) as pool:
+            if self.handle is not None:
+                self.handle.on_cancel(lambda: kill_encoders(pool))
+            dispatcher = threading.Thread(target=dispatch, args=(pool,), daemon=True)
+            dispatcher.start()
+            try:
+                engine = DownloadEngine(workers=self.download_workers, should_stop=self.should_stop)
+                engine.run(urls(), download)
+            finally:
+                sessions.close()
+                self._encode_queue.put(_DONE)
+                dispatcher.join()
+            # Leaving the with-block waits for the encodes that are still running
+
+        return results
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Playlist Stream
+Expands playlist and channel URLs while they are listed: entries are handed out
+page by page as the extractor finds them, so the first video downloads while the
+rest of the playlist is still being discovered
+"""
+
+from yt_dlp.extractor import gen_extractor_classes
+from yt_dlp.utils import PagedList
+
+# Playlists nested in playlists (a channel's tabs) are followed this deep
+MAX_DEPTH = 3
+# Keys a playlist's own info adds to its entries, so inline entries process like a top-level result
+_EXTRACTOR_KEYS = ('extractor', 'extractor_key', 'webpage_url_domain')
+
+
+class Entry(str):
+    """
+    One URL to download; a str, so it goes wherever batch URLs go (engine, journal).
+
+    source is the 1-based position of the input URL it came from, position its
+    1-based place in that playlist (None for a plain URL) and playlist the
+    playlist's title. raw is the extractor result already fetched while
+    expanding, if any; DownloadSession takes it instead of extracting again.
+    """
+
+    def __new__(cls, url, source, position=None, playlist=None, raw=None):
+        entry = super().__new__(cls, url)
+        entry.source = source
+        entry.position = position
+        entry.playlist = playlist
+        entry.raw = raw
+        return entry
+
+    def __reduce__(self):
+        # Pickled into encode processes (pipeline specs) without the extractor result
+        return Entry, (str(self), self.source, self.position, self.playlist)
+
+    def filename(self, filenames):
+        """The custom filename given for this entry's input URL (numbered inside a playlist), or None"""
+        name = filenames[self.source - 1] if self.source <= len(filenames) else None
+        if name and self.position is not None:
+            return f"{name} {self.position:03d}"
+        return name or None
+
+    def take_raw(self):
+        """The prefetched extractor result (once; the entry stops holding it)"""
+        raw, self.raw = self.raw, None
+        return raw
+
+
+def single_video(url):
+    """True when the extractor for url only ever returns one video (no request needed)"""
+    for ie in gen_extractor_classes():
+        if ie.suitable(url):
+            return bool(ie.is_single_video(url))
+    return False
+
+
+def _iter_entries(entries):
+    if isinstance(entries, PagedList):
+        # Without its page cache the list only holds the page being read
+        entries._use_cache = False
+        return entries._getslice(0, None)
+    # Generators (most extractors) are pulled one page at a time as they are iterated
+    return iter(entries or ())
+
+
+class PlaylistStream:
+    """
+    Iterate the entries of a batch of input URLs, expanding playlists lazily.
+
+    Single-video URLs pass through without a request. Other URLs are extracted
+    without processing (yt-dlp would otherwise resolve every entry first); a
+    video result is passed on with the entry, a playlist yields its entries as
+    its pages arrive. Nothing is kept after an entry is handed out, so memory
+    does not grow with the playlist: DownloadEngine(max_pending=...) caps how
+    far the listing runs ahead of the downloads.
+
+    The session's yt-dlp instance is used for the extraction, so iterate from
+    one thread and give it a session no download worker uses at the same time.
+    log(message) receives a line per expanded playlist and per listing error.
+    skip(entry), if given, is asked about each input URL before it is extracted;
+    a true result passes the URL on unextracted (e.g. the job journal has it as
+    finished in an earlier run, so the consumer skips it without a request).
+    """
+
+    def __init__(self, session, urls, log=None, skip=None):
+        self.session = session
+        self.urls = list(urls)
+        self.log = log or (lambda message: None)
+        self.skip = skip
+        self.count = 0
+        self.playlists = 0
+        self.errors = []
+        # Set once every input URL has been listed (count is then the batch size)
+        self.listed = False
+
+    def _extract(self, url, ie_key=None):
+        metadata = self.session.metadata
+        raw = metadata.get(url) if metadata is not None else None
+        if raw is None:
+            ydl = self.session.ydl
+            raw = ydl.extract_info(url, download=False, process=False, ie_key=ie_key)
+            if metadata is not None and raw.get('_type', 'video') == 'video':
+                raw = ydl.sanitize_info(raw)
+                metadata.put(url, raw)
+        return raw
+
+    def _expand(self, raw, source, url, counter, depth):
+        kind = raw.get('_type', 'video')
+        if kind in ('url', 'url_transparent') and depth < MAX_DEPTH:
+            target = raw['url']
+            try:
+                resolved = self._extract(target, raw.get('ie_key'))
+            except Exception:
+                yield Entry(target, source)
+                return
+            yield from self._expand(resolved, source, target, counter, depth + 1)
+            return
+        if kind not in ('playlist', 'multi_video'):
+            yield Entry(url, source, raw=raw)
+            return
+
+        title = raw.get('title') or raw.get('id') or url
+        if depth == 0:
+            self.playlists += 1
+            self.log(f"Playlist '{title}': downloading entries as they are listed")
+        inherited = {key: raw[key] for key in _EXTRACTOR_KEYS if key in raw}
+        try:
+            for item in _iter_entries(raw.get('entries')):
+                if not item:
+                    continue
+                item_kind = item.get('_type', 'video')
+                if item_kind in ('playlist', 'multi_video') and depth < MAX_DEPTH:
+                    yield from self._expand(item, source, url, counter, depth + 1)
+                    continue
+                counter[0] += 1
+                if item_kind in ('url', 'url_transparent'):
+                    # Extracted by the download worker that picks it up
+                    yield Entry(item['url'], source, counter[0], title)
+                else:
+                    item_url = item.get('webpage_url') or item.get('url') or url
+                    yield Entry(item_url, source, counter[0], title, raw={**inherited, **item})
+        except Exception as e:
+            # Entries found so far are already on their way; the rest of this listing is lost
+            self.errors.append((url, e))
+            self.log(f"ERROR listing '{title}' after {counter[0]} entries: {e}")
+
+    def __iter__(self):
+        for source, url in enumerate(self.urls, 1):
+            if self.skip is not None and self.skip(Entry(url, source)):
+                self.count += 1
+                yield Entry(url, source)
+                continue
+            try:
+                raw = None if single_video(url) else self._extract(url)
+            except Exception:
+                # Passed on as is (as are failed redirects), so the failure is reported
+                # and journaled like any failed item
+                raw = None
+            if raw is None:
+                self.count += 1
+                yield Entry(url, source)
+                continue
+            for entry in self._expand(raw, source, url, [0], 0):
+                self.count += 1
+                yield entry
+        self.listed = True
+
+    def count_label(self):
+        """Entries so far, as '12+' while listing is still going on"""
+        return str(self.count) if self.listed else f"{self.count}+"
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Queue Worker
+Worker mode: processes on one or more machines take downloads from a shared
+work queue (see work_queue), run them with the CLI's download_video and report
+the result back, renewing their lease while each download runs
+
+  python queue_worker.py add URL [URL ...] -o D:\\Videos --queue Q.sqlite3
+  python queue_worker.py run --queue Q.sqlite3 --processes 4
+  python queue_worker.py status --queue Q.sqlite3
+"""
+
+import argparse
+import multiprocessing
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from bandwidth import shared_bandwidth, format_rate
+from cancellation import JobHandle, cancel_on_interrupt
+from chunked_encode import DEFAULT_CHUNK_ENCODERS
+from download_engine import DEFAULT_SEGMENTS, MAX_SEGMENTS, DEFAULT_FRAGMENTS, MAX_FRAGMENTS
+from media_cache import shared_cache
+from metadata_cache import shared_metadata_cache
+from work_queue import QUEUE_NAME, LEASE_SECONDS, STATE_FAILED, LeaseLost, WorkQueue, worker_name
+from youtube_downloader_cli import (build_ydl_opts, download_video, rate_arg, renditions_arg, require_yt_dlp,
+                                    section_arg)
+
+# Seconds an idle worker waits before asking the queue again
+POLL_SECONDS = 2.0
+# Per-job options a queued download may carry (the build_ydl_opts arguments of download_video)
+JOB_OPTIONS = ('segments', 'chunk_encoders', 'overlap', 'fragments')
+
+
+class QueueWorker:
+    """
+    Take jobs from a WorkQueue one at a time and run them with download_video.
+
+    One DownloadSession is kept per option set (see JOB_OPTIONS), so jobs
+    sharing options reuse it like the items of a CLI batch. While a job runs a
+    heartbeat thread renews its lease every third of the lease time; if the
+    lease is lost (the worker stalled and the job went to another worker) the
+    job is cancelled. Ctrl+C cancels the running job and gives it back to the
+    queue unfinished.
+    """
+
+    def __init__(self, queue, name=None, poll=POLL_SECONDS, exit_when_empty=False, log=print):
+        self.queue = queue
+        self.name = name or worker_name()
+        self.poll = poll
+        self.exit_when_empty = exit_when_empty
+        self.log = log
+        self.done = 0
+        self.failed = 0
+        self._sessions = {}
+
+    def _session(self, options):
+        from ydl_session import DownloadSession
+
+        options = {key: options[key] for key in JOB_OPTIONS if key in options}
+        key = tuple(sorted(options.items()))
+        if key not in self._sessions:
+            self._sessions[key] = DownloadSession(build_ydl_opts(**options), cache=shared_cache(),
+                                                  metadata=shared_metadata_cache(), bandwidth=shared_bandwidth())
+        return self._sessions[key]
+
+    def _keep_lease(self, job, handle, finished):
+        while not finished.wait(self.queue.lease / 3):
+            try:
+                self.queue.heartbeat(job['id'], self.name)
+            except LeaseLost as e:
+                self.log(f"✗ {e}; stopping it")
+                handle.cancel()
+                return
+            except sqlite3.OperationalError as e:
+                # Queue file locked or unreachable for longer than its timeout; try again next beat
+                self.log(f"Heartbeat for job {job['id']} failed: {e}")
+
+    def run_job(self, job):
+        """Run one leased job and report it; True when it finished"""
+        session = self._session(job['options'])
+        handle = JobHandle(f"job {job['id']}")
+        finished = threading.Event()
+        heartbeat = threading.Thread(target=self._keep_lease, args=(job, handle, finished), daemon=True,
+                                     name=f"lease-{job['id']}")
+        heartbeat.start()
+        self.log(f"[{self.name}] job {job['id']} (attempt {job['attempts']}): {job['url']}")
+        session.last_timer = None
+        try:
+            with cancel_on_interrupt(handle):
+                # Section and renditions are per item, not session options (stored as JSON lists)
+                section = job['options'].get('section')
+                renditions = job['options'].get('renditions')
+                ok = download_video(job['url'], job['output_path'], job['filename'], session=session, handle=handle,
+                                    section=tuple(section) if section else None,
+                                    renditions=tuple(renditions) if renditions else None)
+        except KeyboardInterrupt:
+            self.queue.release(job['id'], self.name)
+            self.log(f"Job {job['id']} returned to the queue")
+            raise
+        finally:
+            finished.set()
+            heartbeat.join()
+
+        timer = session.last_timer
+        try:
+            if ok:
+                self.queue.complete(job['id'], self.name, session.last_output)
+                self.done += 1
+            else:
+                error = (timer.error if timer is not None else None) or "download failed"
+                self.queue.fail(job['id'], self.name, error)
+                self.failed += 1
+        except LeaseLost as e:
+            # Already queued again or given to another worker: its result is theirs to report
+            self.log(f"Result of job {job['id']} not recorded: {e}")
+            return False
+        return ok
+
+    def run(self):
+        """Work until the queue is empty (with exit_when_empty) or Ctrl+C; returns (done, failed)"""
+        try:
+            while True:
+                job = self.queue.claim(self.name)
+                if job is not None:
+                    self.run_job(job)
+                    continue
+                # Leased jobs may still come back if their worker dies, so wait for them too
+                if self.exit_when_empty and not self.queue.pending():
+                    break
+                time.sleep(self.poll)
+        except KeyboardInterrupt:
+            self.log(f"[{self.name}] stopped")
+        finally:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+        return self.done, self.failed
+
+
+def run_worker(queue_path, name=None, lease=LEASE_SECONDS, poll=POLL_SECONDS, exit_when_empty=False,
+               limit_rate=0):
+    """Run one worker in this process (also the target of the worker processes)"""
+    shared_bandwidth().set_rate(limit_rate)
+    with WorkQueue(queue_path, lease=lease) as queue:
+        return QueueWorker(queue, name, poll, exit_when_empty).run()
+
+
+def run_workers(queue_path, processes, name=None, lease=LEASE_SECONDS, poll=POLL_SECONDS, exit_when_empty=False,
+                limit_rate=0):
+    """
+    Run processes workers side by side; each has its own yt-dlp sessions and
+    takes its own share (limit_rate / processes) of the node's bandwidth limit.
+    Returns the number of worker processes that failed.
+    """
+    if processes <= 1:
+        run_worker(queue_path, name, lease, poll, exit_when_empty, limit_rate)
+        return 0
+    name = name or worker_name()
+    workers = [multiprocessing.Process(target=run_worker, name=f"{name}/{n}",
+                                       args=(queue_path, f"{name}/{n}", lease, poll, exit_when_empty,
+                                             limit_rate / processes))
+               for n in range(1, processes + 1)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        # The workers got the same Ctrl+C; they give their jobs back and exit
+        for worker in workers:
+            worker.join()
+    return sum(1 for worker in workers if worker.exitcode)
+
+
+def print_status(queue):
+    print(f"Queue {queue.path}: {queue.summary()}")
+    workers = queue.workers()
+    if workers:
+        print(f"\n{'worker':<32} {'job':>6} {'done':>6} {'failed':>7}  last seen")
+        for worker in workers:
+            seen = datetime.fromtimestamp(worker['seen_at']).strftime('%H:%M:%S')
+            print(f"{worker['name']:<32} {worker['job_id'] or '-':>6} {worker['done']:>6} {worker['failed']:>7}  {seen}")
+    failed = queue.jobs(STATE_FAILED, limit=10)
+    if failed:
+        print("\nRecent failures:")
+        for job in failed:
+            print(f"  {job['id']}: {job['url']} - {job['error']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="YouTube Downloader - Queue Worker")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--queue', default=QUEUE_NAME,
+                        help="Queue file shared by the workers (a local path, or a network share "
+                             "with file locking for workers on other machines; default: %(default)s)")
+
+    run = commands.add_parser('run', parents=[common], help="Work through the queue")
+    run.add_argument('--processes', type=int, default=1, help="Worker processes on this machine (default: 1)")
+    run.add_argument('--name', default=None, help="Worker name in the queue (default: host:pid)")
+    run.add_argument('--lease', type=float, default=LEASE_SECONDS,
+                     help="Seconds without a heartbeat after which a job goes to another worker "
+                          "(default: %(default)g)")
+    run.add_argument('--poll', type=float, default=POLL_SECONDS, help="Seconds between checks of an empty queue")
+    run.add_argument('--exit-when-empty', action='store_true',
+                     help="Exit once no job is queued or running (default: keep waiting for jobs)")
+    run.add_argument('--limit-rate', type=rate_arg, default=0, metavar='RATE',
+                     help="Total download rate of this machine's workers (e.g. 4M; default: unlimited)")
+
+    add = commands.add_parser('add', parents=[common], help="Queue downloads")
+    add.add_argument('urls', nargs='+', metavar='URL')
+    add.add_argument('-o', '--output', required=True, help="Output directory (as seen by the workers)")
+    add.add_argument('--filename', action='append', default=[],
+                     help="Custom filename without extension, once per URL in order")
+    add.add_argument('--segments', type=int, default=DEFAULT_SEGMENTS, choices=range(1, MAX_SEGMENTS + 1),
+                     metavar='N', help=f"Connections per stream (default: {DEFAULT_SEGMENTS})")
+    add.add_argument('--fragments', type=int, default=DEFAULT_FRAGMENTS, choices=range(1, MAX_FRAGMENTS + 1),
+                     metavar='N', help=f"Most DASH/HLS fragments fetched at once per stream (default: {DEFAULT_FRAGMENTS})")
+    add.add_argument('--chunk-encoders', type=int, default=DEFAULT_CHUNK_ENCODERS, metavar='N',
+                     help=f"ffmpeg processes a long transcode is split across (default: {DEFAULT_CHUNK_ENCODERS})")
+    add.add_argument('--overlap', action='store_true', help="Transcode while downloading")
+    add.add_argument('--section', type=section_arg, default=None, metavar='START-END',
+                     help="Download only this time range of each video, e.g. 1:30-2:00")
+    add.add_argument('--renditions', type=renditions_arg, default=None, metavar='NAMES',
+                     help="Write several renditions from one download, e.g. best,720p,mp3")
+
+    commands.add_parser('status', parents=[common], help="Show queue counts, workers and recent failures")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'add':
+        filenames = args.filename + [None] * (len(args.urls) - len(args.filename))
+        options = {'segments': args.segments, 'chunk_encoders': args.chunk_encoders, 'overlap': args.overlap,
+                   'fragments': args.fragments}
+        if args.section:
+            options['section'] = list(args.section)
+        if args.renditions:
+            options['renditions'] = list(args.renditions)
+        with WorkQueue(args.queue) as queue:
+            ids = queue.enqueue_many(zip(args.urls, [args.output] * len(args.urls), filenames), options)
+            print(f"Queued {len(ids)} job(s) ({ids[0]}-{ids[-1]}); {queue.summary()}")
+        return 0
+    if args.command == 'status':
+        with WorkQueue(args.queue) as queue:
+            print_status(queue)
+        return 0
+
+    require_yt_dlp()
+    print(f"Worker: queue {Path(args.queue).resolve()}, {args.processes} process(es), lease {args.lease:g}s, "
+          f"bandwidth {format_rate(args.limit_rate)}")
+    failed = run_workers(args.queue, args.processes, args.name, args.lease, args.poll, args.exit_when_empty,
+                         args.limit_rate)
+    with WorkQueue(args.queue) as queue:
+        print(f"Queue: {queue.summary()}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    # Needed for the worker processes in the frozen (PyInstaller) build
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Renditions
+Several outputs of one video (full quality MP4, 720p, 480p, MP3, ...) from a
+single download and a single ffmpeg decode: the decoded video is split and
+scaled once per rendition, each with its own encoder
+"""
+
+import os
+
+from encode_profile import (AUDIO_TRANSCODE_ARGS, COPY_ARGS, FASTSTART_ARGS, MP3_ARGS, VIDEO_TRANSCODE_ARGS,
+                            build_ffmpeg_command)
+
+# Source for a rendition set: the best streams, H.264/AAC first so 'best' can be copied
+SOURCE_FORMAT = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best'
+AUDIO_SOURCE_FORMAT = 'bestaudio/best'
+
+
+class Rendition:
+    """One output of a rendition set; height None keeps the source size"""
+
+    def __init__(self, name, label, height=None, audio_only=False):
+        self.name = name
+        # The GUI quality preset it matches
+        self.label = label
+        self.height = height
+        self.audio_only = audio_only
+
+    @property
+    def ext(self):
+        return 'mp3' if self.audio_only else 'mp4'
+
+
+RENDITIONS = {rendition.name: rendition for rendition in (
+    Rendition('best', "Best Quality"),
+    Rendition('2160p', "4K (2160p)", 2160),
+    Rendition('1080p', "1080p", 1080),
+    Rendition('720p', "720p", 720),
+    Rendition('480p', "480p", 480),
+    Rendition('mp3', "Audio Only (MP3)", audio_only=True),
+)}
+
+
+def parse_renditions(value):
+    """
+    Rendition names from 'best,720p,mp3' (or a list; GUI labels work too), in the
+    given order without duplicates
+    """
+    items = value.replace(';', ',').split(',') if isinstance(value, str) else list(value or [])
+    by_label = {rendition.label.lower(): name for name, rendition in RENDITIONS.items()}
+    names = []
+    for item in items:
+        item = str(item).strip().lower()
+        if not item:
+            continue
+        name = item if item in RENDITIONS else by_label.get(item)
+        if name is None:
+            raise ValueError(f"unknown rendition {item!r} (choose from {', '.join(RENDITIONS)})")
+        if name not in names:
+            names.append(name)
+    if not names:
+        raise ValueError(f"no renditions given (choose from {', '.join(RENDITIONS)})")
+    return tuple(names)
+
+
+def source_format(names):
+    """yt-dlp format for a rendition set: audio alone when every rendition is audio"""
+    if all(RENDITIONS[name].audio_only for name in names):
+        return AUDIO_SOURCE_FORMAT
+    return SOURCE_FORMAT
+
+
+def rendition_path(base, name):
+    """Output path of a rendition: 'best' and 'mp3' keep the base name, the others add theirs"""
+    rendition = RENDITIONS[name]
+    if rendition.audio_only or rendition.height is None:
+        return f"{base}.{rendition.ext}"
+    return f"{base}.{name}.{rendition.ext}"
+
+
+def encoded_renditions(names, copy_source=False):
+    """Names of the MP4 renditions that are encoded (not stream-copied)"""
+    return [name for name in names
+            if not RENDITIONS[name].audio_only and not (copy_source and RENDITIONS[name].height is None)]
+
+
+def shares_audio_encode(names, copy_source=False, copy_audio=False):
+    """
+    True when the audio track is better encoded to AAC once, before the
+    rendition run (see build_audio_command): more than one MP4 rendition would
+    otherwise run its own AAC encoder over the same audio
+    """
+    return not copy_audio and len(encoded_renditions(names, copy_source)) > 1
+
+
+def build_audio_command(ffmpeg, inputs, path):
+    """ffmpeg command encoding the first audio track of inputs to AAC in path (an .m4a)"""
+    audio = next(stream for stream in inputs if stream['audio'])
+    return build_ffmpeg_command(ffmpeg, [dict(audio, video=False)], path, ['-vn'] + AUDIO_TRANSCODE_ARGS)
+
+
+def build_rendition_command(ffmpeg, inputs, outputs, copy_source=False, copy_audio=False, aac_audio=None):
+    """
+    One ffmpeg command writing every (name, path) of outputs from inputs (see
+    encode_profile.build_ffmpeg_command for their form).
+
+    The first video track is decoded once and split between the renditions
+    that encode it; each is scaled down to its height (never up) and gets its
+    own H.264 encoder. With copy_source (source already H.264/AAC) the
+    source-size rendition is a stream copy and takes no branch of the split.
+    The audio is encoded to AAC at most once: with copy_audio (the source
+    audio already is AAC) every MP4 rendition copies it, and with aac_audio
+    (the path of an AAC encode made by build_audio_command) every MP4
+    rendition copies that file's track. Otherwise the one encoded rendition
+    encodes it. The MP3 is always encoded from the source audio.
+    """
+    cmd = [ffmpeg, '-y', '-hide_banner', '-loglevel', 'error']
+    for stream in inputs:
+        cmd += list(stream.get('input_args', ())) + ['-i', stream['path']]
+    video = next((i for i, s in enumerate(inputs) if s['video']), None)
+    audio = next((i for i, s in enumerate(inputs) if s['audio']), None)
+    mp4_audio = audio
+    if aac_audio is not None:
+        cmd += ['-i', aac_audio]
+        mp4_audio, copy_audio = len(inputs), True
+
+    renditions = [RENDITIONS[name] for name, _ in outputs]
+    if video is None:
+        encoded = []
+    else:
+        encoded = [RENDITIONS[name] for name in encoded_renditions([name for name, _ in outputs], copy_source)]
+    if encoded:
+        graph = []
+        if len(encoded) > 1:
+            splits = ''.join(f'[s{i}]' for i in range(len(encoded)))
+            graph.append(f'[{video}:v:0]split={len(encoded)}{splits}')
+        for i, rendition in enumerate(encoded):
+            source = f'[s{i}]' if len(encoded) > 1 else f'[{video}:v:0]'
+            scale = f"scale=-2:'min(ih,{rendition.height})'" if rendition.height else 'null'
+            graph.append(f'{source}{scale}[v{rendition.name}]')
+        cmd += ['-filter_complex', ';'.join(graph)]
+
+    for rendition, (_, path) in zip(renditions, outputs):
+        if rendition.audio_only:
+            if audio is None:
+                raise ValueError("the source has no audio track for the MP3 rendition")
+            cmd += ['-map', f'{audio}:a:0'] + MP3_ARGS + [path]
+            continue
+        if video is not None:
+            cmd += ['-map', f'[v{rendition.name}]' if rendition in encoded else f'{video}:v:0']
+        if mp4_audio is not None:
+            cmd += ['-map', f'{mp4_audio}:a:0']
+        if rendition in encoded:
+            cmd += VIDEO_TRANSCODE_ARGS + (['-c:a', 'copy'] if copy_audio else AUDIO_TRANSCODE_ARGS)
+        else:
+            cmd += COPY_ARGS
+        cmd += FASTSTART_ARGS + [path]
+    return cmd
+
+
+def rendition_outputs(output, names):
+    """[(name, path)] for a rendition set whose 'best' output would be output"""
+    base = os.path.splitext(output)[0]
+    return [(name, rendition_path(base, name)) for name in names]
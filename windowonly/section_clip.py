@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Section Clips
+Downloads only a time range (START-END) of a video: ffmpeg seeks progressive
+stream URLs itself (byte ranges), DASH fragment lists and HLS media playlists
+are cut down to the fragments that overlap the range before yt-dlp fetches
+them, and only the range is encoded
+"""
+
+import re
+
+# Formats ffmpeg can seek by URL, fetching only what covers the range
+SEEKABLE_PROTOCOLS = ('http', 'https', 'm3u8')
+# Fragment lists cut down to the range and downloaded by yt-dlp (see trim_fragments)
+FRAGMENT_PROTOCOLS = ('http_dash_segments',)
+# Media playlists cut down to the range and downloaded by yt-dlp (see trim_playlist)
+PLAYLIST_PROTOCOLS = ('m3u8_native',)
+
+_TIME = re.compile(r'(?:(?:(\d+):)?(\d+):)?(\d+(?:\.\d+)?)')
+
+
+class SectionError(Exception):
+    """The section does not overlap the video"""
+
+
+def parse_time(text):
+    """Seconds from '90', '1:30', '1:02:03.5'"""
+    match = _TIME.fullmatch(text.strip())
+    if not match:
+        raise ValueError(f"invalid time {text!r} (examples: 90, 1:30, 1:02:03.5)")
+    hours, minutes, seconds = match.groups()
+    return int(hours or 0) * 3600 + int(minutes or 0) * 60 + float(seconds)
+
+
+def parse_section(text):
+    """(start, end) seconds from 'START-END', e.g. '1:30-2:00' or '90-120'"""
+    start, sep, end = str(text).partition('-')
+    if not sep:
+        raise ValueError(f"invalid section {text!r} (START-END, e.g. 1:30-2:00)")
+    start, end = parse_time(start), parse_time(end)
+    if end <= start:
+        raise ValueError(f"section {text!r} ends before it starts")
+    return start, end
+
+
+def format_time(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    text = f"{minutes:02d}:{seconds:06.3f}".rstrip('0').rstrip('.')
+    return f"{hours}:{text}" if hours else text
+
+
+def format_section(section):
+    return f"{format_time(section[0])}-{format_time(section[1])}"
+
+
+def stream_duration(fmt):
+    """Seconds of a fragment-based format from its fragment durations, or None"""
+    fragments = fmt.get('fragments')
+    if not fragments or not isinstance(fragments, list):
+        return None
+    timed = [fragment.get('duration') for fragment in fragments if fragment.get('duration') is not None]
+    return sum(timed) if timed else None
+
+
+def clip_bounds(info, section):
+    """
+    The section limited to the video's length when it is known (from the info
+    dict or the DASH fragment durations); raises SectionError when it starts
+    after the end.
+    """
+    start, end = section
+    duration = info.get('duration')
+    if not duration:
+        durations = [stream_duration(fmt) for fmt in info.get('requested_formats') or [info]]
+        duration = max((d for d in durations if d), default=None)
+    if duration:
+        if start >= duration:
+            raise SectionError(f"section starts at {format_time(start)}, after the end of the video "
+                               f"({format_time(duration)})")
+        end = min(end, duration)
+    return start, end
+
+
+def trim_fragments(fragments, start, end):
+    """
+    The fragments that overlap [start, end) and the start time of the first of
+    them, or None when a media fragment has no duration (the list cannot be
+    placed on the timeline). Fragments before the first timed one (DASH
+    initialization segments) are always kept.
+    """
+    kept, position, first = [], 0.0, None
+    for fragment in fragments:
+        duration = fragment.get('duration')
+        if duration is None:
+            if first is not None or position:
+                return None
+            kept.append(fragment)
+            continue
+        if position + duration > start and position < end:
+            if first is None:
+                first = position
+            kept.append(fragment)
+        position += duration
+        if position >= end:
+            break
+    if first is None:
+        return None
+    return kept, first
+
+
+def trim_playlist(text, start, end):
+    """
+    An HLS media playlist cut to the segments that overlap [start, end) and the
+    start time of the first of them, or None when it cannot be cut safely (live,
+    byte ranges, discontinuities). The key and initialization segment in effect
+    at the first kept segment are repeated before it.
+    """
+    if '#EXT-X-ENDLIST' not in text or '#EXT-X-BYTERANGE' in text or '#EXT-X-DISCONTINUITY' in text:
+        return None
+    header, body, pending, sticky = [], [], [], {}
+    position, first, dropped, duration = 0.0, None, 0, None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line == '#EXT-X-ENDLIST':
+            continue
+        if line.startswith('#EXTINF:'):
+            try:
+                duration = float(line[len('#EXTINF:'):].split(',')[0])
+            except ValueError:
+                return None
+            pending.append(line)
+        elif line.startswith(('#EXT-X-KEY', '#EXT-X-MAP')) and first is None:
+            sticky[line.split(':')[0]] = line
+        elif line.startswith('#'):
+            (pending if duration is not None or body or pending else header).append(line)
+        else:
+            if duration is None:
+                return None
+            if position + duration > start:
+                if first is None:
+                    first = position
+                    body += sticky.values()
+                body += pending + [line]
+            else:
+                dropped += 1
+            pending, position, duration = [], position + duration, None
+            if position >= end:
+                break
+    if first is None:
+        return None
+    # Keys without an IV use the segment's sequence number, so it has to stay right
+    if '#EXT-X-KEY' in text:
+        header = [line for line in header if not line.startswith('#EXT-X-MEDIA-SEQUENCE')]
+        match = re.search(r'#EXT-X-MEDIA-SEQUENCE:(\d+)', text)
+        header.append(f"#EXT-X-MEDIA-SEQUENCE:{(int(match.group(1)) if match else 0) + dropped}")
+    return '\n'.join(header + body + ['#EXT-X-ENDLIST']) + '\n', first
+
+
+def _seek_args(offset, length):
+    return ['-ss', f"{offset:.3f}", '-t', f"{length:.3f}"]
+
+
+def plan_stream(fmt, start, end, path):
+    """
+    How one selected format is clipped, as (ffmpeg input, format to download or None).
+
+    Seekable URLs are read by ffmpeg directly from start to end. A DASH fragment
+    list, or an HLS media playlist passed in fmt['hls_media_playlist_data'], is
+    cut to the fragments covering the range, downloaded to path and seeked from
+    the first kept fragment. Anything else is downloaded whole to path, and
+    still only the range is encoded.
+    """
+    stream = {
+        'video': fmt.get('vcodec') not in (None, 'none'),
+        'audio': fmt.get('acodec') not in (None, 'none'),
+    }
+    protocol = fmt.get('protocol') or 'https'
+    if protocol in SEEKABLE_PROTOCOLS:
+        headers = ''.join(f"{key}: {value}\r\n" for key, value in (fmt.get('http_headers') or {}).items())
+        stream.update(path=fmt['url'],
+                      input_args=(['-headers', headers] if headers else []) + _seek_args(start, end - start))
+        return stream, None
+
+    trimmed = None
+    if protocol in FRAGMENT_PROTOCOLS and isinstance(fmt.get('fragments'), list):
+        trimmed = trim_fragments(fmt['fragments'], start, end)
+        key = 'fragments'
+    elif protocol in PLAYLIST_PROTOCOLS and fmt.get('hls_media_playlist_data'):
+        trimmed = trim_playlist(fmt['hls_media_playlist_data'], start, end)
+        key = 'hls_media_playlist_data'
+    if trimmed is not None:
+        kept, first = trimmed
+        fmt = dict(fmt, **{key: kept})
+        fmt.pop('filesize', None)
+        offset = start - first
+    else:
+        offset = start
+    stream.update(path=path, input_args=_seek_args(max(0.0, offset), end - start))
+    return stream, fmt
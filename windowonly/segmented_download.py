@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Segmented HTTP Downloads
+Fetches one progressive/audio stream over several connections (byte ranges)
+written into a preallocated file, to get past per-connection throttling
+"""
+
+import json
+import os
+import threading
+import time
+
+from yt_dlp import downloader as yt_downloader
+from yt_dlp.downloader.http import HttpFD
+from yt_dlp.networking import Request
+from yt_dlp.networking.exceptions import RequestError, TransportError
+
+from download_engine import DEFAULT_SEGMENTS, MAX_SEGMENTS  # noqa: F401  (re-exported)
+
+# Smaller files are not split (a range request costs a round-trip of its own)
+MIN_SEGMENT_SIZE = 1024 * 1024
+BLOCK_SIZE = 64 * 1024
+# Seconds between progress reports (and resume-state saves)
+REPORT_INTERVAL = 0.25
+
+
+class SegmentedHttpFD(HttpFD):
+    """
+    HttpFD that splits a download into params['segments'] byte ranges.
+
+    The size and range support are probed with a 'Range: bytes=0-0' request;
+    anything without both (or small files, or segments <= 1) falls back to the
+    plain single-connection HttpFD. Each range is fetched on its own thread and
+    written at its offset in the .part file; a failed range retries from the
+    last byte it wrote (params['retries'] failures in a row end the download). Per-range positions are saved next to the .part file,
+    so an interrupted download resumes every range where it stopped (also when
+    segments is 1 by then); a preallocated .part file that cannot be resumed is
+    removed before falling back to HttpFD, which would take it for complete.
+    Progress reports carry 'contiguous_bytes', the prefix of the .part file that
+    is fully written (for readers of the growing file, see growing_feed); the
+    first report comes before the file is preallocated.
+    """
+
+    def real_download(self, filename, info_dict):
+        segments = min(int(self.params.get('segments') or 1), MAX_SEGMENTS)
+        tmpfilename = self.temp_name(filename)
+        state_path = f"{tmpfilename}.segments"
+        resumable = os.path.isfile(state_path)
+        if (segments > 1 or resumable) and not self.params.get('test') and not info_dict.get('request_data'):
+            size = self._probe_size(info_dict)
+            if size and resumable and self._load_state(state_path, tmpfilename, size):
+                # An interrupted segmented download continues its ranges, whatever the segment count now
+                return self._download_segments(filename, info_dict, size, segments)
+            if segments > 1 and size and size >= 2 * MIN_SEGMENT_SIZE:
+                return self._download_segments(filename, info_dict, size,
+                                               min(segments, size // MIN_SEGMENT_SIZE))
+        if resumable:
+            self._discard_preallocated(tmpfilename, state_path)
+        return super().real_download(filename, info_dict)
+
+    def _discard_preallocated(self, tmpfilename, state_path):
+        """
+        Remove a segmented .part file that cannot be resumed here: it is
+        preallocated to full size, so the stock HttpFD would take the zeros
+        between the ranges for a finished download
+        """
+        self.to_screen("[download] Segmented .part file cannot be resumed; starting over")
+        self.try_remove(tmpfilename)
+        self.try_remove(state_path)
+
+    def _request(self, info_dict, start, end):
+        headers = dict(info_dict.get('http_headers') or {})
+        headers.update({'Accept-Encoding': 'identity', 'Range': f'bytes={start}-{end}'})
+        extensions = {}
+        impersonate_target = self._get_impersonate_target(info_dict)
+        if impersonate_target is not None:
+            extensions['impersonate'] = impersonate_target
+        return self.ydl.urlopen(Request(info_dict['url'], headers=headers, extensions=extensions))
+
+    def _probe_size(self, info_dict):
+        """Total size if the server honors range requests, else None"""
+        try:
+            response = self._request(info_dict, 0, 0)
+        except RequestError:
+            return None
+        try:
+            content_range = response.headers.get('Content-Range') or ''
+            if response.status != 206 or '/' not in content_range:
+                return None
+            total = content_range.rsplit('/', 1)[1]
+            return int(total) if total.isdigit() else None
+        finally:
+            response.close()
+
+    @staticmethod
+    def _contiguous(ranges, positions):
+        """Bytes from the start of the file that are written without a gap"""
+        for (_, end), position in zip(ranges, positions):
+            if position <= end:
+                return position
+        return ranges[-1][1] + 1
+
+    @staticmethod
+    def _split(size, segments):
+        """[start, end] (inclusive) byte ranges covering size"""
+        step = -(-size // segments)
+        return [[start, min(start + step, size) - 1] for start in range(0, size, step)]
+
+    def _load_state(self, state_path, tmpfilename, size):
+        """Saved per-range positions for a resumable .part file, or None"""
+        if not self.params.get('continuedl', True) or not os.path.isfile(tmpfilename):
+            return None
+        try:
+            with open(state_path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('size') != size or os.path.getsize(tmpfilename) != size:
+            return None
+        return state.get('ranges'), state.get('positions')
+
+    @staticmethod
+    def _save_state(state_path, size, ranges, positions):
+        with open(f"{state_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({'size': size, 'ranges': ranges, 'positions': positions}, f)
+        os.replace(f"{state_path}.tmp", state_path)
+
+    def _download_segments(self, filename, info_dict, size, segments):
+        tmpfilename = self.temp_name(filename)
+        state_path = f"{tmpfilename}.segments"
+        chunk_size = (self.params.get('http_chunk_size')
+                      or (info_dict.get('downloader_options') or {}).get('http_chunk_size') or 0)
+        retries = self.params.get('retries', 10)
+        # Shared bandwidth limit (see bandwidth): each range thread pays for the blocks it reads
+        bandwidth_job = self.params.get('bandwidth_job')
+
+        saved = self._load_state(state_path, tmpfilename, size)
+        if saved:
+            ranges, positions = saved
+            self.report_resuming_byte(sum(p - r[0] for r, p in zip(ranges, positions)))
+        else:
+            ranges = self._split(size, segments)
+            positions = [start for start, _ in ranges]
+            # Readers of the growing file must not take the preallocated zeros for data
+            self._hook_progress({
+                'status': 'downloading',
+                'downloaded_bytes': 0,
+                'total_bytes': size,
+                'contiguous_bytes': 0,
+                'tmpfilename': tmpfilename,
+                'filename': filename,
+            }, info_dict)
+            # Preallocate so every range can write at its own offset; the state file is
+            # written with it, so a full-size .part file always comes with its ranges
+            with open(tmpfilename, 'wb') as f:
+                f.truncate(size)
+            self._save_state(state_path, size, ranges, positions)
+
+        self.report_destination(filename)
+        self.to_screen(f"[download] Fetching {len(ranges)} ranges in parallel")
+        stop = threading.Event()
+        finished = threading.Event()
+        remaining = [len(ranges)]
+        lock = threading.Lock()
+        errors = []
+
+        def fetch(index):
+            try:
+                fetch_range(index)
+            except Exception as err:
+                errors.append(err)
+                stop.set()
+            finally:
+                with lock:
+                    remaining[0] -= 1
+                    if not remaining[0]:
+                        finished.set()
+
+        def fetch_range(index):
+            start_end = ranges[index]
+            count = 0
+            with open(tmpfilename, 'r+b') as f:
+                while positions[index] <= start_end[1] and not stop.is_set():
+                    end = start_end[1]
+                    if chunk_size:
+                        # Sites like YouTube throttle requests larger than their chunk size
+                        end = min(end, positions[index] + chunk_size - 1)
+                    attempt_start = positions[index]
+                    try:
+                        response = self._request(info_dict, positions[index], end)
+                        if response.status != 206:
+                            raise TransportError(f'Range request answered with HTTP {response.status}')
+                        f.seek(positions[index])
+                        try:
+                            while not stop.is_set():
+                                block = response.read(BLOCK_SIZE)
+                                if not block:
+                                    break
+                                f.write(block)
+                                # On disk before the position (and contiguous_bytes) moves past it
+                                f.flush()
+                                positions[index] += len(block)
+                                if bandwidth_job is not None:
+                                    bandwidth_job.consume(len(block))
+                        finally:
+                            response.close()
+                        if positions[index] <= end and not stop.is_set():
+                            raise TransportError(f'Range {index} ended early at byte {positions[index]}')
+                    except (RequestError, OSError) as err:
+                        # Retries count failures in a row; an attempt that made progress starts over
+                        count = 1 if positions[index] > attempt_start else count + 1
+                        if count > retries:
+                            raise
+                        self.report_retry(err, count, retries, frag_index=index + 1, fatal=False)
+
+        threads = [threading.Thread(target=fetch, args=(i,), daemon=True) for i in range(len(ranges))]
+        start_time = time.time()
+        start_bytes = sum(p - r[0] for r, p in zip(ranges, positions))
+        for t in threads:
+            t.start()
+
+        try:
+            while not finished.wait(REPORT_INTERVAL):
+                downloaded = sum(p - r[0] for r, p in zip(ranges, positions))
+                self._save_state(state_path, size, ranges, positions)
+                elapsed = time.time() - start_time
+                speed = self.calc_speed(start_time, time.time(), downloaded - start_bytes)
+                # Progress hooks run here, so a hook raising (e.g. a stop request) ends the download
+                self._hook_progress({
+                    'status': 'downloading',
+                    'downloaded_bytes': downloaded,
+                    'total_bytes': size,
+                    'contiguous_bytes': self._contiguous(ranges, positions),
+                    'tmpfilename': tmpfilename,
+                    'filename': filename,
+                    'bandwidth_charged': bandwidth_job is not None,
+                    'elapsed': elapsed,
+                    'speed': speed,
+                    'eta': self.calc_eta(speed, size - downloaded),
+                }, info_dict)
+        finally:
+            stop.set()
+            for t in threads:
+                t.join()
+
+        if errors or any(p <= end for p, (_, end) in zip(positions, ranges)):
+            self.report_error(f'Segmented download failed: {errors[0] if errors else "incomplete ranges"}')
+            return False
+
+        self.try_remove(state_path)
+        self.try_rename(tmpfilename, filename)
+        self._hook_progress({
+            'status': 'finished',
+            'downloaded_bytes': size,
+            'total_bytes': size,
+            'filename': filename,
+            'elapsed': time.time() - start_time,
+        }, info_dict)
+        return True
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install():
+    """
+    Route plain http/https downloads through SegmentedHttpFD.
+
+    yt-dlp picks downloaders from a process-wide protocol map, so this affects
+    every YoutubeDL instance; those without params['segments'] > 1 behave exactly
+    like the stock HttpFD.
+    """
+    global _installed
+    with _install_lock:
+        if not _installed:
+            yt_downloader.PROTOCOL_MAP['http'] = SegmentedHttpFD
+            yt_downloader.PROTOCOL_MAP['https'] = SegmentedHttpFD
+            _installed = True
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Streaming Output
+ffmpeg reads the selected formats straight from their URLs and writes fragmented
+MP4 to a pipe, so the result reaches the client (or stdout) while it is produced,
+without downloading or writing any file first
+"""
+
+import subprocess
+import threading
+import time
+from collections import deque
+
+from encode_profile import ENCODE_STATS, build_ffmpeg_command, choose_encode_args, streaming_args
+from job_metrics import JobTimer, PHASE_EXTRACT, PHASE_ENCODE
+
+CHUNK_SIZE = 64 * 1024
+# Formats ffmpeg can open by URL; fragment-based DASH etc. need the regular download flow
+STREAMABLE_PROTOCOLS = ('http', 'https', 'm3u8', 'm3u8_native')
+
+
+class NotStreamable(Exception):
+    """The extracted video cannot be streamed; use the regular download flow"""
+
+
+class StreamError(Exception):
+    """ffmpeg failed while streaming"""
+
+
+def stream_inputs(info):
+    """ffmpeg inputs (URL, request headers) for the formats yt-dlp selected"""
+    inputs = []
+    for fmt in info.get('requested_formats') or [info]:
+        protocol = fmt.get('protocol') or 'https'
+        if protocol not in STREAMABLE_PROTOCOLS:
+            raise NotStreamable(f"format {fmt.get('format_id')} uses {protocol}")
+        headers = ''.join(f"{key}: {value}\r\n" for key, value in (fmt.get('http_headers') or {}).items())
+        inputs.append({
+            'path': fmt['url'],
+            'input_args': ['-headers', headers] if headers else [],
+            'video': fmt.get('vcodec') not in (None, 'none'),
+            'audio': fmt.get('acodec') not in (None, 'none'),
+        })
+    return inputs
+
+
+class EncodeStream:
+    """
+    One ffmpeg run writing fragmented MP4 to its stdout.
+
+    Iterating yields the output in chunks as soon as ffmpeg produces them and
+    raises StreamError if ffmpeg fails. Closing early (the client went away)
+    kills ffmpeg. The job timer gets the encode phase, output bytes and first-byte time.
+    """
+
+    def __init__(self, info, ffmpeg=None, timer=None, metrics=None, chunk_size=CHUNK_SIZE):
+        self.encode_path, args, _ = choose_encode_args(info)
+        self.timer = timer or JobTimer(info.get('webpage_url'))
+        self.metrics = metrics
+        self.chunk_size = chunk_size
+        self.bytes = 0
+        self._duration = info.get('duration')
+        self._stderr = deque(maxlen=20)
+        cmd = build_ffmpeg_command(ffmpeg or 'ffmpeg', stream_inputs(info), 'pipe:1', streaming_args(args))
+        self.timer.enter(PHASE_ENCODE)
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE)
+        # Drained on a thread so a chatty ffmpeg never blocks on a full stderr pipe
+        threading.Thread(target=self._drain_stderr, daemon=True).start()
+
+    def _drain_stderr(self):
+        for line in self.proc.stderr:
+            self._stderr.append(line.decode('utf-8', 'replace').rstrip())
+
+    def __iter__(self):
+        status, error = 'stopped', None
+        try:
+            while True:
+                chunk = self.proc.stdout.read1(self.chunk_size)
+                if not chunk:
+                    break
+                if self.timer.first_byte is None:
+                    self.timer.first_byte = time.monotonic() - self.timer.started
+                self.bytes += len(chunk)
+                yield chunk
+            if self.proc.wait() != 0:
+                status = 'failed'
+                error = '\n'.join(self._stderr)[-500:] or f"ffmpeg exited with {self.proc.returncode}"
+                raise StreamError(error)
+            status = 'done'
+        finally:
+            self._finish(status, error)
+            self.close()
+
+    def _finish(self, status, error):
+        if self.timer.ended is not None:
+            return
+        self.timer.add(PHASE_ENCODE, 0, self.bytes)
+        self.timer.finish(status, encode_path=self.encode_path, media_seconds=self._duration, error=error)
+        if status == 'done':
+            ENCODE_STATS.record(self.encode_path)
+        if self.metrics is not None:
+            self.metrics.emit(self.timer)
+
+    def close(self):
+        """Stop ffmpeg if it is still running (safe to call more than once)"""
+        if self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+        self.proc.stdout.close()
+        self._finish('stopped', None)
+
+
+def open_stream(session, url, ffmpeg=None, metrics=None):
+    """
+    Extract url on a DownloadSession and start its EncodeStream.
+
+    Anything that fails before output starts (extraction, unsupported formats,
+    starting ffmpeg) raises here, while the caller can still answer with an error.
+    Returns (info, stream).
+    """
+    timer = JobTimer(url)
+    timer.enter(PHASE_EXTRACT)
+    try:
+        info = session.extract(url)
+        if info.get('_type', 'video') != 'video':
+            raise NotStreamable("playlists cannot be streamed")
+        return info, EncodeStream(info, ffmpeg, timer=timer, metrics=metrics)
+    except Exception as e:
+        timer.finish('failed', error=str(e))
+        if metrics is not None:
+            metrics.emit(timer)
+        raise
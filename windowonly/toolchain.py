@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Toolchain Probe
+Finds ffmpeg (the imageio-ffmpeg bundled binary first, then PATH) and reads its
+version and encoders once; the result is cached on disk keyed by the binary's
+path, size and mtime, so later starts neither import imageio-ffmpeg nor run ffmpeg
+"""
+
+import importlib.util
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+
+from media_cache import cache_root
+
+CACHE_NAME = 'toolchain.json'
+# Encoders the H.264/AAC transcode and the MP3 preset rely on
+REQUIRED_ENCODERS = ('libx264', 'aac')
+CHECKED_ENCODERS = REQUIRED_ENCODERS + ('libmp3lame',)
+
+SOURCE_BUNDLED = 'bundled'
+SOURCE_SYSTEM = 'system'
+
+_lock = threading.Lock()
+_probed = []  # in-process result, [Toolchain or None] once probed
+
+
+class Toolchain:
+    """ffmpeg binary, where it came from, its version and which checked encoders it has"""
+
+    def __init__(self, path, source, version=None, encoders=(), size=None, mtime_ns=None):
+        self.path = path
+        self.source = source
+        self.version = version
+        self.encoders = list(encoders)
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    @property
+    def missing_encoders(self):
+        return [name for name in REQUIRED_ENCODERS if name not in self.encoders]
+
+    def as_dict(self):
+        return {'path': self.path, 'source': self.source, 'version': self.version,
+                'encoders': self.encoders, 'size': self.size, 'mtime_ns': self.mtime_ns}
+
+
+def locate_ffmpeg():
+    """(path, source) of the ffmpeg to use, or (None, None)"""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe(), SOURCE_BUNDLED
+    except (ImportError, RuntimeError):
+        pass
+    path = shutil.which('ffmpeg')
+    return (path, SOURCE_SYSTEM) if path else (None, None)
+
+
+def _run(path, *args):
+    try:
+        return subprocess.run([path, '-hide_banner', *args], capture_output=True, text=True,
+                              errors='replace', timeout=30).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return ''
+
+
+def _inspect(path, source):
+    """Run the binary for its version and encoder list"""
+    stat = os.stat(path)
+    match = re.search(r'ffmpeg version (\S+)', _run(path, '-version'))
+    listed = set(re.findall(r'^\s*[VAS][\w.]{5}\s+(\S+)', _run(path, '-encoders'), re.MULTILINE))
+    return Toolchain(path, source, match.group(1) if match else None,
+                     [name for name in CHECKED_ENCODERS if name in listed], stat.st_size, stat.st_mtime_ns)
+
+
+def _load_cached():
+    """The cached probe if its binary is unchanged and would still be picked, else None"""
+    try:
+        with open(cache_root() / CACHE_NAME, encoding='utf-8') as f:
+            tools = Toolchain(**json.load(f))
+        stat = os.stat(tools.path)
+    except (OSError, ValueError, TypeError):
+        return None
+    if (stat.st_size, stat.st_mtime_ns) != (tools.size, tools.mtime_ns):
+        return None
+    # A system ffmpeg was cached, but imageio-ffmpeg has been installed since (found without importing it)
+    if tools.source == SOURCE_SYSTEM and importlib.util.find_spec('imageio_ffmpeg') is not None:
+        return None
+    return tools
+
+
+def _store(tools):
+    path = cache_root() / CACHE_NAME
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(tools.as_dict(), f)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # the probe simply runs again next time
+
+
+def probe(refresh=False):
+    """Toolchain for this machine (None when no ffmpeg is found); probed at most once per process"""
+    with _lock:
+        if _probed and not refresh:
+            return _probed[0]
+        tools = None if refresh else _load_cached()
+        if tools is None:
+            path, source = locate_ffmpeg()
+            if path:
+                try:
+                    tools = _inspect(path, source)
+                except OSError:
+                    tools = None
+                if tools is not None:
+                    _store(tools)
+        _probed[:] = [tools]
+        return tools
+
+
+def ffmpeg_path():
+    """Path of the ffmpeg binary, or None to let yt-dlp search PATH itself"""
+    tools = probe()
+    return tools.path if tools else None
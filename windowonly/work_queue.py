@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Work Queue
+Shared SQLite job queue for worker processes on one or more machines: workers
+lease jobs, renew the lease while they run and report the result; a job whose
+worker stopped renewing (crashed, killed, lost its node) is queued again
+"""
+
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+QUEUE_NAME = 'ydownloader-queue.sqlite3'
+
+STATE_QUEUED = 'queued'
+STATE_LEASED = 'leased'
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+STATES = (STATE_QUEUED, STATE_LEASED, STATE_DONE, STATE_FAILED)
+
+# Seconds a lease lasts without a heartbeat; workers renew it every third of that
+LEASE_SECONDS = 30.0
+# Leases a job may take (expired ones included) before it is given up as failed
+MAX_ATTEMPTS = 3
+
+
+def worker_name():
+    """Default worker name: host and process ID"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseLost(Exception):
+    """The job's lease expired and it was queued again (or taken by another worker)"""
+
+
+class WorkQueue:
+    """
+    Jobs in a SQLite file that every worker opens: one row per download with
+    its URL, output directory, filename and download options.
+
+    claim() leases the oldest queued job to a worker in one write transaction,
+    so two workers never get the same job. The lease runs out after lease
+    seconds unless heartbeat() renews it; claim() first returns expired leases
+    to the queue (or fails them after MAX_ATTEMPTS), so a dead worker's job is
+    picked up by the next worker that asks for work. complete() and fail() only
+    apply while the caller still holds the lease.
+
+    The rollback journal (not WAL) is used so the file also works on a shared
+    network drive, as long as the share supports file locking; queue writes are
+    one per job step, far too few for the journal mode to matter.
+    """
+
+    def __init__(self, path=QUEUE_NAME, lease=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.path = Path(path)
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit; write transactions are opened explicitly with BEGIN IMMEDIATE
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        with self._write():
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT NOT NULL,
+                    output_path TEXT NOT NULL,
+                    filename TEXT,
+                    options TEXT NOT NULL DEFAULT '{}',
+                    state TEXT NOT NULL,
+                    worker TEXT,
+                    lease_until REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    output TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )''')
+            self._db.execute('CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id)')
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS workers (
+                    name TEXT PRIMARY KEY,
+                    job_id INTEGER,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    started_at REAL NOT NULL,
+                    seen_at REAL NOT NULL
+                )''')
+
+    @contextlib.contextmanager
+    def _write(self):
+        """One write transaction, locked before its first read so concurrent claims cannot deadlock"""
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+
+    def enqueue(self, url, output_path, filename=None, options=None):
+        """Add a download; returns its job ID"""
+        return self.enqueue_many([(url, output_path, filename)], options)[0]
+
+    def enqueue_many(self, items, options=None):
+        """Add (url, output_path, filename) downloads sharing one option set; returns their job IDs"""
+        now = time.time()
+        options = json.dumps(options or {}, sort_keys=True)
+        ids = []
+        with self._write() as db:
+            for url, output_path, filename in items:
+                cursor = db.execute(
+                    'INSERT INTO jobs (url, output_path, filename, options, state, created_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (str(url), str(Path(output_path).resolve()), filename or None, options, STATE_QUEUED, now))
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def _recover(self, db, now):
+        """Queue expired leases again; those out of attempts fail. Returns the IDs requeued"""
+        expired = db.execute('SELECT id, attempts, worker FROM jobs WHERE state = ? AND lease_until < ?',
+                             (STATE_LEASED, now)).fetchall()
+        requeued = []
+        for row in expired:
+            if row['attempts'] >= self.max_attempts:
+                db.execute('UPDATE jobs SET state = ?, worker = NULL, lease_until = NULL, error = ?, '
+                           'finished_at = ? WHERE id = ?',
+                           (STATE_FAILED, f"lease expired {row['attempts']} times (last worker {row['worker']})",
+                            now, row['id']))
+            else:
+                db.execute('UPDATE jobs SET state = ?, worker = NULL, lease_until = NULL WHERE id = ?',
+                           (STATE_QUEUED, row['id']))
+                requeued.append(row['id'])
+        return requeued
+
+    def recover(self):
+        """Return expired leases to the queue now (claim() does this too); returns the IDs requeued"""
+        with self._write() as db:
+            return self._recover(db, time.time())
+
+    def claim(self, worker):
+        """Lease the oldest queued job to worker; the job as a dict, or None when nothing is queued"""
+        now = time.time()
+        with self._write() as db:
+            self._recover(db, now)
+            row = db.execute('SELECT id FROM jobs WHERE state = ? ORDER BY id LIMIT 1', (STATE_QUEUED,)).fetchone()
+            job_id = row['id'] if row else None
+            if job_id is not None:
+                db.execute('UPDATE jobs SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1, '
+                           'started_at = ?, error = NULL WHERE id = ?',
+                           (STATE_LEASED, worker, now + self.lease, now, job_id))
+            self._touch(db, worker, job_id, now)
+        return self.get(job_id) if job_id is not None else None
+
+    def heartbeat(self, job_id, worker):
+        """Renew worker's lease on a job; raises LeaseLost if it no longer holds it"""
+        now = time.time()
+        with self._write() as db:
+            held = db.execute('UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND state = ?',
+                              (now + self.lease, job_id, worker, STATE_LEASED)).rowcount
+            self._touch(db, worker, job_id if held else None, now)
+        if not held:
+            raise LeaseLost(f"job {job_id} is no longer leased to {worker}")
+
+    def complete(self, job_id, worker, output=None):
+        self._finish(job_id, worker, STATE_DONE, output=output)
+
+    def fail(self, job_id, worker, error, retry=False):
+        """Record a failed run; with retry (and attempts left) the job is queued again instead"""
+        self._finish(job_id, worker, STATE_FAILED, error=str(error), retry=retry)
+
+    def release(self, job_id, worker):
+        """Give a job back to the queue unfinished (the worker is shutting down); not counted as an attempt"""
+        with self._write() as db:
+            held = db.execute('UPDATE jobs SET state = ?, worker = NULL, lease_until = NULL, '
+                              'attempts = MAX(0, attempts - 1) WHERE id = ? AND worker = ? AND state = ?',
+                              (STATE_QUEUED, job_id, worker, STATE_LEASED)).rowcount
+            self._touch(db, worker, None, time.time())
+        return bool(held)
+
+    def _finish(self, job_id, worker, state, output=None, error=None, retry=False):
+        now = time.time()
+        with self._write() as db:
+            row = db.execute('SELECT attempts FROM jobs WHERE id = ? AND worker = ? AND state = ?',
+                             (job_id, worker, STATE_LEASED)).fetchone()
+            if row is None:
+                raise LeaseLost(f"job {job_id} is no longer leased to {worker}")
+            if state == STATE_FAILED and retry and row['attempts'] < self.max_attempts:
+                db.execute('UPDATE jobs SET state = ?, worker = NULL, lease_until = NULL, error = ? WHERE id = ?',
+                           (STATE_QUEUED, error, job_id))
+            else:
+                db.execute('UPDATE jobs SET state = ?, lease_until = NULL, output = ?, error = ?, finished_at = ? '
+                           'WHERE id = ?', (state, output, error, now, job_id))
+            column = 'done' if state == STATE_DONE else 'failed'
+            self._touch(db, worker, None, now)
+            db.execute(f'UPDATE workers SET {column} = {column} + 1 WHERE name = ?', (worker,))
+
+    def _touch(self, db, worker, job_id, now):
+        db.execute('INSERT INTO workers (name, job_id, started_at, seen_at) VALUES (?, ?, ?, ?) '
+                   'ON CONFLICT (name) DO UPDATE SET job_id = excluded.job_id, seen_at = excluded.seen_at',
+                   (worker, job_id, now, now))
+
+    def get(self, job_id):
+        """A job as a dict (options decoded), or None"""
+        with self._lock:
+            row = self._db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['options'] = json.loads(job['options'] or '{}')
+        return job
+
+    def counts(self):
+        """Number of jobs per state"""
+        with self._lock:
+            return dict(self._db.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+
+    def pending(self):
+        """Jobs still queued or leased"""
+        counts = self.counts()
+        return counts.get(STATE_QUEUED, 0) + counts.get(STATE_LEASED, 0)
+
+    def workers(self, since=None):
+        """Workers that reported after since (default: within two leases), newest first"""
+        since = time.time() - 2 * self.lease if since is None else since
+        with self._lock:
+            rows = self._db.execute('SELECT * FROM workers WHERE seen_at >= ? ORDER BY seen_at DESC',
+                                    (since,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def jobs(self, state=None, limit=100):
+        """Most recent jobs (optionally in one state) as dicts"""
+        query, params = 'SELECT * FROM jobs', ()
+        if state:
+            query, params = query + ' WHERE state = ?', (state,)
+        with self._lock:
+            rows = self._db.execute(query + ' ORDER BY id DESC LIMIT ?', params + (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def summary(self):
+        counts = self.counts()
+        return ", ".join(f"{state} {counts.get(state, 0)}" for state in STATES)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,774 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Downloader Session
+Long-lived yt-dlp instance reused across the items of a batch
+"""
+
+import contextlib
+import glob
+import os
+import re
+import subprocess
+import threading
+import time
+
+import yt_dlp
+
+from encode_profile import (ENCODE_STATS, PATH_CACHED, PATH_TRANSCODE, PATH_RENDITIONS, COPY_ARGS, TRANSCODE_ARGS,
+                            IPHONE_AUDIO_CODECS, apply_merger_args, build_ffmpeg_command, choose_encode_args,
+                            is_iphone_compatible, stream_codecs)
+from section_clip import PLAYLIST_PROTOCOLS, SectionError, clip_bounds, format_section, plan_stream
+from renditions import (RENDITIONS, build_audio_command, build_rendition_command, rendition_outputs,
+                        shares_audio_encode)
+from chunked_encode import MIN_CHUNKED_SECONDS, transcode_merged
+from growing_feed import FeedServer, GrowingFile, FeedFailed
+from playlist_stream import Entry
+from bandwidth import DEFAULT_WEIGHT, THROTTLED_BLOCK_SIZE
+from cancellation import JobCancelled
+from media_cache import MediaCache
+from job_journal import STATE_QUEUED, STATE_DOWNLOADING, STATE_ENCODING, STATE_DONE, STATE_FAILED, job_profile
+from job_metrics import JobTimer, PHASE_EXTRACT, PHASE_ENCODE, probe_duration, stream_phase
+import segmented_download
+import adaptive_fragments
+import cancellation
+
+# Postprocessors that count as the encoding step of an item
+_ENCODE_POSTPROCESSORS = ('Merger', 'ExtractAudio')
+# An overlapped encode starts on the streams as they arrive only if they are not
+# all in after this long: on a fast link reading them early gains nothing
+OVERLAP_PROBE_SECONDS = 1.0
+# Files a cancelled item keeps unless its handle discards them: partial downloads
+# (.part, segment state) and finished stream files, which a re-run picks up again
+_RESUMABLE = re.compile(r'(\.part(-Frag\d+)?|\.part\.segments|\.ytdl|\.f[^.]+\.\w+)$')
+
+
+class DownloadSession:
+    """
+    Wrap one yt_dlp.YoutubeDL for many downloads.
+
+    Extractor instances, the cookie jar and the HTTP connection pool are set up
+    once and reused, so items after the first skip that setup and its TLS handshakes.
+    The output template and progress hook are swapped per item.
+    Connections are kept alive by yt-dlp's "requests" handler, which is used
+    whenever the requests package is installed; requirements.txt asks for
+    "yt-dlp[default]" for it. Without it (urllib) every request opens a new
+    connection and only the setup is saved.
+    A session is not thread-safe: use one per worker thread (see SessionPool).
+    With a job journal, every item's state and byte offset are recorded as it runs.
+    With opts['segments'] > 1, plain HTTP streams are fetched over that many
+    connections (see segmented_download).
+    With opts['adaptive_fragments'], DASH/HLS fragments are fetched on a window
+    of parallel requests sized by measured throughput, up to
+    opts['concurrent_fragment_downloads'] (see adaptive_fragments).
+    With opts['chunk_encoders'] > 1, long videos that need a transcode are merged
+    by stream copy and then encoded in chunks on that many ffmpeg processes
+    (see chunked_encode).
+    With opts['overlap_encode'], a transcode reads the streams while they are
+    still downloading, side by side (see growing_feed), instead of after both,
+    unless they all arrive within OVERLAP_PROBE_SECONDS.
+    Every item is timed per phase (last_timer); finished timers go to metrics.emit.
+    With a bandwidth manager, every item is a job drawing from its bucket (see
+    bandwidth); the item's weight sets its share while others run beside it.
+    An item given a JobHandle stops as soon as the handle is cancelled: its
+    ffmpeg processes are killed, it raises JobCancelled and removes the files
+    it left half-written (see cancellation).
+    An item given a section (start, end) fetches and encodes only that time
+    range (see section_clip).
+    """
+
+    def __init__(self, opts, cache=None, metadata=None, journal=None, metrics=None, bandwidth=None):
+        opts = dict(opts)
+        opts['progress_hooks'] = list(opts.get('progress_hooks') or []) + [self._dispatch_progress]
+        opts['postprocessor_hooks'] = list(opts.get('postprocessor_hooks') or []) + [self._dispatch_postprocessor]
+        if (opts.get('segments') or 1) > 1:
+            segmented_download.install()
+        if opts.get('adaptive_fragments'):
+            adaptive_fragments.install()
+        cancellation.install()
+        self._item_hook = None
+        self._job = None
+        self._timer = None
+        self.last_timer = None
+        # Output path of the last item that finished (None for playlists), and every
+        # file it wrote (one per rendition)
+        self.last_output = None
+        self.last_outputs = []
+        # Stream files of an overlapped download by path, and its abort signal
+        self._feeds = None
+        self._abort = threading.Event()
+        # The item's cancellation handle, its output path without extension and start time
+        self._handle = None
+        self._scope = contextlib.ExitStack()
+        self._base = None
+        self._started = None
+        self.items = 0
+        self.cache = cache
+        self.metadata = metadata
+        self.journal = journal
+        self.metrics = metrics
+        self.bandwidth = bandwidth
+        self._bandwidth_job = None
+        # Read sizes to go back to when an item runs unthrottled
+        self._block_params = {key: opts.get(key) for key in ('buffersize', 'noresizebuffer')}
+        self.ydl = yt_dlp.YoutubeDL(opts)
+
+    def _dispatch_progress(self, d):
+        if self._handle is not None:
+            self._handle.check()
+        if self.journal is not None and self._job:
+            url, outtmpl, profile = self._job
+            self.journal.progress(url, outtmpl, d, profile=profile)
+        if self._bandwidth_job is not None and not d.get('bandwidth_charged'):
+            # Blocking here holds the downloader until the bytes it just read are paid for
+            self._bandwidth_job.progress(d)
+        if self._feeds is not None:
+            # Overlapped streams arrive together and time themselves (see _download_overlapped)
+            feed = self._feeds.get(d.get('filename'))
+            if feed is not None:
+                feed.progress(d)
+            if self._abort.is_set():
+                raise yt_dlp.utils.DownloadCancelled("Download stopped, the encode has ended")
+        elif self._timer is not None:
+            self._timer.on_progress(d)
+        if self._item_hook:
+            self._item_hook(d)
+
+    def _dispatch_postprocessor(self, d):
+        if d.get('postprocessor') not in _ENCODE_POSTPROCESSORS:
+            return
+        if d['status'] == 'started':
+            if self._timer is not None:
+                self._timer.enter(PHASE_ENCODE)
+            self._record(STATE_ENCODING)
+        elif d['status'] == 'finished' and self._timer is not None:
+            self._timer.enter(None)
+
+    def job_profile(self, renditions=None, section=None):
+        """The item's profile in the journal: this session's format plus the request's (see job_journal)"""
+        return job_profile(self.ydl.params.get('format'), renditions, section)
+
+    def _begin(self, url, outtmpl, progress_hook, weight=DEFAULT_WEIGHT, handle=None, profile=''):
+        if handle is not None:
+            handle.check()
+            # Processes yt-dlp starts on this thread (the merger) belong to the item
+            self._scope.enter_context(handle.active())
+        self._handle = handle
+        self._base = None
+        self._started = time.time()
+        self.last_output = None
+        self.last_outputs = []
+        self.ydl.params['outtmpl']['default'] = outtmpl
+        self._item_hook = progress_hook
+        if self.bandwidth is not None:
+            self._bandwidth_job = self.bandwidth.job(url, weight)
+            # Read by segmented_download, whose range threads pay per block
+            self.ydl.params['bandwidth_job'] = self._bandwidth_job
+            if self.bandwidth.limited:
+                self.ydl.params.update(buffersize=THROTTLED_BLOCK_SIZE, noresizebuffer=True)
+            else:
+                self.ydl.params.update(self._block_params)
+        self._job = (url, outtmpl, profile)
+        self._timer = self.last_timer = JobTimer(url)
+        self._timer.enter(PHASE_EXTRACT)
+        self._record(STATE_DOWNLOADING)
+
+    def _record(self, state, output=None, error=None):
+        if self.journal is not None and self._job:
+            url, outtmpl, profile = self._job
+            self.journal.mark(url, outtmpl, state, output=output, error=error, profile=profile)
+
+    def _record_failure(self, error):
+        # A stopped item is not a failure: it stays resumable from its .part file
+        stopped = 'STOP_REQUESTED' in str(error)
+        self._record(STATE_QUEUED if stopped else STATE_FAILED, error=None if stopped else str(error))
+        self.finish_timer(self._timer, 'stopped' if stopped else 'failed', error=None if stopped else str(error))
+
+    def _fail(self, error):
+        """
+        Record a failed item and return the exception to raise: JobCancelled when
+        its handle was cancelled, whatever broke first (a killed ffmpeg, the hook).
+        """
+        if self._handle is not None and self._handle.cancelled:
+            self._remove_partial_files()
+            error = JobCancelled()
+        self._record_failure(error)
+        return error
+
+    def _remove_partial_files(self):
+        """Remove what a cancelled item wrote: ffmpeg outputs always, partial downloads with discard"""
+        if not self._base:
+            return
+        for path in glob.glob(f"{glob.escape(self._base)}.*"):
+            if not self._handle.discard and _RESUMABLE.search(path[len(self._base):]):
+                continue
+            try:
+                # Only files this run wrote: an earlier output with the same name stays
+                if os.path.getmtime(path) >= self._started - 1:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _run_ffmpeg(self, cmd):
+        """subprocess.run for the item's own ffmpeg runs, tracked by its handle when it has one"""
+        run = self._handle.run if self._handle is not None else subprocess.run
+        return run(cmd, stdin=subprocess.DEVNULL, capture_output=True, text=True, errors='replace')
+
+    def _active(self):
+        """Context for threads the item starts: its handle's processes are tracked there too"""
+        return self._handle.active() if self._handle is not None else contextlib.nullcontext()
+
+    def finish_timer(self, timer, status, encode_path=None, media_seconds=None, error=None):
+        """Close an item's timeline and hand it to the metrics sink"""
+        if timer is None or timer.ended is not None:
+            return
+        timer.finish(status, encode_path=encode_path, media_seconds=media_seconds, error=error)
+        if self.metrics is not None:
+            self.metrics.emit(timer)
+
+    def _end(self):
+        self._scope.close()
+        self._handle = None
+        if self._bandwidth_job is not None:
+            self._bandwidth_job.close()
+            self._bandwidth_job = None
+            self.ydl.params.pop('bandwidth_job', None)
+        self._item_hook = None
+        self._job = None
+        self._timer = None
+
+    def _extract(self, url):
+        """
+        Processed info dict (formats selected, nothing downloaded) for url.
+
+        The raw extractor result comes with the URL when a PlaylistStream already
+        fetched it, else from the metadata cache when present; otherwise it is
+        extracted and stored there before processing.
+        """
+        raw = url.take_raw() if isinstance(url, Entry) else None
+        if raw is None and self.metadata is not None:
+            raw = self.metadata.get(url)
+        if raw is None:
+            raw = self.ydl.extract_info(url, download=False, process=False)
+            if self.metadata is not None:
+                raw = self.ydl.sanitize_info(raw)
+                self.metadata.put(url, raw)
+        return self.ydl.process_ie_result(raw, download=False)
+
+    def extract(self, url):
+        """Processed info dict for url (formats selected, nothing downloaded)"""
+        return self._extract(url)
+
+    def _output_ext(self, info):
+        """Extension of the final file (after audio extraction, if configured)"""
+        for pp in self.ydl.params.get('postprocessors') or []:
+            if pp.get('key') == 'FFmpegExtractAudio':
+                return pp.get('preferredcodec') or 'mp3'
+        return info.get('ext')
+
+    def _final_path(self, info, ext):
+        return f"{os.path.splitext(self.ydl.prepare_filename(info))[0]}.{ext}"
+
+    def _wants_chunked(self, info, encode_path):
+        """True when the merger should only copy and the transcode run in chunks afterwards"""
+        if encode_path != PATH_TRANSCODE or (self.ydl.params.get('chunk_encoders') or 1) <= 1:
+            return False
+        if info.get('_type', 'video') != 'video' or not info.get('requested_formats'):
+            return False
+        # Unknown duration (some generic extractors): decided from the merged file
+        return not info.get('duration') or info['duration'] >= MIN_CHUNKED_SECONDS
+
+    def _wants_overlap(self, info, encode_path):
+        """True when the transcode should run while the streams download"""
+        return (bool(self.ydl.params.get('overlap_encode')) and encode_path == PATH_TRANSCODE
+                and info.get('_type', 'video') == 'video' and bool(info.get('requested_formats')))
+
+    def _process(self, info, chunked=False, overlap=False):
+        """
+        Download (and merge) an extracted video; with chunked, transcode the merged
+        copy; with overlap, encode while downloading. Returns the output path.
+        """
+        if overlap:
+            return self._download_overlapped(info, self._final_path(info, 'mp4'))
+        result = self.ydl.process_ie_result(info, download=True)
+        filepath = (result.get('requested_downloads') or [{}])[-1].get('filepath')
+        if not chunked or not filepath or not os.path.exists(filepath):
+            return filepath
+        encoders = self.ydl.params['chunk_encoders']
+        base, ext = os.path.splitext(filepath)
+        encoded = f"{base}.chunked{ext}"
+        self._timer.enter(PHASE_ENCODE)
+        try:
+            chunks = transcode_merged(self.ydl.params.get('ffmpeg_location'), filepath, encoded, encoders,
+                                      has_audio=stream_codecs(info)[1] is not None, duration=info.get('duration'),
+                                      handle=self._handle)
+            os.replace(encoded, filepath)
+        except BaseException:
+            # The stream-copied merge is not the promised H.264/AAC file
+            for path in (encoded, filepath):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        finally:
+            self._timer.enter(None)
+        if chunks:
+            self.ydl.to_screen(f"[ChunkedEncode] Encoded {chunks} chunks on {encoders} encoders: {filepath}")
+        return filepath
+
+    def _audio_only(self):
+        return any(pp.get('key') == 'FFmpegExtractAudio' for pp in self.ydl.params.get('postprocessors') or [])
+
+    def _fetch_text(self, fmt):
+        """The document at a format's URL (an HLS media playlist), with its headers"""
+        request = yt_dlp.networking.Request(fmt['url'], headers=fmt.get('http_headers') or {})
+        with self.ydl.urlopen(request) as response:
+            return response.read().decode('utf-8', 'replace')
+
+    def _encode_streams(self, info, outputs, section, command, action):
+        """
+        Download the selected streams of an extracted video and write the outputs
+        with one ffmpeg run, built by command(ffmpeg, inputs).
+
+        With a section (start, end) only its share is fetched: streams ffmpeg can
+        seek by URL are read from there, DASH fragment lists and HLS media
+        playlists are cut to the fragments covering it and downloaded by yt-dlp
+        first (see section_clip.plan_stream). Without one, every stream is
+        downloaded whole. action names the run in errors ("Clipping failed").
+        Returns the number of streams downloaded first, out of the inputs.
+        """
+        ffmpeg = self.ydl.params.get('ffmpeg_location') or 'ffmpeg'
+        base = os.path.splitext(outputs[0])[0]
+        tag = 'source' if section is None else 'section'
+        # Nothing may be downloaded through yt-dlp first, which would create the directory
+        os.makedirs(os.path.dirname(outputs[0]) or '.', exist_ok=True)
+        inputs, fetched = [], []
+        try:
+            for fmt in info.get('requested_formats') or [info]:
+                stream_info = dict(info)
+                stream_info.pop('requested_formats', None)
+                stream_info.update(fmt)
+                path = f"{base}.f{fmt['format_id']}.{tag}.{fmt['ext']}"
+                if section is None:
+                    stream, download = {'path': path}, stream_info
+                else:
+                    if stream_info.get('protocol') in PLAYLIST_PROTOCOLS and not stream_info.get('hls_media_playlist_data'):
+                        stream_info['hls_media_playlist_data'] = self._fetch_text(stream_info)
+                    stream, download = plan_stream(stream_info, section[0], section[1], path)
+                if info.get('requested_formats'):
+                    stream.update(video=fmt.get('vcodec') not in (None, 'none'),
+                                  audio=fmt.get('acodec') not in (None, 'none'))
+                else:
+                    # A single format has both tracks unless yt-dlp knows otherwise
+                    stream.update(video=fmt.get('vcodec') != 'none', audio=fmt.get('acodec') != 'none')
+                if download is not None:
+                    success, _ = self.ydl.dl(path, download)
+                    if not success:
+                        raise yt_dlp.utils.DownloadError(f"Failed to download format {fmt['format_id']}")
+                    fetched.append(path)
+                inputs.append(stream)
+
+            self._record(STATE_ENCODING)
+            self._timer.enter(PHASE_ENCODE)
+            try:
+                proc = self._run_ffmpeg(command(ffmpeg, inputs))
+            finally:
+                self._timer.enter(None)
+            if proc.returncode:
+                for output in outputs:
+                    if os.path.exists(output):
+                        os.remove(output)
+                error = proc.stderr.strip()[-500:] or f"ffmpeg exited with {proc.returncode}"
+                raise yt_dlp.utils.DownloadError(f"{action}: {error}")
+        finally:
+            for path in fetched:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return len(fetched), len(inputs)
+
+    def _download_section(self, info, output, args, section):
+        """
+        Clip section (start, end) of an extracted video into output with one ffmpeg
+        run (see _encode_streams). With stream copy args the clip starts at the
+        keyframe before start; a transcode cuts exactly. Returns output.
+        """
+        section = clip_bounds(info, section)
+        fetched, streams = self._encode_streams(
+            info, [output], section, lambda ffmpeg, inputs: build_ffmpeg_command(ffmpeg, inputs, output, args),
+            "Clipping failed")
+        self.ydl.to_screen(f"[Section] Clipped {format_section(section)} "
+                           f"({fetched} of {streams} streams downloaded first): {output}")
+        return output
+
+    def _download_renditions(self, info, outputs, section=None):
+        """
+        Write every (name, path) of outputs from one download and one decode of the
+        selected streams (see renditions.build_rendition_command); the source-size
+        rendition is a stream copy when the source already is H.264/AAC. AAC audio
+        is copied into every MP4 rendition; other audio is encoded to AAC once
+        first when several renditions need it. With a section, every rendition
+        is a clip of it. Returns the paths.
+        """
+        if section is not None:
+            section = clip_bounds(info, section)
+        copy_source = is_iphone_compatible(info)
+        acodec = stream_codecs(info)[1]
+        copy_audio = acodec is not None and acodec.startswith(IPHONE_AUDIO_CODECS)
+        paths = [path for _, path in outputs]
+        aac_path = f"{os.path.splitext(paths[0])[0]}.aac.m4a"
+        aac_audio = []
+
+        def command(ffmpeg, inputs):
+            if (any(stream['audio'] for stream in inputs)
+                    and shares_audio_encode([name for name, _ in outputs], copy_source, copy_audio)):
+                proc = self._run_ffmpeg(build_audio_command(ffmpeg, inputs, aac_path))
+                aac_audio.append(aac_path)
+                if proc.returncode:
+                    error = proc.stderr.strip()[-500:] or f"ffmpeg exited with {proc.returncode}"
+                    raise yt_dlp.utils.DownloadError(f"Audio encode failed: {error}")
+            return build_rendition_command(ffmpeg, inputs, outputs, copy_source, copy_audio,
+                                           aac_audio[0] if aac_audio else None)
+
+        try:
+            self._encode_streams(info, paths, section, command, "Rendition encode failed")
+        finally:
+            for path in aac_audio:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self.ydl.to_screen(f"[Renditions] Wrote {', '.join(name for name, _ in outputs)} from one decode"
+                           f"{' (source copied)' if copy_source else ''}: {paths[0]}")
+        return paths
+
+    def _cached_renditions(self, info, outputs, section=None):
+        """
+        Link the renditions of outputs the media cache has, and write the others
+        from one download and decode; True when every one came from the cache.
+        """
+        if self.cache is None:
+            self._download_renditions(info, outputs, section)
+            return False
+        keys = {name: MediaCache.key_for(info, f'rendition-{name}', RENDITIONS[name].ext, section)
+                for name, _ in outputs}
+        missing = []
+        try:
+            # Claimed in key order, so jobs asking for overlapping sets cannot wait on each other
+            for name, path in sorted(outputs, key=lambda output: keys[output[0]]):
+                if not self.cache.acquire(keys[name], RENDITIONS[name].ext, path):
+                    missing.append((name, path))
+            if missing:
+                missing.sort(key=outputs.index)
+                self._download_renditions(info, missing, section)
+                for name, path in missing:
+                    if os.path.exists(path):
+                        self.cache.store(keys[name], RENDITIONS[name].ext, path)
+        finally:
+            for name, _ in missing:
+                self.cache.release(keys[name])
+        return not missing
+
+    def _download_overlapped(self, info, output):
+        """
+        Download the selected streams side by side while ffmpeg transcodes them.
+
+        Each stream is written by the usual yt-dlp downloader; ffmpeg reads it from
+        a GrowingFile feed as it arrives (containers that need seeking, like an MP4
+        with its moov at the end, are handed over once complete). Streams that are
+        all in within OVERLAP_PROBE_SECONDS are read as finished files, like the
+        sequential path: the feed only pays off when the download is slow. The
+        stream and encode phases are timed on their own clocks, so the job timer
+        shows how much of them overlapped. Returns output.
+        """
+        ffmpeg = self.ydl.params.get('ffmpeg_location') or 'ffmpeg'
+        base = os.path.splitext(output)[0]
+        streams = []
+        for fmt in info['requested_formats']:
+            stream_info = dict(info)
+            stream_info.pop('requested_formats', None)
+            stream_info.update(fmt)
+            streams.append((stream_info, GrowingFile(f"{base}.f{fmt['format_id']}.{fmt['ext']}")))
+        errors = []
+        self._abort.clear()
+        self._feeds = {feed.path: feed for _, feed in streams}
+
+        def fetch(stream_info, feed):
+            start = time.monotonic()
+            try:
+                with self._active():
+                    success, _ = self.ydl.dl(feed.path, stream_info)
+                if not success:
+                    raise yt_dlp.utils.DownloadError(f"Failed to download format {stream_info['format_id']}")
+            except BaseException as e:
+                errors.append(e)
+                self._abort.set()
+                feed.finish(failed=True)
+            else:
+                feed.finish()
+            self._timer.add(stream_phase(stream_info), time.monotonic() - start,
+                            0 if feed.failed else os.path.getsize(feed.path))
+
+        threads = [threading.Thread(target=fetch, args=stream, daemon=True) for stream in streams]
+        for thread in threads:
+            thread.start()
+        encode_error = None
+        try:
+            deadline = time.monotonic() + OVERLAP_PROBE_SECONDS
+            arrived = all([feed.wait(max(0.0, deadline - time.monotonic())) for _, feed in streams])
+            with FeedServer() as server:
+                inputs = []
+                for stream_info, feed in streams:
+                    if not arrived and feed.sequential():
+                        path = server.url_for(feed)
+                    else:
+                        feed.wait()
+                        path = feed.path
+                    inputs.append({'path': path, 'video': stream_info.get('vcodec') not in (None, 'none'),
+                                   'audio': stream_info.get('acodec') not in (None, 'none')})
+                self._record(STATE_ENCODING)
+                start = time.monotonic()
+                proc = self._run_ffmpeg(build_ffmpeg_command(ffmpeg, inputs, output, TRANSCODE_ARGS))
+                self._timer.add(PHASE_ENCODE, time.monotonic() - start)
+                if proc.returncode:
+                    encode_error = proc.stderr.strip()[-500:] or f"ffmpeg exited with {proc.returncode}"
+                    # Stops the downloads still running (see _dispatch_progress)
+                    self._abort.set()
+        except FeedFailed:
+            pass  # reported from errors below
+        finally:
+            for thread in threads:
+                thread.join()
+            self._feeds = None
+
+        # A stop request or failed download comes first: the encode only failed because of it
+        failure = next((e for e in errors if not isinstance(e, yt_dlp.utils.DownloadCancelled)), None)
+        if failure is not None or encode_error is not None:
+            if os.path.exists(output):
+                os.remove(output)
+            if failure is not None:
+                raise failure
+            raise yt_dlp.utils.DownloadError(f"Encoding failed: {encode_error}")
+        for _, feed in streams:
+            try:
+                os.remove(feed.path)
+            except OSError:
+                pass
+        return output
+
+    def download(self, url, outtmpl, progress_hook=None, probe=True, weight=DEFAULT_WEIGHT, handle=None,
+                 section=None, renditions=None):
+        """
+        Download one URL into outtmpl (weight: its bandwidth share, see bandwidth;
+        handle: a cancellation.JobHandle that stops it; section: (start, end)
+        seconds to clip, see section_clip; renditions: names of outputs to write
+        from one download and decode, see renditions).
+
+        With probe=True the merger args are chosen from the selected codecs
+        (see encode_profile.apply_merger_args). With a media cache, an earlier
+        output of the same video, formats and profile is linked instead of
+        downloaded again. Returns (info, encode_path).
+        """
+        self._begin(url, outtmpl, progress_hook, weight, handle, self.job_profile(renditions, section))
+        try:
+            info = self._extract(url)
+            if info.get('_type', 'video') == 'video':
+                self._base = os.path.splitext(self.ydl.prepare_filename(info))[0]
+            elif section is not None:
+                raise SectionError("a section can only be clipped from a single video, not a playlist")
+            elif renditions:
+                raise yt_dlp.utils.DownloadError("renditions can only be made from a single video, not a playlist")
+            if renditions:
+                # One download and one ffmpeg run write every rendition
+                encode_path = PATH_RENDITIONS
+                overlap = chunked = False
+            elif section is not None:
+                # One ffmpeg run writes the clip: no merger, chunks or overlap
+                encode_path, section_args, ext = choose_encode_args(info, audio_only=self._audio_only())
+                overlap = chunked = False
+            else:
+                encode_path = apply_merger_args(self.ydl, info) if probe else None
+                overlap = self._wants_overlap(info, encode_path)
+                # Chunks need the whole merged file, so an overlapped encode runs in one piece
+                chunked = not overlap and self._wants_chunked(info, encode_path)
+                if chunked:
+                    self.ydl.params['postprocessor_args'] = dict(self.ydl.params['postprocessor_args'],
+                                                                 merger=COPY_ARGS)
+            self._timer.enter(None)
+
+            written = []
+            if info.get('_type', 'video') != 'video':
+                self.ydl.process_ie_result(info, download=True)
+                output = None
+            elif renditions:
+                outputs = rendition_outputs(self._final_path(info, 'mp4'), renditions)
+                if self._cached_renditions(info, outputs, section):
+                    encode_path = PATH_CACHED
+                written = [path for _, path in outputs]
+                output = written[0]
+            else:
+                if section is None:
+                    ext = self._output_ext(info)
+                output = self._final_path(info, ext)
+
+                def process():
+                    if section is not None:
+                        return self._download_section(info, output, section_args, section)
+                    return self._process(info, chunked, overlap)
+
+                if self.cache is None:
+                    process()
+                else:
+                    key = MediaCache.key_for(info, encode_path, ext, section)
+                    if self.cache.acquire(key, ext, output):
+                        encode_path = PATH_CACHED
+                    else:
+                        try:
+                            filepath = process()
+                            if filepath and os.path.exists(filepath):
+                                self.cache.store(key, ext, filepath)
+                        finally:
+                            self.cache.release(key)
+                written = [output]
+            self._record(STATE_DONE, output=output)
+            self.last_output = output
+            self.last_outputs = written
+            # A clip's length comes from the output
+            duration = info.get('duration') if section is None else None
+            if not duration and PHASE_ENCODE in self._timer.phases and output and os.path.exists(output):
+                duration = probe_duration(output, self.ydl.params.get('ffmpeg_location'))
+            self.finish_timer(self._timer, 'done', encode_path, duration)
+        except Exception as e:
+            failure = self._fail(e)
+            if failure is e:
+                raise
+            raise failure from e
+        finally:
+            self._end()
+
+        if encode_path:
+            ENCODE_STATS.record(encode_path)
+        self.items += 1
+        return info, encode_path
+
+    def fetch_streams(self, url, outtmpl, progress_hook=None, audio_only=False, weight=DEFAULT_WEIGHT,
+                      handle=None):
+        """
+        Download the selected streams as separate files, without merging.
+
+        This is the download stage of pipeline.StagedPipeline; the returned
+        encode spec is handed to pipeline.run_encode in the encode stage
+        (and the pipeline records the item's final journal state and finishes
+        spec['timer'] once the encode is done).
+        """
+        self._begin(url, outtmpl, progress_hook, weight, handle, self.job_profile())
+        try:
+            info = self._extract(url)
+            if info.get('_type', 'video') != 'video':
+                raise ValueError("Playlists are not supported in pipeline mode")
+            self._timer.enter(None)
+            self._timer.media_seconds = info.get('duration')
+
+            encode_path, args, ext = choose_encode_args(info, audio_only=audio_only)
+            base = self._base = os.path.splitext(self.ydl.prepare_filename(info))[0]
+            spec = {
+                'url': url,
+                'title': info.get('title'),
+                'inputs': [],
+                'output': f"{base}.{ext}",
+                'args': args,
+                'encode_path': encode_path,
+                'duration': info.get('duration'),
+                'cache_key': None,
+                'ext': ext,
+                'timer': self._timer,
+            }
+
+            if self.cache is not None:
+                key = MediaCache.key_for(info, encode_path, ext)
+                if self.cache.acquire(key, ext, spec['output']):
+                    ENCODE_STATS.record(PATH_CACHED)
+                    spec.update(encode_path=PATH_CACHED, cached=True)
+                    self._record(STATE_DONE, output=spec['output'])
+                    self.finish_timer(self._timer, 'done', PATH_CACHED)
+                    return spec
+                # This item now owns the fetch; the pipeline releases the key after encoding
+                spec['cache_key'] = key
+
+            try:
+                for fmt in info.get('requested_formats') or [info]:
+                    stream_info = dict(info)
+                    stream_info.pop('requested_formats', None)
+                    stream_info.update(fmt)
+
+                    stream_path = f"{base}.f{fmt['format_id']}.{fmt['ext']}"
+                    success, _ = self.ydl.dl(stream_path, stream_info)
+                    if not success:
+                        raise yt_dlp.utils.DownloadError(f"Failed to download format {fmt['format_id']}")
+                    spec['inputs'].append({
+                        'path': stream_path,
+                        'video': fmt.get('vcodec') not in (None, 'none'),
+                        'audio': fmt.get('acodec') not in (None, 'none'),
+                    })
+            except BaseException:
+                if spec['cache_key']:
+                    self.cache.release(spec['cache_key'])
+                raise
+            # Streams are on disk; a restart re-encodes them without downloading again
+            self._record(STATE_ENCODING)
+        except Exception as e:
+            failure = self._fail(e)
+            if failure is e:
+                raise
+            raise failure from e
+        finally:
+            self._end()
+
+        ENCODE_STATS.record(encode_path)
+        self.items += 1
+        return spec
+
+    def close(self):
+        self.ydl.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SessionPool:
+    """Lazily create one DownloadSession per worker thread and close them all at the end"""
+
+    def __init__(self, opts, cache=None, metadata=None, journal=None, metrics=None, bandwidth=None):
+        self.opts = opts
+        self.cache = cache
+        self.metadata = metadata
+        self.journal = journal
+        self.metrics = metrics
+        self.bandwidth = bandwidth
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sessions = []
+
+    def get(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = DownloadSession(self.opts, cache=self.cache, metadata=self.metadata,
+                                      journal=self.journal, metrics=self.metrics, bandwidth=self.bandwidth)
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -6,27 +6,39 @@ Windows standalone script for downloading YouTube videos with iPhone-compatible
 
 import sys
 import os
+import re
+import argparse
+import multiprocessing
 from pathlib import Path
-import shutil
 
-# Import yt-dlp as a module instead of running it as a subprocess
-try:
-    import yt_dlp
-except ImportError:
-    print("\n" + "="*60)
-    print("ERROR: yt-dlp module not found!")
-    print("Please install it with: pip install yt-dlp")
-    print("="*60 + "\n")
-    sys.exit(1)
+from download_engine import (DEFAULT_WORKERS, DEFAULT_SEGMENTS, MAX_SEGMENTS, DEFAULT_FRAGMENTS, MAX_FRAGMENTS,
+                             DEFAULT_HOST_FRAGMENTS)
+from encode_profile import TRANSCODE_ARGS, PATH_REMUX, PATH_CACHED, ENCODE_STATS
+from media_cache import MediaCache, DEFAULT_MAX_BYTES, shared_cache
+from metadata_cache import MetadataCache, DEFAULT_TTL, shared_metadata_cache
+from job_journal import JobJournal, job_profile
+from job_metrics import JsonLinesSink, METRICS_NAME
+from toolchain import probe as probe_toolchain, ffmpeg_path
+from chunked_encode import DEFAULT_CHUNK_ENCODERS
+from bandwidth import shared_bandwidth, parse_rate, format_rate
+from cancellation import JobHandle, cancel_on_interrupt
+from section_clip import parse_section, format_section
+from renditions import RENDITIONS, parse_renditions
+
+# yt-dlp (and everything built on it: ydl_session, pipeline, stream_output) is
+# imported where it is used, so --help and argument errors return without loading it
+
 
-# Import imageio-ffmpeg for bundled ffmpeg binary
-try:
-    import imageio_ffmpeg
-    FFMPEG_BINARY = imageio_ffmpeg.get_ffmpeg_exe()
-    print(f"Using bundled ffmpeg: {FFMPEG_BINARY}")
-except ImportError:
-    print("WARNING: imageio-ffmpeg not found. Will try to use system ffmpeg.")
-    FFMPEG_BINARY = None
+def require_yt_dlp():
+    """Import yt-dlp as a module instead of running it as a subprocess; exit with a hint if missing"""
+    try:
+        import yt_dlp  # noqa: F401
+    except ImportError:
+        print("\n" + "="*60)
+        print("ERROR: yt-dlp module not found!")
+        print("Please install it with: pip install yt-dlp")
+        print("="*60 + "\n")
+        sys.exit(1)
 
 
 class DownloadLogger:
@@ -60,19 +72,14 @@ def progress_hook(d):
 
 
 def check_ffmpeg():
-    """Check if ffmpeg is installed and accessible"""
-    # First try imageio-ffmpeg (bundled)
-    try:
-        import imageio_ffmpeg
-        ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
-        print(f"✓ Using bundled ffmpeg: {ffmpeg_path}")
-        return True
-    except ImportError:
-        pass
-    
-    # Fallback to system ffmpeg
-    if shutil.which('ffmpeg') is not None:
-        print("✓ Using system ffmpeg")
+    """Check if ffmpeg is installed and accessible (bundled imageio-ffmpeg first, then PATH)"""
+    # Probed once and cached on disk until the binary changes (see toolchain)
+    tools = probe_toolchain()
+    if tools is not None:
+        print(f"✓ Using {tools.source} ffmpeg: {tools.path} ({tools.version or 'unknown version'})")
+        if tools.missing_encoders:
+            print(f"WARNING: this ffmpeg has no {', '.join(tools.missing_encoders)} encoder; "
+                  f"downloads that need an H.264/AAC transcode will fail")
         return True
     
     # ffmpeg not found
@@ -96,7 +103,63 @@ def check_ffmpeg():
     return False
 
 
-def download_video(url, output_path, filename=None):
+def output_template_for(output_path, filename=None):
+    """yt-dlp output template for a custom filename, or the video title"""
+    if filename:
+        # Remove special characters
+        safe_filename = "".join(c if c.isalnum() or c in (' ', '-', '_') else '_' for c in filename)
+        return str(Path(output_path) / f"{safe_filename}.%(ext)s")
+    return str(Path(output_path) / "%(title)s.%(ext)s")
+
+
+def entry_filename(filenames, index, url):
+    """Custom filename for batch item index (0-based), numbered when it came from a playlist"""
+    if hasattr(url, 'source'):
+        # A playlist_stream.Entry: named after the input URL it was expanded from
+        return url.filename(filenames)
+    return filenames[index] if index < len(filenames) and filenames[index] else None
+
+
+# Best MP4-compatible streams, falling back to any best pair or a single file
+FORMAT_SPEC = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best'
+
+
+def build_ydl_opts(output_template=None, segments=DEFAULT_SEGMENTS, chunk_encoders=DEFAULT_CHUNK_ENCODERS,
+                   overlap=False, fragments=DEFAULT_FRAGMENTS, host_fragments=DEFAULT_HOST_FRAGMENTS):
+    """yt-dlp options - same as server version"""
+    ydl_opts = {
+        'format': FORMAT_SPEC,
+        'merge_output_format': 'mp4',
+        # Connections per stream (byte ranges), for servers that throttle each connection
+        'segments': segments,
+        # DASH/HLS fragments in flight per stream: an adaptive window up to this ceiling
+        # (see adaptive_fragments), and per host across the parallel jobs
+        'concurrent_fragment_downloads': fragments,
+        'adaptive_fragments': fragments > 1,
+        'fragment_host_limit': host_fragments,
+        # ffmpeg processes a long transcode is split across (see chunked_encode)
+        'chunk_encoders': chunk_encoders,
+        # Transcode while the streams download instead of after (see ydl_session)
+        'overlap_encode': overlap,
+        # Default merger args; replaced per job by the codec probe (remux when already H.264/AAC)
+        'postprocessor_args': {
+            'merger': TRANSCODE_ARGS
+        },
+        'logger': DownloadLogger(),
+        'progress_hooks': [progress_hook],
+    }
+    if output_template:
+        ydl_opts['outtmpl'] = output_template
+    
+    # Set ffmpeg location to the probed binary (bundled or system)
+    if ffmpeg_path():
+        ydl_opts['ffmpeg_location'] = ffmpeg_path()
+    
+    return ydl_opts
+
+
+def download_video(url, output_path, filename=None, session=None, overlap=False, handle=None, section=None,
+                   renditions=None):
     """
     Download YouTube video with iPhone-compatible encoding (H.264 + AAC)
     
@@ -104,18 +167,19 @@ def download_video(url, output_path, filename=None):
         url: YouTube video URL
         output_path: Directory path where to save the video
         filename: Optional custom filename (without extension)
+        session: Optional DownloadSession to reuse across a batch
+                 (a one-off session using the shared media cache is created and closed otherwise)
+        overlap: Transcode while downloading, for the one-off session
+                 (a passed session uses its own 'overlap_encode' option)
+        handle: Optional cancellation.JobHandle; cancelling it kills the download's ffmpeg
+        section: Optional (start, end) seconds; only that time range is fetched and encoded
+        renditions: Optional rendition names (see renditions.RENDITIONS) written from one download and decode
     """
     # Ensure output directory exists
     output_path = Path(output_path)
     output_path.mkdir(parents=True, exist_ok=True)
     
-    # Prepare filename
-    if filename:
-        # Remove special characters
-        safe_filename = "".join(c if c.isalnum() or c in (' ', '-', '_') else '_' for c in filename)
-        output_template = str(output_path / f"{safe_filename}.%(ext)s")
-    else:
-        output_template = str(output_path / "%(title)s.%(ext)s")
+    output_template = output_template_for(output_path, filename)
     
     print(f"\n{'='*60}")
     print(f"Starting download...")
@@ -123,35 +187,39 @@ def download_video(url, output_path, filename=None):
     print(f"Output Path: {output_path}")
     if filename:
         print(f"Filename: {filename}.mp4")
+    if section:
+        print(f"Section: {format_section(section)}")
+    if renditions:
+        print(f"Renditions: {', '.join(renditions)}")
     print(f"{'='*60}\n")
     
     # Check ffmpeg before starting download
     if not check_ffmpeg():
         return False
     
-    # yt-dlp options - same as server version
-    ydl_opts = {
-        'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best',
-        'merge_output_format': 'mp4',
-        'postprocessor_args': {
-            'merger': ['-c:v', 'libx264', '-preset', 'fast', '-crf', '23', 
-                      '-c:a', 'aac', '-b:a', '192k', '-movflags', '+faststart']
-        },
-        'outtmpl': output_template,
-        'logger': DownloadLogger(),
-        'progress_hooks': [progress_hook],
-    }
-    
-    # Set ffmpeg location if using bundled version
-    if FFMPEG_BINARY:
-        ydl_opts['ffmpeg_location'] = FFMPEG_BINARY
+    from ydl_session import DownloadSession
+    own_session = session is None
     
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+        if own_session:
+            session = DownloadSession(build_ydl_opts(output_template, overlap=overlap), cache=shared_cache(),
+                                      metadata=shared_metadata_cache(), bandwidth=shared_bandwidth())
+        info, encode_path = session.download(url, output_template, handle=handle, section=section,
+                                             renditions=renditions)
         
         print(f"\n{'='*60}")
         print("✓ Download completed successfully!")
+        if encode_path == PATH_REMUX:
+            print("Encode path: remux (source already H.264/AAC, stream copy)")
+        elif encode_path == PATH_CACHED:
+            print("Encode path: cached (linked from the local media cache)")
+        else:
+            print(f"Encode path: {encode_path}")
+        if renditions:
+            for path in session.last_outputs:
+                print(f"  → {path}")
+        print(f"Encode stats: {ENCODE_STATS.summary()}")
+        print(f"Timing: {session.last_timer.summary()}")
         print(f"{'='*60}\n")
         return True
         
@@ -160,42 +228,390 @@ def download_video(url, output_path, filename=None):
         print(f"✗ Error: {str(e)}")
         print(f"{'='*60}\n")
         return False
+    
+    finally:
+        if own_session and session is not None:
+            session.close()
+
+def download_pipeline(urls, output_path, filenames, workers=DEFAULT_WORKERS, encoders=None,
+                      cache=None, metadata=None, journal=None, segments=DEFAULT_SEGMENTS, metrics=None,
+                      chunk_encoders=DEFAULT_CHUNK_ENCODERS, bandwidth=None, handle=None,
+                      fragments=DEFAULT_FRAGMENTS, host_fragments=DEFAULT_HOST_FRAGMENTS):
+    """
+    Download a batch in two stages: download threads feed an ffmpeg process pool
+    
+    urls may be a PlaylistStream, whose entries are read as download threads free up.
+    Returns the number of items that finished successfully.
+    """
+    output_path = Path(output_path)
+    output_path.mkdir(parents=True, exist_ok=True)
+    
+    if not check_ffmpeg():
+        return 0
+    
+    from pipeline import StagedPipeline
+    
+    def on_event(kind, data):
+        if kind == 'log':
+            print(f"\n{data}")
+        elif kind == 'depths':
+            print(f"\n[queues] download: {data['downloading']} active, {data['download_pending']} waiting"
+                  f" | encode: {data['encoding']} running, {data['encode_queued']} queued")
+    
+    items = ((url, output_template_for(output_path, entry_filename(filenames, i, url)))
+             for i, url in enumerate(urls))
+    
+    opts = build_ydl_opts(segments=segments, chunk_encoders=chunk_encoders, fragments=fragments,
+                          host_fragments=host_fragments)
+    staged = StagedPipeline(opts, ffmpeg=ffmpeg_path(), download_workers=workers,
+                            encode_workers=encoders, on_event=on_event, cache=cache, metadata=metadata,
+                            journal=journal, metrics=metrics, bandwidth=bandwidth, handle=handle)
+    print(f"Pipeline: {staged.download_workers} download threads, {staged.encode_workers} encode processes")
+    results = staged.run(items)
+    print(f"\nEncode stats: {ENCODE_STATS.summary()}")
+    return sum(1 for ok in results.values() if ok)
+
+
+def stream_to_stdout(url, metadata=None):
+    """
+    Write one video to stdout as fragmented MP4 while ffmpeg produces it
+    (e.g. piped into a player); no file is written. Returns the exit code.
+    """
+    from ydl_session import DownloadSession
+    from stream_output import open_stream
+    
+    out = sys.stdout.buffer
+    # Every message, including the yt-dlp logger's, must stay off the video stream
+    sys.stdout = sys.stderr
+    encoded = None
+    try:
+        with DownloadSession(build_ydl_opts(), metadata=metadata) as session:
+            info, encoded = open_stream(session, url, ffmpeg_path())
+        print(f"Streaming: {info.get('title')} (encode path: {encoded.encode_path})")
+        # Paced by the shared limit; ffmpeg's reads from the source slow down with the pipe
+        for chunk in shared_bandwidth().throttle(encoded, url):
+            out.write(chunk)
+            out.flush()
+    except BrokenPipeError:
+        # The reader went away (e.g. the player was closed); silence the final flush
+        os.dup2(os.open(os.devnull, os.O_WRONLY), out.fileno())
+        print("Stream closed by the reader.")
+        return 1
+    except Exception as e:
+        print(f"✗ Error: {str(e)}")
+        return 1
+    finally:
+        if encoded is not None:
+            encoded.close()
+    print(f"✓ Streamed {encoded.bytes / 1024 ** 2:.1f} MB "
+          f"(first byte after {encoded.timer.first_byte:.2f}s, total {encoded.timer.ended - encoded.timer.started:.1f}s)")
+    return 0
+
+
+def run_manifest(args):
+    """
+    Headless batch: download the items of args.manifest on args.workers threads
+    in this process, writing one NDJSON result per item as it finishes and a
+    summary record (see batch_manifest). No prompts. Returns the exit code.
+    """
+    from batch_manifest import EXIT_ALL_FAILED, EXIT_MANIFEST_ERROR, ManifestRunner, ResultWriter, read_manifest
+
+    results = sys.stdout if args.results == '-' else open(args.results, 'a', encoding='utf-8')
+    if args.results == '-':
+        # Every message, including the yt-dlp logger's, must stay off the records
+        sys.stdout = sys.stderr
+    try:
+        manifest = sys.stdin if args.manifest == '-' else open(args.manifest, encoding='utf-8')
+    except OSError as e:
+        print(f"✗ Error: cannot open the manifest: {e}")
+        return EXIT_MANIFEST_ERROR
+    output_path = Path(args.output_dir or Path.home() / "Downloads" / "YouTube")
+    output_path.mkdir(parents=True, exist_ok=True)
+    # Probed once for the whole batch
+    if not check_ffmpeg():
+        return EXIT_ALL_FAILED
+
+    cache = metadata = journal = metrics = None
+    if not args.no_cache:
+        cache = MediaCache(args.cache_dir, max_bytes=int(args.cache_size * 1024 ** 3))
+        metadata = MetadataCache(ttl=args.metadata_ttl)
+    if not args.no_journal:
+        journal = JobJournal(output_path)
+    if not args.no_metrics:
+        metrics = JsonLinesSink(args.metrics or str(output_path / METRICS_NAME))
+
+    # Items run side by side, so a long transcode splits only over its share of the cores
+    opts = build_ydl_opts(segments=args.segments, chunk_encoders=max(1, args.chunk_encoders // args.workers),
+                          overlap=args.overlap, fragments=args.fragments, host_fragments=args.fragments_per_host)
+    # Progress lines of parallel items would only interleave; the records carry the results
+    opts['progress_hooks'] = []
+    handle = JobHandle('manifest')
+    runner = ManifestRunner(opts, lambda item: output_template_for(output_path, item.filename),
+                            ResultWriter(results), workers=args.workers, default_section=args.section,
+                            default_renditions=args.renditions, cache=cache, metadata=metadata,
+                            journal=journal, metrics=metrics, bandwidth=shared_bandwidth(), handle=handle)
+    print(f"Manifest: {'stdin' if args.manifest == '-' else args.manifest} → {output_path} "
+          f"({runner.workers} parallel downloads)")
+    try:
+        with cancel_on_interrupt(handle):
+            code = runner.run(read_manifest(manifest, on_error=runner.report_invalid))
+    finally:
+        if manifest is not sys.stdin:
+            manifest.close()
+        if args.results != '-':
+            results.close()
+        if journal:
+            journal.close()
+        if metrics:
+            metrics.close()
+    counts = ", ".join(f"{status} {count}" for status, count in runner.counts.items())
+    print(f"Manifest finished: {counts} (exit code {code})")
+    if cache:
+        print(f"Media cache: {cache.summary()}")
+    return code
+
+
+def rate_arg(text):
+    """argparse type for --limit-rate"""
+    try:
+        return parse_rate(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
 
-def main():
+def section_arg(text):
+    """argparse type for --section"""
+    try:
+        return parse_section(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def renditions_arg(text):
+    """argparse type for --renditions"""
+    try:
+        return parse_renditions(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_args(argv=None):
+    """Command line arguments; anything missing is asked for interactively"""
+    parser = argparse.ArgumentParser(description="YouTube Downloader - CLI")
+    parser.add_argument('url', nargs='?', help="YouTube URL (several may be separated by ';' or ','; playlists and channels "
+                             "download while they are listed)")
+    parser.add_argument('output_path', nargs='?', help="Output directory")
+    parser.add_argument('filename', nargs='?', help="Custom filename(s) without extension")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Download and encode in separate stages (threads + process pool)")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"Parallel downloads in pipeline and manifest modes (default: {DEFAULT_WORKERS})")
+    parser.add_argument('--encoders', type=int, default=None,
+                        help="Encode processes in pipeline mode (default: CPU count)")
+    parser.add_argument('--segments', type=int, default=DEFAULT_SEGMENTS, choices=range(1, MAX_SEGMENTS + 1),
+                        metavar='N',
+                        help=f"Connections per stream for servers that support byte ranges "
+                             f"(1 disables, default: {DEFAULT_SEGMENTS})")
+    parser.add_argument('--fragments', type=int, default=DEFAULT_FRAGMENTS, choices=range(1, MAX_FRAGMENTS + 1),
+                        metavar='N',
+                        help=f"Most DASH/HLS fragments fetched at once per stream; the number in flight "
+                             f"adapts to the measured throughput (1 fetches them one by one, "
+                             f"default: {DEFAULT_FRAGMENTS})")
+    parser.add_argument('--fragments-per-host', type=int, default=DEFAULT_HOST_FRAGMENTS, metavar='N',
+                        help=f"Most fragments fetched at once from one host across all parallel downloads "
+                             f"(default: {DEFAULT_HOST_FRAGMENTS})")
+    parser.add_argument('--chunk-encoders', type=int, default=DEFAULT_CHUNK_ENCODERS, metavar='N',
+                        help=f"ffmpeg processes a long video's transcode is split across, cut at keyframes "
+                             f"(1 disables; in pipeline mode shared by the --encoders items, in manifest "
+                             f"mode by the --workers items; "
+                             f"default: CPU count, {DEFAULT_CHUNK_ENCODERS})")
+    parser.add_argument('--overlap', action='store_true',
+                        help="Start transcoding while the video and audio are still downloading, on slow "
+                             "links (both streams download at once; when they are all in within a second, "
+                             "the finished files are transcoded as without it; not used with --pipeline)")
+    parser.add_argument('--section', type=section_arg, default=None, metavar='START-END',
+                        help="Download only this time range of each video, e.g. 1:30-2:00 or 90-120 "
+                             "(only the data covering it is fetched; not used with --pipeline or --stdout)")
+    parser.add_argument('--renditions', type=renditions_arg, default=None, metavar='NAMES',
+                        help=f"Write several renditions from one download and one decode, comma-separated "
+                             f"({', '.join(RENDITIONS)}; e.g. best,720p,mp3; not used with --pipeline or --stdout)")
+    parser.add_argument('--limit-rate', type=rate_arg, default=0, metavar='RATE',
+                        help="Total download rate, shared fairly by the parallel downloads "
+                             "(bytes per second, e.g. 500K or 4M; default: unlimited)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Always extract and download, do not use the local media/metadata caches")
+    parser.add_argument('--cache-dir', default=None, help="Media cache directory")
+    parser.add_argument('--cache-size', type=float, default=DEFAULT_MAX_BYTES / 1024 ** 3,
+                        help="Media cache size limit in GB (default: %(default)g)")
+    parser.add_argument('--metadata-ttl', type=int, default=DEFAULT_TTL,
+                        help="Seconds a cached extract_info result stays valid (default: %(default)s)")
+    parser.add_argument('--no-journal', action='store_true',
+                        help="Do not record the batch in the output directory's job journal "
+                             "(items finished by an earlier, interrupted run are downloaded again)")
+    parser.add_argument('--metrics', default=None, metavar='FILE',
+                        help=f"Append per-job phase timings as JSON lines to FILE ('-' for stdout, "
+                             f"default: {METRICS_NAME} in the output directory)")
+    parser.add_argument('--no-metrics', action='store_true', help="Do not write per-job timings")
+    parser.add_argument('--stdout', action='store_true',
+                        help="Stream one video to stdout as fragmented MP4 while it is encoded "
+                             "(no output directory or file; messages go to stderr)")
+    parser.add_argument('--manifest', default=None, metavar='FILE',
+                        help="Headless batch: download the items listed in FILE ('-' for stdin), one per line: "
+                             "URL [FILENAME [QUALITY [SECTION]]] tab-separated, or a JSON object with those "
+                             "fields; --section/--renditions apply to items without their own")
+    parser.add_argument('--results', default='-', metavar='FILE',
+                        help="Manifest mode: append one JSON result per item to FILE as it finishes "
+                             "(default: '-', stdout; messages then go to stderr)")
+    parser.add_argument('-o', '--output-dir', default=None, metavar='DIR',
+                        help="Manifest mode: output directory (default: ~/Downloads/YouTube)")
+    args = parser.parse_args(argv)
+    for option in ('section', 'renditions'):
+        if getattr(args, option) and (args.pipeline or args.stdout):
+            parser.error(f"--{option} cannot be combined with --pipeline or --stdout")
+    if args.manifest:
+        if args.pipeline or args.stdout:
+            parser.error("--manifest cannot be combined with --pipeline or --stdout")
+        if args.url or args.output_path or args.filename:
+            parser.error("--manifest takes the URLs from the manifest and the directory from --output-dir")
+        if args.workers < 1:
+            parser.error("--workers must be at least 1")
+    return args
+
+
+def main(argv=None):
     """Main function for CLI interaction"""
+    args = parse_args(argv)
+    require_yt_dlp()
+    # Every download in this process draws from one bucket (see bandwidth)
+    bandwidth = shared_bandwidth()
+    bandwidth.set_rate(args.limit_rate)
+    
+    if args.stdout:
+        # No prompts: stdout is reserved for the video
+        if not args.url:
+            print("Error: URL is required with --stdout!", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(stream_to_stdout(args.url, None if args.no_cache else MetadataCache(ttl=args.metadata_ttl)))
+    
+    if args.manifest:
+        sys.exit(run_manifest(args))
+    
     print("\n" + "="*60)
     print(" "*15 + "YouTube Downloader - CLI")
     print("="*60 + "\n")
     
-    # Get YouTube URL
-    if len(sys.argv) > 1:
-        url = sys.argv[1]
-    else:
-        url = input("Enter YouTube URL: ").strip()
+    # Get YouTube URL (several URLs may be separated by ';' or ',')
+    url = args.url or input("Enter YouTube URL: ").strip()
     
     if not url:
         print("Error: URL is required!")
         sys.exit(1)
     
     # Get output path
-    if len(sys.argv) > 2:
-        output_path = sys.argv[2]
-    else:
+    output_path = args.output_path
+    if not output_path:
         default_path = str(Path.home() / "Downloads" / "YouTube")
         output_path = input(f"Enter output directory [{default_path}]: ").strip()
         if not output_path:
             output_path = default_path
     
     # Get optional filename
-    if len(sys.argv) > 3:
-        filename = sys.argv[3]
-    else:
+    filename = args.filename
+    if filename is None:
         filename = input("Enter custom filename (optional, press Enter to use video title): ").strip()
-        if not filename:
-            filename = None
+    if not filename:
+        filename = None
+    
+    urls = [u.strip() for u in re.split(r'[;,]', url) if u.strip()]
+    filenames = [f.strip() for f in re.split(r'[;,]', filename)] if filename else []
+    
+    # Finished outputs are cached by video ID + formats + encode profile; duplicate URLs are fetched once
+    # Extraction results are cached too, so re-runs skip the metadata round-trip
+    cache = metadata = None
+    if not args.no_cache:
+        cache = MediaCache(args.cache_dir, max_bytes=int(args.cache_size * 1024 ** 3))
+        metadata = MetadataCache(ttl=args.metadata_ttl)
+    
+    # Every item's state is journaled in the output directory, so a re-run after
+    # a crash or Ctrl+C skips finished items and resumes partial downloads
+    journal = None
+    if not args.no_journal:
+        Path(output_path).mkdir(parents=True, exist_ok=True)
+        journal = JobJournal(output_path)
+    
+    # Extract / video / audio / encode timings per job, one JSON object per line
+    metrics = None
+    if not args.no_metrics:
+        metrics = JsonLinesSink(args.metrics or str(Path(output_path) / METRICS_NAME))
+    
+    if bandwidth.limited:
+        print(f"Bandwidth limit: {format_rate(bandwidth.rate)}")
+    
+    # Playlist and channel URLs are expanded while they are listed: the first
+    # entry downloads while later pages are still being fetched
+    from ydl_session import DownloadSession
+    from playlist_stream import PlaylistStream
+    
+    # ffmpeg runs in process groups of its own, away from the terminal's Ctrl+C;
+    # the interrupt cancels the batch handle instead, which kills them
+    handle = JobHandle('cli')
+    
+    # Items are journaled with what they ask for (renditions and section are not used
+    # by the pipeline): a re-run asking for something else does not count as done
+    profile = job_profile(FORMAT_SPEC) if args.pipeline else job_profile(FORMAT_SPEC, args.renditions, args.section)
+    
+    # Input URLs the journal has as finished are passed on without being extracted again
+    def skip_finished(entry):
+        item_template = output_template_for(output_path, entry.filename(filenames))
+        return journal.finished(entry, item_template, profile) is not None
+    
+    if args.pipeline:
+        # The listing runs on the download engine's feeder thread, on a session of its own
+        with DownloadSession(build_ydl_opts(), metadata=metadata) as lister, cancel_on_interrupt(handle):
+            stream = PlaylistStream(lister, urls, log=print, skip=skip_finished if journal else None)
+            success_count = download_pipeline(stream, output_path, filenames, args.workers, args.encoders,
+                                              cache, metadata, journal, args.segments, metrics,
+                                              args.chunk_encoders, bandwidth, handle, args.fragments,
+                                              args.fragments_per_host)
+    else:
+        # Download (one yt-dlp session is reused for every URL of the batch, and lists the playlists too)
+        success_count = 0
+        with DownloadSession(build_ydl_opts(segments=args.segments, chunk_encoders=args.chunk_encoders,
+                                            overlap=args.overlap, fragments=args.fragments,
+                                            host_fragments=args.fragments_per_host), cache=cache, metadata=metadata,
+                             journal=journal, metrics=metrics, bandwidth=bandwidth) as session, \
+                cancel_on_interrupt(handle):
+            stream = PlaylistStream(session, urls, log=print, skip=skip_finished if journal else None)
+            for entry in stream:
+                item_filename = entry.filename(filenames)
+                item_template = output_template_for(output_path, item_filename)
+                if journal:
+                    journal.enqueue([(entry, item_template)], profile)
+                done = journal.finished(entry, item_template, profile) if journal else None
+                if done:
+                    print(f"✓ Already downloaded in an earlier run: {done}")
+                    success_count += 1
+                elif download_video(entry, output_path, item_filename, session=session, handle=handle,
+                                    section=args.section, renditions=args.renditions):
+                    success_count += 1
+    total = stream.count
+    
+    if cache:
+        print(f"Media cache: {cache.summary()}")
+        print(f"Metadata cache: {metadata.summary()}")
+    if journal:
+        print(f"Job journal: {journal.summary()}")
+        journal.close()
+    if metrics:
+        if metrics.path != '-':
+            print(f"Job timings: {metrics.path}")
+        metrics.close()
     
-    # Download
-    success = download_video(url, output_path, filename)
+    if stream.errors:
+        print(f"Playlist listing failed for {len(stream.errors)} URL(s); entries after the error were not downloaded")
+    success = success_count == total and not stream.errors
+    if total > 1:
+        print(f"Batch finished. Completed {success_count}/{total} downloads.")
     
     if success:
         print(f"Video saved to: {output_path}")
@@ -204,4 +620,6 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
+    # Needed for the encode process pool in the frozen (PyInstaller) build
+    multiprocessing.freeze_support()
     main()
@@ -10,39 +10,49 @@ from tkinter import ttk, filedialog, messagebox, scrolledtext
 import threading
 import os
 import sys
+import time
 from pathlib import Path
 import queue
-import shutil
 import subprocess
+import multiprocessing
+
+from download_engine import (DownloadEngine, DEFAULT_WORKERS, MAX_WORKERS, DEFAULT_SEGMENTS, MAX_SEGMENTS,
+                             DEFAULT_FRAGMENTS, DEFAULT_HOST_FRAGMENTS)
+from encode_profile import TRANSCODE_ARGS, ENCODE_STATS
+from gui_events import ProgressCoalescer, BoundedLog, MAX_MESSAGES_PER_TICK
+from media_cache import shared_cache
+from metadata_cache import shared_metadata_cache
+from job_journal import JobJournal
+from job_metrics import JsonLinesSink, METRICS_NAME
+from toolchain import probe as probe_toolchain, ffmpeg_path
+from chunked_encode import DEFAULT_CHUNK_ENCODERS
+from bandwidth import shared_bandwidth, parse_rate, format_rate
+from cancellation import JobHandle
+from section_clip import parse_section, format_section
+from renditions import RENDITIONS, source_format
+
+# yt-dlp (through ydl_session and pipeline) is imported by the download thread,
+# so the window opens without waiting for it
 
-# Import yt-dlp as a module
-try:
-    import yt_dlp
-except ImportError:
-    # If running as script, show error dialog
-    try:
-        import tkinter as tk
-        from tkinter import messagebox
-        root = tk.Tk()
-        root.withdraw()
-        messagebox.showerror(
-            "Missing Dependency",
-            "yt-dlp module not found!\n\nPlease install it with:\npip install yt-dlp"
-        )
-        root.destroy()
-    except:
-        print("ERROR: yt-dlp module not found!")
-        print("Please install it with: pip install yt-dlp")
-    sys.exit(1)
 
-# Import imageio-ffmpeg for bundled ffmpeg binary
-try:
-    import imageio_ffmpeg
-    FFMPEG_BINARY = imageio_ffmpeg.get_ffmpeg_exe()
-    print(f"Using bundled ffmpeg: {FFMPEG_BINARY}")
-except ImportError:
-    print("WARNING: imageio-ffmpeg not found. Will try to use system ffmpeg.")
-    FFMPEG_BINARY = None
+def require_yt_dlp():
+    """Import yt-dlp as a module; show an error dialog and exit if it is missing"""
+    try:
+        import yt_dlp  # noqa: F401
+    except ImportError:
+        # If running as script, show error dialog
+        try:
+            root = tk.Tk()
+            root.withdraw()
+            messagebox.showerror(
+                "Missing Dependency",
+                "yt-dlp module not found!\n\nPlease install it with:\npip install yt-dlp"
+            )
+            root.destroy()
+        except:
+            print("ERROR: yt-dlp module not found!")
+            print("Please install it with: pip install yt-dlp")
+        sys.exit(1)
 
 class YouTubeDownloaderGUI:
     def __init__(self, root):
@@ -53,10 +63,18 @@ class YouTubeDownloaderGUI:
         
         # Queue for thread-safe GUI updates
         self.message_queue = queue.Queue()
+        # Progress callbacks are coalesced per job instead of queued one by one
+        self.progress_events = ProgressCoalescer()
+        self.total_jobs = 0
+        # The status label shows the last status message with the coalesced speed/ETA under it
+        self.status_message = ("Ready", "gray")
+        self.progress_detail = None
         
         # Variables
         self.is_downloading = False
         self.stop_requested = False
+        # Cancellation handle of the running batch: its ffmpeg processes are killed on stop
+        self.batch_handle = None
         
         # Setup UI
         self.setup_ui()
@@ -104,22 +122,74 @@ class YouTubeDownloaderGUI:
         self.quality_combo['values'] = ("Best Quality", "4K (2160p)", "1080p", "720p", "480p", "Audio Only (MP3)")
         self.quality_combo.grid(row=4, column=1, sticky=tk.W, pady=5)
 
-        # Download Button
-        self.download_btn = ttk.Button(main_frame, text="Download", command=self.start_download, style='Accent.TButton')
-        self.download_btn.grid(row=5, column=0, columnspan=3, pady=20)
+        # Parallel downloads (worker pool width)
+        workers_frame = ttk.Frame(main_frame)
+        workers_frame.grid(row=4, column=2, sticky=tk.E, pady=5)
+        ttk.Label(workers_frame, text="Parallel:").pack(side=tk.LEFT)
+        self.workers_var = tk.IntVar(value=DEFAULT_WORKERS)
+        self.workers_spin = ttk.Spinbox(workers_frame, from_=1, to=MAX_WORKERS, width=4,
+                                        textvariable=self.workers_var, state="readonly")
+        self.workers_spin.pack(side=tk.LEFT, padx=(5, 0))
+        
+        # Connections per stream (byte-range segments)
+        ttk.Label(workers_frame, text="Connections:").pack(side=tk.LEFT, padx=(10, 0))
+        self.segments_var = tk.IntVar(value=DEFAULT_SEGMENTS)
+        ttk.Spinbox(workers_frame, from_=1, to=MAX_SEGMENTS, width=4,
+                    textvariable=self.segments_var, state="readonly").pack(side=tk.LEFT, padx=(5, 0))
+        
+        # Staged mode: separate download threads and encode processes
+        self.pipeline_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(workers_frame, text="Pipeline", variable=self.pipeline_var).pack(side=tk.LEFT, padx=(10, 0))
+        
+        # Transcode while the streams are still downloading (not used by the pipeline)
+        self.overlap_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(workers_frame, text="Encode while downloading",
+                        variable=self.overlap_var).pack(side=tk.LEFT, padx=(10, 0))
+        
+        # Total download rate shared by the parallel items (e.g. 2M, 0 = unlimited); applies mid-batch too
+        ttk.Label(workers_frame, text="Max rate:").pack(side=tk.LEFT, padx=(10, 0))
+        self.rate_var = tk.StringVar(value="0")
+        ttk.Entry(workers_frame, textvariable=self.rate_var, width=6).pack(side=tk.LEFT, padx=(5, 0))
+        self.rate_var.trace_add('write', lambda *args: self.apply_rate_limit())
+
+        # Time range to clip (only the data covering it is fetched; not used by the pipeline)
+        ttk.Label(main_frame, text="Section (optional):").grid(row=5, column=0, sticky=tk.W, pady=5)
+        self.section_entry = ttk.Entry(main_frame, width=20)
+        self.section_entry.grid(row=5, column=1, sticky=tk.W, pady=5)
+        ttk.Label(main_frame, text="START-END, e.g. 1:30-2:00", foreground="gray").grid(
+            row=5, column=2, sticky=tk.E, pady=5)
+
+        # Several qualities from one download and one decode (the Quality choice is not used then)
+        ttk.Label(main_frame, text="Renditions (optional):").grid(row=6, column=0, sticky=tk.W, pady=5)
+        renditions_frame = ttk.Frame(main_frame)
+        renditions_frame.grid(row=6, column=1, columnspan=2, sticky=tk.W, pady=5)
+        self.rendition_vars = {}
+        for name, rendition in RENDITIONS.items():
+            self.rendition_vars[name] = tk.BooleanVar(value=False)
+            ttk.Checkbutton(renditions_frame, text=rendition.label,
+                            variable=self.rendition_vars[name]).pack(side=tk.LEFT, padx=(0, 10))
+
+        # Download / Stop Buttons
+        buttons_frame = ttk.Frame(main_frame)
+        buttons_frame.grid(row=7, column=0, columnspan=3, pady=20)
+        self.download_btn = ttk.Button(buttons_frame, text="Download", command=self.start_download, style='Accent.TButton')
+        self.download_btn.pack(side=tk.LEFT)
+        self.stop_btn = ttk.Button(buttons_frame, text="Stop", command=self.stop_download, state='disabled')
+        self.stop_btn.pack(side=tk.LEFT, padx=(10, 0))
         
         # Progress Bar
-        self.progress = ttk.Progressbar(main_frame, mode='indeterminate', length=600)
-        self.progress.grid(row=6, column=0, columnspan=3, pady=(0, 10))
+        self.progress = ttk.Progressbar(main_frame, mode='determinate', maximum=100, length=600)
+        self.progress.grid(row=8, column=0, columnspan=3, pady=(0, 10))
         
         # Status Label
         self.status_label = ttk.Label(main_frame, text="Ready", foreground="gray")
-        self.status_label.grid(row=7, column=0, columnspan=3)
+        self.status_label.grid(row=9, column=0, columnspan=3)
         
         # Log Output
-        ttk.Label(main_frame, text="Download Log:").grid(row=8, column=0, columnspan=3, sticky=tk.W, pady=(20, 5))
+        ttk.Label(main_frame, text="Download Log:").grid(row=10, column=0, columnspan=3, sticky=tk.W, pady=(20, 5))
         self.log_text = scrolledtext.ScrolledText(main_frame, width=80, height=10, state='disabled')
-        self.log_text.grid(row=9, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.log_text.grid(row=11, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.log_view = BoundedLog(self.log_text)
         
         # Configure grid weights
         self.root.columnconfigure(0, weight=1)
@@ -143,33 +213,65 @@ class YouTubeDownloaderGUI:
     
     def check_queue(self):
         """Check message queue and update GUI"""
+        # Bounded work per tick: log lines are inserted in one batch, only the last status is shown
+        lines = []
+        status = None
         try:
-            while True:
+            for _ in range(MAX_MESSAGES_PER_TICK):
                 msg_type, data = self.message_queue.get_nowait()
                 
                 if msg_type == 'log':
-                    self.log_text.config(state='normal')
-                    self.log_text.insert(tk.END, data + '\n')
-                    self.log_text.see(tk.END)
-                    self.log_text.config(state='disabled')
+                    lines.append(data)
                 
                 elif msg_type == 'status':
-                    message, color = data
-                    self.status_label.config(text=message, foreground=color)
+                    status = data
                 
                 elif msg_type == 'download_complete':
+                    self.log_view.append(lines)
+                    lines = []
                     self.on_download_complete(data)
                 
         except queue.Empty:
             pass
         
+        self.log_view.append(lines)
+        if status:
+            self.status_message = status
+        
+        snapshot = self.progress_events.drain()
+        if snapshot is not None:
+            self.progress['value'] = ProgressCoalescer.overall(snapshot, self.total_jobs)
+            self.progress_detail = ProgressCoalescer.describe(snapshot)
+        
+        if status or snapshot is not None:
+            message, color = self.status_message
+            text = f"{message}\n{self.progress_detail}" if self.progress_detail else message
+            self.status_label.config(text=text, foreground=color)
+        
         # Schedule next check
         self.root.after(100, self.check_queue)
     
+    def apply_rate_limit(self):
+        """Set the shared bandwidth limit from the Max rate field; False while the text is not a rate"""
+        try:
+            shared_bandwidth().set_rate(parse_rate(self.rate_var.get()))
+        except ValueError:
+            return False
+        return True
+    
     def kill_ffmpeg(self):
-        """Terminate any running ffmpeg processes on Windows"""
-        if os.name == 'nt':
-            pass
+        """Cancel the running batch: its ffmpeg processes are killed now, not after their encode"""
+        if self.batch_handle is not None:
+            self.batch_handle.cancel()
+    
+    def stop_download(self):
+        """Stop the batch; partial downloads stay and resume on the next run (see job journal)"""
+        if not self.is_downloading or self.stop_requested:
+            return
+        self.stop_requested = True
+        self.stop_btn.config(state='disabled')
+        self.log("Stopping: cancelling downloads and encodes...")
+        self.kill_ffmpeg()
 
     def on_close(self):
         """Handle window closing event"""
@@ -196,6 +298,12 @@ class YouTubeDownloaderGUI:
         output_path = self.path_entry.get().strip()
         filename_input = self.filename_entry.get().strip()
         quality = self.quality_var.get()
+        workers = self.workers_var.get()
+        use_pipeline = self.pipeline_var.get()
+        segments = self.segments_var.get()
+        overlap = self.overlap_var.get()
+        section_input = self.section_entry.get().strip()
+        renditions = tuple(name for name, var in self.rendition_vars.items() if var.get()) or None
         
         if not url_input:
             messagebox.showerror("Error", "Please enter a YouTube URL!")
@@ -218,28 +326,35 @@ class YouTubeDownloaderGUI:
             messagebox.showerror("Error", "Please select an output directory!")
             return
         
+        section = None
+        if section_input:
+            try:
+                section = parse_section(section_input)
+            except ValueError as e:
+                messagebox.showerror("Error", f"Section must be START-END like 1:30-2:00 or 90-120!\n\n{e}")
+                return
+        
+        if not self.apply_rate_limit():
+            messagebox.showerror("Error", "Max rate must be a number of bytes per second like 500K or 2M (0 = unlimited)!")
+            return
+        
         # Start download thread
         self.is_downloading = True
+        self.batch_handle = JobHandle('batch')
         self.download_btn.config(state='disabled')
-        self.progress.start(10)
+        self.progress_events.reset()
+        self.total_jobs = len(urls)
+        self.progress['value'] = 0
         self.update_status(f"Checking ffmpeg...", "blue")
         
-        # Check ffmpeg first
-        ffmpeg_available = False
+        # Check ffmpeg first (bundled imageio-ffmpeg, then system; cached on disk by toolchain)
+        tools = probe_toolchain()
+        if tools is not None:
+            self.log(f"✓ Using {tools.source} ffmpeg: {tools.path} ({tools.version or 'unknown version'})")
+            if tools.missing_encoders:
+                self.log(f"WARNING: this ffmpeg has no {', '.join(tools.missing_encoders)} encoder")
         
-        # Try imageio-ffmpeg (bundled)
-        try:
-            import imageio_ffmpeg
-            ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
-            self.log(f"✓ Using bundled ffmpeg: {ffmpeg_path}")
-            ffmpeg_available = True
-        except ImportError:
-            # Fallback to system ffmpeg
-            if shutil.which('ffmpeg') is not None:
-                self.log("✓ Using system ffmpeg")
-                ffmpeg_available = True
-        
-        if not ffmpeg_available:
+        if tools is None:
             self.is_downloading = False
             self.download_btn.config(state='normal')
             self.progress.stop()
@@ -262,14 +377,43 @@ class YouTubeDownloaderGUI:
         
         self.update_status(f"Starting batch download of {len(urls)} videos...", "blue")
         self.log(f"Starting batch download: {len(urls)} videos")
-        self.log(f"Selected Quality: {quality}")
-        
-        thread = threading.Thread(target=self.download_worker, args=(urls, output_path, filenames, quality))
+        if not renditions:
+            self.log(f"Selected Quality: {quality}")
+        self.log(f"Parallel downloads: {workers}, connections per stream: {segments}")
+        self.log(f"Bandwidth limit: {format_rate(shared_bandwidth().rate)} (shared by all downloads)")
+        if section:
+            self.log(f"Section: {format_section(section)} (only this time range is downloaded and encoded)")
+            if use_pipeline:
+                self.log("Pipeline mode is not used for sections")
+                use_pipeline = False
+        if renditions:
+            labels = ', '.join(RENDITIONS[name].label for name in renditions)
+            self.log(f"Renditions: {labels} (one download and one decode per video; Quality is not used)")
+            if use_pipeline:
+                self.log("Pipeline mode is not used for renditions")
+                use_pipeline = False
+        if use_pipeline:
+            self.log("Pipeline mode: downloads and encodes run in separate stages")
+        elif overlap:
+            self.log("Encode while downloading: transcodes start as soon as the first bytes arrive")
+        
+        self.stop_btn.config(state='normal')
+        thread = threading.Thread(target=self.download_worker,
+                                  args=(urls, output_path, filenames, quality, workers, use_pipeline, segments,
+                                        overlap, section, renditions))
         thread.daemon = True
         thread.start()
     
-    def download_worker(self, urls, output_path, filenames, quality="Best Quality"):
+    def download_worker(self, urls, output_path, filenames, quality="Best Quality", workers=DEFAULT_WORKERS,
+                        use_pipeline=False, segments=DEFAULT_SEGMENTS, overlap=False, section=None,
+                        renditions=None):
         """Worker thread for downloading"""
+        from ydl_session import DownloadSession, SessionPool
+        from pipeline import StagedPipeline
+        from playlist_stream import PlaylistStream
+        
+        # Stop cancels this: running ffmpeg processes are killed, downloads end at their next block
+        handle = self.batch_handle
         
         class GUILogger:
             """Custom logger that sends messages to GUI"""
@@ -278,7 +422,7 @@ class YouTubeDownloaderGUI:
             
             def debug(self, msg):
                 # Only log important debug messages
-                if 'Downloading' in msg or 'Merging' in msg:
+                if 'Downloading' in msg or 'Merging' in msg or 'ChunkedEncode' in msg:
                     self.log_callback(msg)
             
             def warning(self, msg):
@@ -287,28 +431,28 @@ class YouTubeDownloaderGUI:
             def error(self, msg):
                 self.log_callback(f"ERROR: {msg}")
         
-        def progress_hook(d):
-            """Progress callback"""
-            if self.stop_requested:
-                raise Exception("STOP_REQUESTED")
+        def make_progress_hook(i):
+            """Create a progress callback for batch item i (1-based)"""
+            # Playlists grow the batch while they are listed
+            self.total_jobs = max(self.total_jobs, stream.count)
+            tag = f"[{i}/{stream.count_label()}]"
+            
+            def progress_hook(d):
+                if self.stop_requested:
+                    raise Exception("STOP_REQUESTED")
 
-            if d['status'] == 'downloading':
-                if 'total_bytes' in d or 'total_bytes_estimate' in d:
-                    total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-                    downloaded = d.get('downloaded_bytes', 0)
-                    
-                    if total > 0:
-                        percent = (downloaded / total) * 100
-                        speed = d.get('speed', 0)
-                        eta = d.get('eta', 0)
+                if d['status'] == 'downloading':
+                    if 'total_bytes' in d or 'total_bytes_estimate' in d:
+                        total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
+                        downloaded = d.get('downloaded_bytes', 0)
                         
-                        speed_str = f"{speed/1024/1024:.2f} MB/s" if speed else "N/A"
-                        eta_str = f"{eta}s" if eta else "N/A"
-                        
-                        self.log(f"Progress: {percent:.1f}% | Speed: {speed_str} | ETA: {eta_str}")
-            elif d['status'] == 'finished':
-                self.log(f"✓ Download finished: {d.get('filename', 'unknown')}")
-                self.log("Processing video...")
+                        if total > 0:
+                            # Coalesced: the UI picks up the latest value a few times per second
+                            self.progress_events.update(i, downloaded, total, d.get('speed'), d.get('eta'))
+                elif d['status'] == 'finished':
+                    self.log(f"{tag} ✓ Download finished: {d.get('filename', 'unknown')}")
+                    self.log(f"{tag} Processing video...")
+            return progress_hook
         
         try:
             # Ensure output directory exists
@@ -318,17 +462,25 @@ class YouTubeDownloaderGUI:
             self.log(f"Output directory: {output_path}")
             self.log("-" * 60)
             
-            total_count = len(urls)
-            success_count = 0
-            
             # Common yt-dlp options (Initialize BEFORE using it in if/else blocks)
+            # Progress hooks are added per item so each job reports under its own index
             base_opts = {
                 'logger': GUILogger(self.log),
-                'progress_hooks': [progress_hook],
+                'segments': segments,
+                # DASH/HLS fragments in flight per stream, sized by throughput (see adaptive_fragments)
+                'concurrent_fragment_downloads': DEFAULT_FRAGMENTS,
+                'adaptive_fragments': True,
+                'fragment_host_limit': DEFAULT_HOST_FRAGMENTS,
+                # Long transcodes are split across the cores left to each parallel item (see chunked_encode)
+                'chunk_encoders': max(1, DEFAULT_CHUNK_ENCODERS // workers),
+                'overlap_encode': overlap,
             }
 
             # Determine format and options based on quality
-            if quality == "Audio Only (MP3)":
+            if renditions:
+                # The best source once; every rendition is written from it (see renditions)
+                format_spec = source_format(renditions)
+            elif quality == "Audio Only (MP3)":
                 format_spec = 'bestaudio/best'
                 # For audio, we use FFmpegExtractAudio
                 base_opts['postprocessors'] = [{
@@ -350,58 +502,142 @@ class YouTubeDownloaderGUI:
                     format_spec = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best'
                 
                 # For video, enforce MP4 merge and H.264/AAC for compatibility
+                # (the merger args are swapped for a stream copy per item when the source already is)
                 base_opts['merge_output_format'] = 'mp4'
                 base_opts['postprocessor_args'] = {
-                     'merger': ['-c:v', 'libx264', '-preset', 'fast', '-crf', '23',
-                               '-c:a', 'aac', '-b:a', '192k', '-movflags', '+faststart']
+                     'merger': TRANSCODE_ARGS
                 }
 
             base_opts['format'] = format_spec
 
             
-            # Set ffmpeg location if using bundled version
-            if FFMPEG_BINARY:
-                base_opts['ffmpeg_location'] = FFMPEG_BINARY
+            # Set ffmpeg location to the probed binary (bundled or system)
+            if ffmpeg_path():
+                base_opts['ffmpeg_location'] = ffmpeg_path()
             
-            for i, url in enumerate(urls, 1):
-                if self.stop_requested:
-                    break
+            def output_template_for(entry):
+                """Prepare filename logic for each entry"""
+                # Filenames map to the input URLs; playlist entries are numbered after theirs
+                current_filename = entry.filename(filenames)
+                
+                if current_filename:
+                    safe_filename = "".join(c if c.isalnum() or c in (' ', '-', '_') else '_' for c in current_filename)
+                    return str(output_path / f"{safe_filename}.%(ext)s")
+                return str(output_path / "%(title)s.%(ext)s")
+            
+            def process_item(i, url):
+                """Download a single batch item (runs on an engine worker thread)"""
+                tag = f"[{i}/{stream.count_label()}]"
                 try:
-                    self.update_status(f"Processing {i}/{total_count}: {url}", "blue")
-                    self.log(f"\n[{i}/{total_count}] Processing: {url}")
-                    
-                    # Prepare filename logic for each URL
-                    # Map filename by index if available (enumerate is 1-based, list is 0-based)
-                    list_index = i - 1
-                    current_filename = None
-                    if list_index < len(filenames) and filenames[list_index]:
-                        current_filename = filenames[list_index]
-                    
-                    if current_filename:
-                        safe_filename = "".join(c if c.isalnum() or c in (' ', '-', '_') else '_' for c in current_filename)
-                        output_template = str(output_path / f"{safe_filename}.%(ext)s")
-                    else:
-                        output_template = str(output_path / "%(title)s.%(ext)s")
+                    journal.enqueue([(url, output_template_for(url))], profile)
+                    done = journal.finished(url, output_template_for(url), profile)
+                    if done:
+                        self.log(f"{tag} ✓ Already downloaded in an earlier run: {done}")
+                        self.progress_events.finish(i)
+                        return True
                     
-                    current_opts = base_opts.copy()
-                    current_opts['outtmpl'] = output_template
+                    self.update_status(f"Processing {i}/{stream.count_label()}: {url}", "blue")
+                    self.log(f"\n{tag} Processing: {url}")
                     
-                    # Download using yt-dlp Python API
-                    with yt_dlp.YoutubeDL(current_opts) as ydl:
-                        ydl.download([url])
+                    # Download on this worker's long-lived yt-dlp session
+                    session = sessions.get()
+                    info, encode_path = session.download(
+                        url, output_template_for(url),
+                        progress_hook=make_progress_hook(i),
+                        probe=quality != "Audio Only (MP3)",
+                        handle=handle,
+                        section=section,
+                        renditions=renditions,
+                    )
+                    if encode_path:
+                        self.log(f"{tag} Encode path: {encode_path}")
+                    if renditions:
+                        self.log(f"{tag} Files: {', '.join(os.path.basename(p) for p in session.last_outputs)}")
+                    self.log(f"{tag} Timing: {session.last_timer.summary()}")
                     
-                    success_count += 1
+                    self.log(f"{tag} ✓ Done: {url}")
+                    self.progress_events.finish(i)
+                    return True
                     
                 except Exception as e:
-                    if str(e) == "STOP_REQUESTED":
-                        break
+                    if str(e) == "STOP_REQUESTED" or self.stop_requested:
+                        raise Exception("STOP_REQUESTED")
                     self.log(f"ERROR downloading {url}: {str(e)}")
+                    return False
+            
+            def on_pipeline_event(kind, data):
+                """Forward staged pipeline events to the GUI"""
+                if kind == 'log':
+                    self.log(data)
+                elif kind == 'item' and data[1]:
+                    self.progress_events.finish(data[0])
+                elif kind == 'depths':
+                    self.update_status(
+                        f"Download: {data['downloading']} active, {data['download_pending']} waiting | "
+                        f"Encode: {data['encoding']} running, {data['encode_queued']} queued", "blue")
+            
+            # Finished outputs are reused across runs; duplicate URLs in the batch are fetched once
+            cache = shared_cache()
+            metadata = shared_metadata_cache()
+            # Item states are journaled in the output folder: after a crash or closing the
+            # window mid-batch, the same batch skips finished items and resumes partial ones
+            journal = JobJournal(output_path)
+            # Per-job phase timings (extract / video / audio / encode) as JSON lines
+            metrics = JsonLinesSink(str(output_path / METRICS_NAME))
+            # Playlist and channel URLs are listed lazily on a session of their own, on the
+            # engine's feeder thread: downloads start with the first page of entries
+            lister = DownloadSession(base_opts, metadata=metadata)
+            # Items are journaled with the quality, renditions and section asked for
+            # (the staged pipeline uses none but the quality), see job_journal.job_profile
+            profile = lister.job_profile() if use_pipeline else lister.job_profile(renditions, section)
+            # Input URLs finished in an earlier run are not extracted again
+            stream = PlaylistStream(lister, urls, log=self.log,
+                                    skip=lambda entry: journal.finished(entry, output_template_for(entry),
+                                                                        profile) is not None)
+            
+            if use_pipeline:
+                # Staged mode: download threads feed an ffmpeg process pool through a bounded queue
+                staged = StagedPipeline(
+                    base_opts, ffmpeg=ffmpeg_path(), download_workers=workers,
+                    audio_only=quality == "Audio Only (MP3)",
+                    on_event=on_pipeline_event, should_stop=lambda: self.stop_requested,
+                    cache=cache, metadata=metadata, journal=journal, metrics=metrics,
+                    bandwidth=shared_bandwidth(), handle=handle,
+                )
+                items = ((entry, output_template_for(entry)) for entry in stream)
+                try:
+                    results = staged.run(items, progress_hook_factory=make_progress_hook)
+                finally:
+                    lister.close()
+            else:
+                # Run the batch through the bounded worker pool
+                # (each worker thread reuses one yt-dlp instance for all of its items)
+                engine = DownloadEngine(workers=workers, should_stop=lambda: self.stop_requested)
+                with SessionPool(base_opts, cache=cache, metadata=metadata, journal=journal,
+                                 metrics=metrics, bandwidth=shared_bandwidth()) as sessions:
+                    try:
+                        results = engine.run(stream, process_item)
+                    finally:
+                        lister.close()
+            success_count = sum(1 for ok in results.values() if ok)
+            total_count = stream.count
+            self.total_jobs = total_count
+            if quality != "Audio Only (MP3)":
+                self.log(f"Encode stats: {ENCODE_STATS.summary()}")
+            self.log(f"Media cache: {cache.summary()}")
+            self.log(f"Metadata cache: {metadata.summary()}")
+            self.log(f"Job journal: {journal.summary()}")
+            self.log(f"Job timings: {metrics.path}")
+            journal.close()
+            metrics.close()
             
             if self.stop_requested:
                 self.kill_ffmpeg()
+                if handle.cancelled_at is not None:
+                    self.log(f"Stopped {time.monotonic() - handle.cancelled_at:.1f}s after the stop request")
                 self.log("\nDownload process was cancelled by user.")
                 self.message_queue.put(('download_complete', False))
-            elif success_count == total_count:
+            elif success_count == total_count and not stream.errors:
                 self.message_queue.put(('download_complete', True))
             else:
                 self.log(f"\nBatch finished. Completed {success_count}/{total_count} downloads.")
@@ -414,10 +650,16 @@ class YouTubeDownloaderGUI:
     def on_download_complete(self, success):
         """Handle download completion"""
         self.is_downloading = False
+        self.batch_handle = None
         self.download_btn.config(state='normal')
+        self.stop_btn.config(state='disabled')
         self.progress.stop()
+        self.progress_detail = None
         
-        if success:
+        if self.stop_requested:
+            self.update_status("Stopped", "orange")
+        elif success:
+            self.progress['value'] = 100
             self.update_status("✓ Download completed successfully!", "green")
             self.log("-" * 60)
             self.log("Download completed!")
@@ -428,11 +670,16 @@ class YouTubeDownloaderGUI:
             self.log("Download failed!")
             messagebox.showerror("Error", "Download failed. Check the log for details.")
 
-def main():
+def main(argv=None):
     """Main function to run GUI"""
+    import argparse
+    argparse.ArgumentParser(description="YouTube Downloader - GUI").parse_args(argv)
+    require_yt_dlp()
     root = tk.Tk()
     app = YouTubeDownloaderGUI(root)
     root.mainloop()
 
 if __name__ == "__main__":
+    # Needed for the encode process pool in the frozen (PyInstaller) build
+    multiprocessing.freeze_support()
     main()